@@ -38,7 +38,7 @@ LOGGER = logging.getLogger(__name__)
 
 
 def calib_instance(hazard, exposure, impact_func, df_out=pd.DataFrame(),
-                   yearly_impact=False, return_cost='False'):
+                   yearly_impact=False, return_cost='False', impacts=None):
 
     """calculate one impact instance for the calibration algorithm and write
         to given DataFrame
@@ -59,6 +59,9 @@ def calib_instance(hazard, exposure, impact_func, df_out=pd.DataFrame(),
         return_cost : str, optional
             if not 'False' but any of 'R2', 'logR2',
             cost is returned instead of df_out
+        impacts : Impact, optional
+            impact of hazard on exposure computed beforehand with impact_func.
+            If None (default), it is computed here.
 
         Returns
         -------
@@ -66,9 +69,10 @@ def calib_instance(hazard, exposure, impact_func, df_out=pd.DataFrame(),
             DataFrame with modelled impact written to rows for each year
             or event.
     """
-    ifs = ImpactFuncSet([impact_func])
-    impacts = ImpactCalc(exposures=exposure, impfset=ifs, hazard=hazard)\
-              .impact(assign_centroids=False)
+    if impacts is None:
+        ifs = ImpactFuncSet([impact_func])
+        impacts = ImpactCalc(exposures=exposure, impfset=ifs, hazard=hazard)\
+                  .impact(assign_centroids=False)
     if yearly_impact:  # impact per year
         iys = impacts.impact_per_year(all_years=True)
         # Loop over whole year range:
@@ -344,11 +348,20 @@ def calib_all(hazard, exposure, impf_name_or_instance, param_full_dict,
             raise ValueError('other impact data sources not yet implemented.')
     params_generator = (dict(zip(param_full_dict, x))
                         for x in itertools.product(*param_full_dict.values()))
+    impact_func_list, df_outs = [], []
     for param_dict in params_generator:
         print(param_dict)
         df_out = copy.deepcopy(df_impact_data)
         impact_func_final, df_out = init_impf(impf_name_or_instance, param_dict, df_out)
-        df_out = calib_instance(hazard, exposure, impact_func_final, df_out, yearly_impact)
+        impact_func_list.append(impact_func_final)
+        df_outs.append(df_out)
+    # compute the impacts of all parameter sets with a single exposure and hazard preparation
+    impfsets = [ImpactFuncSet([impact_func]) for impact_func in impact_func_list]
+    impacts_list = ImpactCalc(exposures=exposure, impfset=impfsets[0], hazard=hazard)\
+        .impact_many(impfsets, assign_centroids=False, save_mat=False)
+    for impact_func_final, df_out, impacts in zip(impact_func_list, df_outs, impacts_list):
+        df_out = calib_instance(hazard, exposure, impact_func_final, df_out, yearly_impact,
+                                impacts=impacts)
         if df_result is None:
             df_result = copy.deepcopy(df_out)
         else:
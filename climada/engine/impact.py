@@ -25,8 +25,8 @@ from dataclasses import dataclass, field
 import logging
 import copy
 import csv
-import warnings
-import datetime as dt
+import json
+import shutil
 from itertools import zip_longest
 from typing import Any, Iterable, Union
 from collections.abc import Collection
@@ -38,6 +38,8 @@ from scipy import sparse
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import xlsxwriter
 from tqdm import tqdm
 import h5py
@@ -45,15 +47,18 @@ from pyproj import CRS as pyprojCRS
 from rasterio.crs import CRS as rasterioCRS  # pylint: disable=no-name-in-module
 
 from climada.entity import Exposures
-from climada import CONFIG
 from climada.util.constants import DEF_CRS, CMAP_IMPACT, DEF_FREQ_UNIT
+import climada.util.checker as u_check
 import climada.util.coordinates as u_coord
 import climada.util.dates_times as u_dt
+import climada.util.exceedance as u_exc
+from climada.util.hdf5_handler import H5CSRMatrix
 import climada.util.plot as u_plot
 from climada.util.select import get_attributes_with_matching_dimension
 
 LOGGER = logging.getLogger(__name__)
 
+
 class Impact():
     """Impact definition. Compute from an entity (exposures and impact
     functions) and hazard.
@@ -392,30 +397,35 @@ class Impact():
         if year_range is None:
             year_range = []
 
-        orig_year = np.array([dt.datetime.fromordinal(date).year
-                              for date in self.date])
+        orig_year = self._get_event_year()
         if orig_year.size == 0 and len(year_range) == 0:
             return dict()
         if orig_year.size == 0 or (len(year_range) > 0 and all_years):
             years = np.arange(min(year_range), max(year_range) + 1)
         elif all_years:
-            years = np.arange(min(orig_year), max(orig_year) + 1)
+            years = np.arange(orig_year.min(), orig_year.max() + 1)
         else:
-            years = np.array(sorted(np.unique(orig_year)))
+            years = np.unique(orig_year)
         if not len(year_range) == 0:
             years = years[years >= min(year_range)]
             years = years[years <= max(year_range)]
+        if years.size == 0:
+            return dict()
 
-        year_set = dict()
-
-        for year in years:
-            year_set[year] = sum(self.at_event[orig_year == year])
-        return year_set
+        # sum the impacts of the events per year from the first year on
+        in_years = (orig_year >= years[0]) & (orig_year <= years[-1])
+        imp_per_year = np.bincount(orig_year[in_years] - years[0],
+                                   weights=self.at_event[in_years],
+                                   minlength=years[-1] - years[0] + 1)
+        return dict(zip(years, imp_per_year[years - years[0]]))
 
-    def impact_at_reg(self, agg_regions=None):
+    def impact_at_reg(self, agg_regions=None, sparse_output=False):
         """Aggregate impact on given aggregation regions. This method works
         only if Impact.imp_mat was stored during the impact calculation.
 
+        The impacts of all events and regions are computed at once as the product of the
+        impact matrix with a sparse matrix assigning the exposure points to the regions.
+
         Parameters
         ----------
         agg_regions : np.array, list (optional)
@@ -427,12 +437,25 @@ class Impact():
             to area B. If no aggregation regions are passed, the method aggregates
             impact at the country (admin_0) level.
             Default is None.
+        sparse_output : bool, optional
+            If True, the columns of the returned DataFrame are sparse, which saves memory
+            if many regions are not affected by many events. Default: False
 
         Returns
         -------
         pd.DataFrame
             Contains the aggregated data per event.
             Rows: Hazard events. Columns: Aggregation regions.
+
+        Raises
+        ------
+        ValueError
+            if the impact matrix is not stored, or if the number of aggregation regions
+            differs from the number of exposure points
+
+        See Also
+        --------
+        eai_exp_at_reg : expected impact per aggregation region
         """
         if np.prod(self.imp_mat.shape) == 0:
             raise ValueError(
@@ -440,26 +463,82 @@ class Impact():
                 "stored during the impact calculation"
             )
 
-        if agg_regions is None:
-            agg_regions = u_coord.country_to_iso(
-                u_coord.get_country_code(self.coord_exp[:, 0], self.coord_exp[:, 1])
+        agg_reg_unique, agg_reg_idx = self._agg_reg_idx(agg_regions, self.imp_mat.shape[1])
+        reg_mat = sparse.csr_matrix(
+            (np.ones(agg_reg_idx.size), (np.arange(agg_reg_idx.size), agg_reg_idx)),
+            shape=(self.imp_mat.shape[1], agg_reg_unique.size)
+        )
+        at_reg_event = sparse.csr_matrix(self.imp_mat @ reg_mat)
+
+        if sparse_output:
+            return pd.DataFrame.sparse.from_spmatrix(
+                at_reg_event, columns=agg_reg_unique, index=self.event_id
             )
+        return pd.DataFrame(
+            at_reg_event.toarray(), columns=agg_reg_unique, index=self.event_id
+        )
 
-        agg_regions = np.asanyarray(agg_regions)
-        agg_reg_unique = np.unique(agg_regions)
+    def eai_exp_at_reg(self, agg_regions=None):
+        """Aggregate the expected impact of the exposure points on given aggregation
+        regions. In contrast to :py:meth:`impact_at_reg`, the impact matrix is not
+        required.
 
-        at_reg_event = np.hstack(
-            [
-                self.imp_mat[:, np.where(agg_regions == reg)[0]].sum(1)
-                for reg in agg_reg_unique
-            ]
-        )
+        Parameters
+        ----------
+        agg_regions : np.array, list (optional)
+            Aggregation region of each exposure point, see :py:meth:`impact_at_reg`. If
+            no aggregation regions are passed, the method aggregates the expected impact
+            at the country (admin_0) level. Default is None.
+
+        Returns
+        -------
+        pd.Series
+            expected impact per aggregation region
 
-        at_reg_event = pd.DataFrame(
-            at_reg_event, columns=agg_reg_unique, index=self.event_id
+        Raises
+        ------
+        ValueError
+            if the number of aggregation regions differs from the number of exposure points
+        """
+        agg_reg_unique, agg_reg_idx = self._agg_reg_idx(agg_regions, self.eai_exp.size)
+        return pd.Series(
+            np.bincount(agg_reg_idx, weights=self.eai_exp, minlength=agg_reg_unique.size),
+            index=agg_reg_unique
         )
 
-        return at_reg_event
+    def _agg_reg_idx(self, agg_regions, n_exp):
+        """Aggregation regions and region index of each exposure point
+
+        Parameters
+        ----------
+        agg_regions : np.array, list or None
+            Aggregation region of each exposure point. Countries (ISO 3166 alpha-3 codes)
+            of the exposure points if None.
+        n_exp : int
+            number of exposure points
+
+        Returns
+        -------
+        agg_reg_unique : np.array
+            sorted unique aggregation regions
+        agg_reg_idx : np.array
+            index in agg_reg_unique of the region of each exposure point
+
+        Raises
+        ------
+        ValueError
+            if the number of aggregation regions differs from the number of exposure points
+        """
+        if agg_regions is None:
+            agg_regions = u_coord.country_to_iso(
+                u_coord.get_country_code(self.coord_exp[:, 0], self.coord_exp[:, 1])
+            )
+
+        agg_regions = np.asanyarray(agg_regions)
+        if agg_regions.size != n_exp:
+            raise ValueError(f"The number of aggregation regions ({agg_regions.size}) differs"
+                             f" from the number of exposure points ({n_exp}).")
+        return np.unique(agg_regions, return_inverse=True)
 
     def calc_impact_year_set(self,all_years=True, year_range=None):
         """This function is deprecated, use Impact.impact_per_year instead."""
@@ -467,43 +546,37 @@ class Impact():
                        "Use Impact.impact_per_year instead.")
         return self.impact_per_year(all_years=all_years, year_range=year_range)
 
-#TODO: rewrite and deprecate method
-    def local_exceedance_imp(self, return_periods=(25, 50, 100, 250)):
+    def local_exceedance_imp(self, return_periods=(25, 50, 100, 250), pool=None):
         """Compute exceedance impact map for given return periods.
         Requires attribute imp_mat.
 
+        At each exposure point, the positive impacts are sorted in descending order and a
+        straight line is fitted by least squares to the impacts as function of the
+        logarithm of their cumulative frequencies. The exceedance impacts are read off this
+        line at the return periods. The fits of all exposure points are computed at once
+        from the non-zero entries of the impact matrix, without densifying it.
+
         Parameters
         ----------
         return_periods : Any, optional
             return periods to consider
             Dafault is (25, 50, 100, 250)
+        pool : pathos.pool, optional
+            Pool used to compute blocks of exposure points in parallel. A thread pool
+            (``pathos.pools.ThreadPool``) avoids copying the impact matrix to each worker.
+            Default: None (compute all exposure points at once)
 
         Returns
         -------
         np.array
+            exceedance impact per return period (rows) and exposure point (columns)
         """
         LOGGER.info('Computing exceedance impact map for return periods: %s',
                     return_periods)
-        if self.imp_mat.size == 0:
+        if np.prod(self.imp_mat.shape) == 0:
             raise ValueError('Attribute imp_mat is empty. Recalculate Impact'
                              'instance with parameter save_mat=True')
-        num_cen = self.imp_mat.shape[1]
-        imp_stats = np.zeros((len(return_periods), num_cen))
-        cen_step = CONFIG.max_matrix_size.int() // self.imp_mat.shape[0]
-        if not cen_step:
-            raise ValueError('Increase max_matrix_size configuration parameter to > '
-                             f'{self.imp_mat.shape[0]}')
-        # separte in chunks
-        chk = -1
-        for chk in range(int(num_cen / cen_step)):
-            self._loc_return_imp(np.array(return_periods),
-                                 self.imp_mat[:, chk * cen_step:(chk + 1) * cen_step].toarray(),
-                                 imp_stats[:, chk * cen_step:(chk + 1) * cen_step])
-        self._loc_return_imp(np.array(return_periods),
-                             self.imp_mat[:, (chk + 1) * cen_step:].toarray(),
-                             imp_stats[:, (chk + 1) * cen_step:])
-
-        return imp_stats
+        return u_exc.exceedance_fit(self.imp_mat.tocsr(), self.frequency, return_periods, pool=pool)
 
     def calc_freq_curve(self, return_per=None):
         """Compute impact exceedance frequency curve.
@@ -927,7 +1000,106 @@ class Impact():
 
         imp_wb.close()
 
-    def write_hdf5(self, file_path: Union[str, Path], dense_imp_mat: bool=False):
+    def write_parquet(self, dir_path, imp_mat=False, partition_by=None, agg_regions=None):
+        """Write data into Parquet datasets, readable by common query engines.
+
+        The directory ``dir_path`` will contain the following datasets, each in a
+        subdirectory of the same name:
+
+        - ``events``: one row per event, with columns ``event_idx``, ``event_id``,
+          ``event_name``, ``date``, ``year``, ``frequency`` and ``at_event``.
+        - ``exposures``: one row per exposure point, with columns ``exp_idx``,
+          ``latitude``, ``longitude``, ``eai_exp`` and, if partitioned by region,
+          ``region``.
+        - ``imp_mat`` (optional): one row per non-zero entry of the impact matrix, with
+          columns ``event_idx``, ``event_id``, ``exp_idx`` and ``impact``, plus the
+          partitioning column.
+
+        The remaining attributes are stored in the schema metadata of the ``events``
+        dataset. The columns are built from the arrays of this object without copying
+        them where the types allow. Datasets written before into ``dir_path`` are replaced.
+
+        Parameters
+        ----------
+        dir_path : str or Path
+            directory to write the datasets into. It is created if it does not exist.
+        imp_mat : bool, optional
+            if True, also write the non-zero entries of the impact matrix. Default: False
+        partition_by : str, optional
+            ``'year'`` to partition the events and the impact matrix by event year,
+            ``'region'`` to partition the exposures and the impact matrix by aggregation
+            region. Default: None (no partitioning)
+        agg_regions : np.array, list, optional
+            aggregation region of each exposure point, used if ``partition_by='region'``.
+            Countries (ISO 3166 alpha-3 codes) of the exposure points if None.
+
+        Raises
+        ------
+        ValueError
+            if ``partition_by`` is not one of None, 'year' or 'region', if the impact
+            matrix is written but not stored, or if the number of aggregation regions
+            differs from the number of exposure points
+        """
+        if partition_by not in (None, 'year', 'region'):
+            raise ValueError(f"Unknown partition_by: {partition_by}. Use 'year' or 'region'.")
+        if imp_mat and self.imp_mat.shape != (self.event_id.size, self.coord_exp.shape[0]):
+            raise ValueError("The impact matrix is not stored. Use imp_mat=False.")
+        dir_path = Path(dir_path)
+        LOGGER.info('Writing %s', dir_path)
+
+        event_year = self._get_event_year()
+        attributes = {
+            'haz_type': self.haz_type,
+            'unit': self.unit,
+            'tot_value': float(self._tot_value),
+            'aai_agg': float(self.aai_agg),
+            'frequency_unit': self.frequency_unit,
+            'crs': str(self.crs),
+        }
+        events = pa.table({
+            'event_idx': np.arange(self.event_id.size),
+            'event_id': self.event_id,
+            'event_name': pa.array(list(self.event_name)),
+            'date': self.date,
+            'year': event_year,
+            'frequency': self.frequency,
+            'at_event': self.at_event,
+        }).replace_schema_metadata({'climada': json.dumps(attributes)})
+        exposures = {
+            'exp_idx': np.arange(self.coord_exp.shape[0]),
+            'latitude': np.ascontiguousarray(self.coord_exp[:, 0]),
+            'longitude': np.ascontiguousarray(self.coord_exp[:, 1]),
+            'eai_exp': self.eai_exp,
+        }
+        if partition_by == 'region':
+            reg_unique, reg_idx = self._agg_reg_idx(agg_regions, self.coord_exp.shape[0])
+            exposures['region'] = reg_unique[reg_idx]
+        for dataset in ('events', 'exposures', 'imp_mat'):
+            if (dir_path / dataset).exists():
+                shutil.rmtree(dir_path / dataset)
+        pq.write_to_dataset(events, dir_path / 'events',
+                            partition_cols=['year'] if partition_by == 'year' else None)
+        pq.write_to_dataset(pa.table(exposures), dir_path / 'exposures',
+                            partition_cols=['region'] if partition_by == 'region' else None)
+
+        if imp_mat:
+            mat = self.imp_mat.tocsr()
+            event_idx = np.repeat(np.arange(mat.shape[0]), np.diff(mat.indptr))
+            entries = {
+                'event_idx': event_idx,
+                'event_id': self.event_id[event_idx],
+                'exp_idx': mat.indices,
+                'impact': mat.data,
+            }
+            if partition_by == 'year':
+                entries['year'] = event_year[event_idx]
+            elif partition_by == 'region':
+                entries['region'] = exposures['region'][mat.indices]
+            pq.write_to_dataset(pa.table(entries), dir_path / 'imp_mat',
+                                partition_cols=[partition_by] if partition_by else None)
+
+    def write_hdf5(self, file_path: Union[str, Path], dense_imp_mat: bool=False,
+                   dtype: Union[str, np.dtype, None]=None):
         """Write the data stored in this object into an H5 file.
 
         Try to write all attributes of this class into H5 datasets or attributes.
@@ -945,12 +1117,24 @@ class Impact():
             If ``True``, write the impact matrix as dense matrix that can be more easily
             interpreted by common H5 file readers but takes up (vastly) more space.
             Defaults to ``False``.
+        dtype : str or np.dtype, optional
+            Floating point data type of the impact matrix in the file, ``float32`` or
+            ``float64``, see :py:func:`climada.util.checker.matrix_dtype`. Defaults to the
+            data type of the impact matrix.
 
         Raises
         ------
         TypeError
             If :py:attr:`event_name` does not contain strings exclusively.
+        ValueError
+            If the impact matrix is read on demand from ``file_path`` itself.
         """
+        if isinstance(self.imp_mat, H5CSRMatrix) \
+                and Path(file_path).resolve() == self.imp_mat.file_path.resolve():
+            raise ValueError(f"The impact matrix is read from {file_path}, which therefore"
+                             " cannot be overwritten.")
+        if dtype is not None:
+            dtype = u_check.matrix_dtype(dtype)
         # Define writers for all types (will be filled later)
         type_writers = dict()
 
@@ -1003,12 +1187,12 @@ class Impact():
 
         def _write_csr_dense(group, name, value):
             """Write a CSR Matrix in dense format"""
-            group.create_dataset(name, data=value.toarray())
+            group.create_dataset(name, data=value.toarray(), dtype=dtype)
 
         def _write_csr_sparse(group, name, value):
             """Write a CSR Matrix in sparse format"""
             group = group.create_group(name)
-            group.create_dataset("data", data=value.data)
+            group.create_dataset("data", data=value.data, dtype=dtype)
             group.create_dataset("indices", data=value.indices)
             group.create_dataset("indptr", data=value.indptr)
             group.attrs["shape"] = value.shape
@@ -1020,6 +1204,14 @@ class Impact():
             else:
                 _write_csr_sparse(group, name, value)
 
+        def write_h5_csr(group, name, value):
+            """Write a CSR Matrix stored in another H5 file"""
+            if dense_imp_mat or (dtype is not None and value.dtype != dtype):
+                write_csr(group, name, value.tocsr())
+            else:
+                with h5py.File(value.file_path, "r") as src:
+                    src.copy(src[value.group], group, name)
+
         # Set up writers based on types
         # NOTE: 1) Many things are 'Collection', so make sure that precendence fits!
         #       2) Anything is 'object', so this serves as fallback/default.
@@ -1027,6 +1219,7 @@ class Impact():
             str: write_attribute,
             dict: write_dict,
             sparse.csr_matrix: write_csr,
+            H5CSRMatrix: write_h5_csr,
             Collection: write_dataset,
             object: write_attribute,
         }
@@ -1044,8 +1237,9 @@ class Impact():
     def write_sparse_csr(self, file_name):
         """Write imp_mat matrix in numpy's npz format."""
         LOGGER.info('Writing %s', file_name)
-        np.savez(file_name, data=self.imp_mat.data, indices=self.imp_mat.indices,
-                 indptr=self.imp_mat.indptr, shape=self.imp_mat.shape)
+        imp_mat = self.imp_mat.tocsr()
+        np.savez(file_name, data=imp_mat.data, indices=imp_mat.indices,
+                 indptr=imp_mat.indptr, shape=imp_mat.shape)
 
     @staticmethod
     def read_sparse_csr(file_name):
@@ -1158,7 +1352,60 @@ class Impact():
         self.__dict__ = Impact.from_excel(*args, **kwargs).__dict__
 
     @classmethod
-    def from_hdf5(cls, file_path: Union[str, Path]):
+    def from_parquet(cls, dir_path):
+        """Read Parquet datasets containing impact data generated by write_parquet.
+
+        Parameters
+        ----------
+        dir_path : str or Path
+            directory containing the datasets
+
+        Returns
+        -------
+        imp : climada.engine.impact.Impact
+            Impact from the Parquet datasets. The impact matrix is read if it was written.
+        """
+        dir_path = Path(dir_path)
+        LOGGER.info('Reading %s', dir_path)
+        events = pq.read_table(dir_path / 'events', columns=[
+            'event_idx', 'event_id', 'event_name', 'date', 'frequency', 'at_event'
+        ])
+        attributes = json.loads(events.schema.metadata[b'climada'])
+        events = events.sort_by('event_idx')
+        exposures = pq.read_table(dir_path / 'exposures', columns=[
+            'exp_idx', 'latitude', 'longitude', 'eai_exp'
+        ]).sort_by('exp_idx')
+
+        imp_mat = None
+        if (dir_path / 'imp_mat').exists():
+            entries = pq.read_table(dir_path / 'imp_mat',
+                                    columns=['event_idx', 'exp_idx', 'impact'])
+            imp_mat = sparse.csr_matrix(
+                (entries['impact'].to_numpy(),
+                 (entries['event_idx'].to_numpy(), entries['exp_idx'].to_numpy())),
+                shape=(events.num_rows, exposures.num_rows)
+            )
+
+        return cls(
+            event_id=events['event_id'].to_numpy(),
+            event_name=events['event_name'].to_pylist(),
+            date=events['date'].to_numpy(),
+            frequency=events['frequency'].to_numpy(),
+            frequency_unit=attributes['frequency_unit'],
+            coord_exp=np.stack([exposures['latitude'].to_numpy(),
+                                exposures['longitude'].to_numpy()], axis=1),
+            crs=attributes['crs'],
+            eai_exp=exposures['eai_exp'].to_numpy(),
+            at_event=events['at_event'].to_numpy(),
+            tot_value=attributes['tot_value'],
+            aai_agg=attributes['aai_agg'],
+            unit=attributes['unit'],
+            imp_mat=imp_mat,
+            haz_type=attributes['haz_type'],
+        )
+
+    @classmethod
+    def from_hdf5(cls, file_path: Union[str, Path], lazy: bool = False):
         """Create an impact object from an H5 file.
 
         This assumes a specific layout of the file. If values are not found in the
@@ -1199,10 +1446,18 @@ class Impact():
             ├─ .attrs/
             │  ├─ shape
 
+        With ``lazy=True``, a sparse impact matrix is not read but referenced as
+        :py:class:`climada.util.hdf5_handler.H5CSRMatrix`, which reads only the rows
+        (events) that are used, e.g., by :py:meth:`select` with ``event_ids``. All other
+        attributes are read at once.
+
         Parameters
         ----------
         file_path : str or Path
             The file path of the file to read.
+        lazy : bool, optional
+            If True, read the rows of a sparse impact matrix from the file on demand. The
+            file must not be modified while the impact is in use. Default: False
 
         Returns
         -------
@@ -1217,6 +1472,8 @@ class Impact():
                 impact_matrix = file["imp_mat"]
                 if isinstance(impact_matrix, h5py.Dataset):  # Dense
                     impact_matrix = sparse.csr_matrix(impact_matrix)
+                elif lazy:
+                    impact_matrix = H5CSRMatrix(file_path, "imp_mat")
                 else:  # Sparse
                     impact_matrix = sparse.csr_matrix(
                         (
@@ -1384,36 +1641,6 @@ class Impact():
 
         return imp_list
 
-#TODO: rewrite and deprecate method
-    def _loc_return_imp(self, return_periods, imp, exc_imp):
-        """Compute local exceedence impact for given return period.
-
-        Parameters
-        ----------
-        return_periods : np.array
-            return periods to consider
-        cen_pos :int
-            centroid position
-
-        Returns
-        -------
-        np.array
-        """
-        # sorted impacts
-        sort_pos = np.argsort(imp, axis=0)[::-1, :]
-        columns = np.ones(imp.shape, int)
-        # pylint: disable=unsubscriptable-object  # pylint/issues/3139
-        columns *= np.arange(columns.shape[1])
-        imp_sort = imp[sort_pos, columns]
-        # cummulative frequency at sorted intensity
-        freq_sort = self.frequency[sort_pos]
-        np.cumsum(freq_sort, axis=0, out=freq_sort)
-
-        for cen_idx in range(imp.shape[1]):
-            exc_imp[:, cen_idx] = self._cen_return_imp(
-                imp_sort[:, cen_idx], freq_sort[:, cen_idx],
-                0, return_periods)
-
     def _build_exp(self):
         return Exposures(
             data={
@@ -1468,22 +1695,7 @@ class Impact():
         -------
         np.array
         """
-        imp_th = np.asarray(imp > imp_th).squeeze()
-        imp_cen = imp[imp_th]
-        freq_cen = freq[imp_th]
-        if not imp_cen.size:
-            return np.zeros((return_periods.size,))
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                pol_coef = np.polyfit(np.log(freq_cen), imp_cen, deg=1)
-        except ValueError:
-            pol_coef = np.polyfit(np.log(freq_cen), imp_cen, deg=0)
-        imp_fit = np.polyval(pol_coef, np.log(1 / return_periods))
-        wrong_inten = (return_periods > np.max(1 / freq_cen)) & np.isnan(imp_fit)
-        imp_fit[wrong_inten] = 0.
-
-        return imp_fit
+        return u_exc.cen_exceedance_fit(imp, freq, imp_th, return_periods)
 
     def select(
         self,
@@ -1575,7 +1787,7 @@ class Impact():
                                        "with one dimension matching the number of events. "
                                        "But multidimensional numpy arrays are not handled "
                                        "in impact.select")
-                elif isinstance(value, sparse.csr_matrix):
+                elif isinstance(value, (sparse.csr_matrix, H5CSRMatrix)):
                     setattr(imp, attr, value[sel_ev, :])
                 elif isinstance(value, list) and value:
                     setattr(imp, attr, [value[idx] for idx in sel_ev])
@@ -1593,7 +1805,7 @@ class Impact():
             imp.imp_mat = imp.imp_mat[:, sel_exp]
 
             # .A1 reduce 1d matrix to 1d array
-            imp.at_event = imp.imp_mat.sum(axis=1).A1
+            imp.at_event = imp.imp_mat.sum(axis=1, dtype=np.float64).A1
             imp.tot_value = None
             LOGGER.info("The total value cannot be re-computed for a "
                         "subset of exposures and is set to None.")
@@ -1605,20 +1817,29 @@ class Impact():
                     " dates but the frequency unit here is %s. Consider setting the frequency"
                     " manually for the selection or changing the frequency unit to %s.",
                     self.frequency_unit, DEF_FREQ_UNIT)
-            year_span_old = np.abs(dt.datetime.fromordinal(self.date.max()).year -
-                                   dt.datetime.fromordinal(self.date.min()).year) + 1
-            year_span_new = np.abs(dt.datetime.fromordinal(imp.date.max()).year -
-                                   dt.datetime.fromordinal(imp.date.min()).year) + 1
+            year_span_old = np.ptp(self._get_event_year()) + 1
+            year_span_new = np.ptp(imp._get_event_year()) + 1
             imp.frequency = imp.frequency * year_span_old / year_span_new
 
         # cast frequency vector into 2d array for sparse matrix multiplication
         freq_mat = imp.frequency.reshape(len(imp.frequency), 1)
         # .A1 reduce 1d matrix to 1d array
-        imp.eai_exp = imp.imp_mat.multiply(freq_mat).sum(axis=0).A1
+        imp.eai_exp = imp.imp_mat.tocsr().multiply(freq_mat).sum(axis=0, dtype=np.float64).A1
         imp.aai_agg = imp.eai_exp.sum()
 
         return imp
 
+    def _get_event_year(self):
+        """
+        Return the year of the date of each event.
+
+        Returns
+        -------
+        np.array
+            year of each event
+        """
+        return u_dt.ordinal_to_year(np.asarray(self.date).ravel())
+
     def _selected_events_idx(self, event_ids, event_names, dates, nb_events):
         if all(var is None for var in [dates, event_ids, event_names]):
             return None
@@ -1674,7 +1895,8 @@ class Impact():
         return sel_exp
 
     @classmethod
-    def concat(cls, imp_list: Iterable, reset_event_ids: bool = False):
+    def concat(cls, imp_list: Iterable, reset_event_ids: bool = False,
+               file_path: Union[str, Path, None] = None):
         """Concatenate impact objects with the same exposure
 
         This function is useful if, e.g. different impact functions
@@ -1696,12 +1918,24 @@ class Impact():
         If all impact matrices of the impacts in ``imp_list`` are empty,
         the impact matrix of the concatenated impact is also empty.
 
+        The impacts can be given as HDF5 files written by :py:meth:`write_hdf5`, which are
+        read one at a time. A first pass reads and checks all attributes except the
+        impact matrices, which are then copied one after the other into the preallocated
+        impact matrix of the concatenation. Thus, the memory usage is bounded by the
+        concatenated impact and the largest impact matrix of a single impact. With
+        ``file_path``, the concatenated impact matrix is written to an HDF5 file instead
+        of memory.
+
         Parameters
         ----------
-        imp_list : Iterable of climada.engine.impact.Impact
-            Iterable of Impact objects to concatenate
+        imp_list : Iterable of climada.engine.impact.Impact, str or Path
+            Iterable of Impact objects or of paths to HDF5 files of impacts to concatenate
         reset_event_ids: boolean, optional
             Reset event ids of the concatenated impact object
+        file_path : str or Path, optional
+            If given, the concatenated impact is written to this HDF5 file and its impact
+            matrix is read on demand, see :py:meth:`from_hdf5` with ``lazy=True``. The
+            file must not be one of the concatenated files. Default: None
 
         Returns
         --------
@@ -1713,31 +1947,62 @@ class Impact():
         - Concatenation of impacts with different exposure (e.g. different countries)
           could also be implemented here in the future.
         """
-        def check_unique_attr(attr_name: str):
-            """Check if an attribute is unique among all impacts"""
-            if len({getattr(imp, attr_name) for imp in imp_list}) > 1:
-                raise ValueError(
-                    f"Attribute '{attr_name}' must be unique among impacts"
-                )
+        imp_list = list(imp_list)
+        if file_path is not None:
+            file_path = Path(file_path)
+            in_paths = [Path(imp).resolve() for imp in imp_list if isinstance(imp, (str, Path))]
+            in_paths += [imp.imp_mat.file_path.resolve() for imp in imp_list
+                         if isinstance(imp, Impact) and isinstance(imp.imp_mat, H5CSRMatrix)]
+            if file_path.resolve() in in_paths:
+                raise ValueError(f"The impact matrix of an impact is read from {file_path},"
+                                 " which therefore cannot be overwritten.")
+
+        def load(imp):
+            """Impact object, with the impact matrix read on demand if read from a file"""
+            if isinstance(imp, Impact):
+                return imp
+            return cls.from_hdf5(imp, lazy=True)
+
+        # First pass: all attributes but the impact matrices
+        unique_attrs = {attr: set() for attr in ("crs", "tot_value", "unit", "frequency_unit")}
+        same_coord_exp = True
+        stacked = {attr: [] for attr in ("event_id", "event_name", "date", "frequency",
+                                         "at_event")}
+        mat_shapes, mat_nnz, mat_dtype = [], 0, None
+        eai_exp, aai_agg = None, []
+        first_imp = None
+        for imp in map(load, imp_list):
+            for attr, values in unique_attrs.items():
+                values.add(getattr(imp, attr))
+            if first_imp is None:
+                first_imp = imp
+            elif not np.array_equal(first_imp.coord_exp, imp.coord_exp):
+                same_coord_exp = False
+            for attr, values in stacked.items():
+                values.append(getattr(imp, attr))
+            mat_shapes.append(imp.imp_mat.shape)
+            mat_nnz += imp.imp_mat.nnz
+            mat_dtype = imp.imp_mat.dtype if mat_dtype is None \
+                else np.result_type(mat_dtype, imp.imp_mat.dtype)
+            imp_eai_exp = np.where(np.isnan(imp.eai_exp), 0, imp.eai_exp)
+            eai_exp = imp_eai_exp if eai_exp is None else eai_exp + imp_eai_exp
+            aai_agg.append(imp.aai_agg)
+        if first_imp is None:
+            raise ValueError("There are no impacts to concatenate")
 
         # Check if single-value attribute are unique
-        for attr in ("crs", "tot_value", "unit", "frequency_unit"):
-            check_unique_attr(attr)
+        for attr, values in unique_attrs.items():
+            if len(values) > 1:
+                raise ValueError(
+                    f"Attribute '{attr}' must be unique among impacts"
+                )
 
         # Check exposure coordinates
-        imp_iter = iter(imp_list)
-        first_imp = next(imp_iter)
-        for imp in imp_iter:
-            if not np.array_equal(first_imp.coord_exp, imp.coord_exp):
-                raise ValueError("The impacts have different exposure coordinates")
-
-        # Stack attributes
-        def stack_attribute(attr_name: str) -> np.ndarray:
-            """Stack an attribute of all impacts passed to this method"""
-            return np.concatenate([getattr(imp, attr_name) for imp in imp_list])
+        if not same_coord_exp:
+            raise ValueError("The impacts have different exposure coordinates")
 
         # Concatenate event IDs
-        event_ids = stack_attribute("event_id")
+        event_ids = np.concatenate(stacked.pop("event_id"))
         if reset_event_ids:
             # NOTE: event_ids must not be zero!
             event_ids = np.array(range(len(event_ids))) + 1
@@ -1749,34 +2014,266 @@ class Impact():
                     "Consider setting 'reset_event_ids=True'"
                 )
 
-        # Concatenate impact matrices
-        imp_mats = [imp.imp_mat for imp in imp_list]
-        if len({mat.shape[1] for mat in imp_mats}) > 1:
+        # Check the impact matrices
+        if len({shape[1] for shape in mat_shapes}) > 1:
             raise ValueError(
                 "Impact matrices do not have the same number of exposure points"
             )
-        imp_mat = sparse.vstack(imp_mats)
-
-        # Concatenate other attributes
-        kwargs = {
-            attr: stack_attribute(attr) for attr in ("date", "frequency", "at_event")
-        }
 
         # Get remaining attributes from first impact object in list
-        return cls(
+        kwargs = dict(
             event_id=event_ids,
-            event_name=list(stack_attribute("event_name").flat),
+            event_name=list(np.concatenate(stacked.pop("event_name")).flat),
             coord_exp=first_imp.coord_exp,
             crs=first_imp.crs,
             unit=first_imp.unit,
             tot_value=first_imp.tot_value,
-            eai_exp=np.nansum([imp.eai_exp for imp in imp_list], axis=0),
-            aai_agg=np.nansum([imp.aai_agg for imp in imp_list]),
-            imp_mat=imp_mat,
+            eai_exp=eai_exp,
+            aai_agg=np.nansum(aai_agg),
             haz_type=first_imp.haz_type,
             frequency_unit=first_imp.frequency_unit,
-            **kwargs,
+            **{attr: np.concatenate(values) for attr, values in stacked.items()},
+        )
+        del first_imp, stacked
+
+        # Second pass: copy the impact matrices into the preallocated one
+        shape = (sum(shape[0] for shape in mat_shapes), mat_shapes[0][1])
+        idx_dtype = np.int32 if max(mat_nnz, shape[1]) <= np.iinfo(np.int32).max \
+            else np.int64
+        file = None
+        try:
+            if file_path is None:
+                data = np.empty(mat_nnz, dtype=mat_dtype)
+                indices = np.empty(mat_nnz, dtype=idx_dtype)
+                indptr = np.zeros(shape[0] + 1, dtype=idx_dtype)
+            else:
+                impact = cls(**kwargs)
+                impact.write_hdf5(file_path)
+                file = h5py.File(file_path, "a")
+                del file["imp_mat"]
+                group = file.create_group("imp_mat")
+                group.attrs["shape"] = shape
+                data = group.create_dataset("data", shape=(mat_nnz,), dtype=mat_dtype)
+                indices = group.create_dataset("indices", shape=(mat_nnz,), dtype=idx_dtype)
+                indptr = group.create_dataset("indptr", data=np.zeros(shape[0] + 1,
+                                                                      dtype=idx_dtype))
+            row_start, nnz_start = 0, 0
+            for imp in imp_list:
+                mat = load(imp).imp_mat.tocsr()
+                nnz_end = nnz_start + mat.indptr[-1]
+                data[nnz_start:nnz_end] = mat.data[:mat.indptr[-1]]
+                indices[nnz_start:nnz_end] = mat.indices[:mat.indptr[-1]]
+                indptr[row_start + 1:row_start + mat.shape[0] + 1] = mat.indptr[1:] + nnz_start
+                row_start, nnz_start = row_start + mat.shape[0], nnz_end
+        finally:
+            if file is not None:
+                file.close()
+
+        if file_path is None:
+            return cls(imp_mat=sparse.csr_matrix((data, indices, indptr), shape=shape),
+                       **kwargs)
+        impact.imp_mat = H5CSRMatrix(file_path, "imp_mat")
+        return impact
+
+    def extend_with_events(self, exposures, impfset, new_hazard, assign_centroids=False,
+                           reset_frequency=False):
+        """Extend this impact with the impacts of new hazard events
+
+        Only the impact of the new events is computed, with
+        :py:meth:`climada.engine.impact_calc.ImpactCalc.impact`, and appended to the
+        attributes per event (``event_id``, ``event_name``, ``date``, ``frequency``,
+        ``at_event`` and the rows of ``imp_mat``, if present). The expected impacts
+        ``eai_exp`` and ``aai_agg`` are increased by the contribution of the new events.
+        The impact is modified in place.
+
+        The exposures must be the ones this impact was computed with. By default, the
+        centroids already assigned to the exposures are used, i.e., the new hazard must have
+        the same centroids as the hazard this impact was computed with.
+
+        Parameters
+        ----------
+        exposures : climada.entity.Exposures
+            exposures this impact was computed with
+        impfset : climada.entity.ImpactFuncSet
+            impact functions this impact was computed with
+        new_hazard : climada.hazard.Hazard
+            hazard with the new events only. Its frequencies must be defined on the same
+            basis as the ones of this impact.
+        assign_centroids : bool, optional
+            whether the centroids of the new hazard are assigned to the exposures.
+            Default: False
+        reset_frequency : bool, optional
+            if true, the frequencies of all events are rescaled by the ratio of the number
+            of years spanned by the dates of this impact before and after the extension,
+            as in :py:meth:`select`. ``eai_exp`` and ``aai_agg`` are rescaled accordingly.
+            Default: False
+
+        Raises
+        ------
+        ValueError
+            if the exposures differ from the exposures of this impact, if the hazard type
+            or frequency unit of the new hazard differ from the ones of this impact, or if
+            event ids of the new hazard are already contained in this impact
+
+        See Also
+        --------
+        concat : concatenate impacts with the same exposures
+        """
+        # pylint: disable=import-outside-toplevel
+        from climada.engine.impact_calc import ImpactCalc
+
+        coord_exp = np.stack([exposures.gdf.latitude.values,
+                              exposures.gdf.longitude.values], axis=1)
+        if not np.array_equal(coord_exp, self.coord_exp):
+            raise ValueError("The exposures differ from the exposures of this impact.")
+        if self.haz_type and new_hazard.haz_type != self.haz_type:
+            raise ValueError(f"The hazard type '{new_hazard.haz_type}' of the new hazard differs"
+                             f" from the hazard type '{self.haz_type}' of this impact.")
+        if new_hazard.frequency_unit != self.frequency_unit:
+            raise ValueError(f"The frequency unit '{new_hazard.frequency_unit}' of the new"
+                             f" hazard differs from the frequency unit '{self.frequency_unit}'"
+                             " of this impact.")
+        duplicate_ids = np.intersect1d(self.event_id, new_hazard.event_id)
+        if duplicate_ids.size > 0:
+            raise ValueError(f"Duplicate event IDs: {duplicate_ids}")
+
+        nb_events, nb_exp = self.event_id.size, len(self.coord_exp)
+        save_mat = nb_events * nb_exp > 0 and self.imp_mat.shape == (nb_events, nb_exp)
+        new_imp = ImpactCalc(exposures, impfset, new_hazard).impact(
+            save_mat=save_mat, assign_centroids=assign_centroids
+        )
+
+        date = np.concatenate([self.date, new_imp.date])
+        freq_factor = 1.0
+        if reset_frequency:
+            if self.frequency_unit not in ['1/year', 'annual', '1/y', '1/a']:
+                LOGGER.warning("Resetting the frequency is based on the calendar year of given"
+                    " dates but the frequency unit here is %s. Consider setting the frequency"
+                    " manually or changing the frequency unit to %s.",
+                    self.frequency_unit, DEF_FREQ_UNIT)
+            year_span_old = np.ptp(self._get_event_year()) + 1
+            year_span_new = np.ptp(u_dt.ordinal_to_year(date)) + 1
+            freq_factor = year_span_old / year_span_new
+
+        self.event_id = np.concatenate([self.event_id, new_imp.event_id])
+        self.event_name = list(self.event_name) + list(new_imp.event_name)
+        self.date = date
+        self.frequency = np.concatenate([self.frequency, new_imp.frequency]) * freq_factor
+        self.at_event = np.concatenate([self.at_event, new_imp.at_event])
+        if save_mat:
+            self.imp_mat = sparse.vstack([self.imp_mat.tocsr(), new_imp.imp_mat.tocsr()],
+                                         format='csr')
+        self.eai_exp = (self.eai_exp + new_imp.eai_exp) * freq_factor
+        self.aai_agg = np.sum(self.eai_exp)
+
+    def update_exposures(self, exposures, impfset, hazard, changed=None, removed=None,
+                         assign_centroids=True):
+        """Update this impact to modified exposures
+
+        Only the impact of the added and changed exposure points is computed, with
+        :py:meth:`climada.engine.impact_calc.ImpactCalc.impact`. The columns of the impact
+        matrix, ``eai_exp`` and ``coord_exp`` are updated accordingly and ``at_event``,
+        ``aai_agg`` and ``tot_value`` are recomputed. The impact is modified in place.
+
+        The modified exposures are expected to consist of the exposure points of the
+        previous exposures, without the removed ones and in the same order, followed by
+        the added exposure points. This is the case, e.g., if rows are dropped from and
+        appended to ``exposures.gdf``.
+
+        Parameters
+        ----------
+        exposures : climada.entity.Exposures
+            modified exposures
+        impfset : climada.entity.ImpactFuncSet
+            impact functions this impact was computed with
+        hazard : climada.hazard.Hazard
+            hazard this impact was computed with
+        changed : array-like of int, optional
+            positions of the changed exposure points in the modified exposures, among the
+            points that were neither removed nor added. Default: None (no changes)
+        removed : array-like of int, optional
+            positions of the removed exposure points in the previous exposures, i.e., the
+            removed columns of the impact matrix. Default: None (no removals)
+        assign_centroids : bool, optional
+            whether the centroids of the hazard are assigned to the added and changed
+            exposure points. Default: True
+
+        Raises
+        ------
+        ValueError
+            if this impact has no impact matrix, if the hazard is not the one of this
+            impact, or if the exposure points that are neither changed nor added differ
+            from the ones of this impact
+
+        See Also
+        --------
+        extend_with_events : update this impact to new hazard events
+        """
+        # pylint: disable=import-outside-toplevel
+        from climada.engine.impact_calc import ImpactCalc
+
+        nb_events, nb_exp = self.event_id.size, len(self.coord_exp)
+        if self.imp_mat.shape != (nb_events, nb_exp):
+            raise ValueError("The impact matrix is missing or incomplete. "
+                             "Please recompute the impact with save_mat=True "
+                             "before using impact.update_exposures()")
+        if not np.array_equal(hazard.event_id, self.event_id):
+            raise ValueError("The events of the hazard differ from the events of this impact.")
+        changed = np.unique(np.asarray([] if changed is None else changed, dtype=int))
+        kept = np.delete(np.arange(nb_exp), np.asarray([] if removed is None else removed,
+                                                       dtype=int))
+        nb_exp_new = exposures.gdf.shape[0]
+        if kept.size > nb_exp_new or np.any(changed >= kept.size):
+            raise ValueError("The modified exposures must consist of the points of the "
+                             "previous exposures without the removed points, followed by "
+                             "the added points.")
+        coord_exp = np.stack([exposures.gdf.latitude.values,
+                              exposures.gdf.longitude.values], axis=1)
+        unchanged = np.delete(np.arange(kept.size), changed)
+        if not np.array_equal(coord_exp[unchanged], self.coord_exp[kept[unchanged]]):
+            raise ValueError("The unchanged exposure points differ from the exposure points"
+                             " of this impact.")
+
+        # impact of the changed and added exposure points
+        recomputed = np.concatenate([changed, np.arange(kept.size, nb_exp_new)])
+        dtype = np.float32 if self.imp_mat.dtype == np.float32 else np.float64
+        if recomputed.size == 0:
+            # only removed exposure points, nothing to compute
+            sub_imp_mat = sparse.csr_matrix((nb_events, 0), dtype=dtype)
+            sub_eai_exp = np.zeros(0)
+        else:
+            exp_sub = Exposures(exposures.gdf.iloc[recomputed], crs=exposures.crs)
+            imp_sub = ImpactCalc(exp_sub, impfset, hazard).impact(
+                save_mat=True, assign_centroids=assign_centroids, dtype=dtype
+            )
+            sub_imp_mat, sub_eai_exp = imp_sub.imp_mat, imp_sub.eai_exp
+            if assign_centroids:
+                # by position, the index of the exposures need not be unique
+                if hazard.centr_exp_col not in exposures.gdf.columns:
+                    exposures.gdf[hazard.centr_exp_col] = np.nan
+                exposures.gdf.iloc[
+                    recomputed, exposures.gdf.columns.get_loc(hazard.centr_exp_col)
+                ] = exp_sub.gdf[hazard.centr_exp_col].values
+
+        # move the columns of the unchanged points and insert the recomputed ones
+        col_map = sparse.csr_matrix(
+            (np.ones(nb_exp_new, dtype=dtype),
+             (np.concatenate([kept[unchanged], nb_exp + np.arange(recomputed.size)]),
+              np.concatenate([unchanged, recomputed]))),
+            shape=(nb_exp + recomputed.size, nb_exp_new)
         )
+        self.imp_mat = sparse.hstack(
+            [self.imp_mat.tocsr(), sub_imp_mat], format='csr'
+        ) @ col_map
+        self.imp_mat.sort_indices()
+        eai_exp = np.zeros(nb_exp_new)
+        eai_exp[unchanged] = self.eai_exp[kept[unchanged]]
+        eai_exp[recomputed] = sub_eai_exp
+        self.eai_exp = eai_exp
+        self.aai_agg = np.sum(self.eai_exp)
+        self.at_event = np.asarray(self.imp_mat.sum(axis=1, dtype=np.float64)).ravel()
+        self.coord_exp = coord_exp
+        self.tot_value = exposures.centroids_total_value(hazard)
 
     def match_centroids(self, hazard, distance='euclidean',
                         threshold=u_coord.NEAREST_NEIGHBOR_THRESHOLD):
@@ -1859,3 +2356,4 @@ class ImpactFreqCurve():
             axis.set_xlabel('Return period (year)')
             axis.plot(self.return_per, self.impact, **kwargs)
         return axis
+
@@ -19,18 +19,40 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 Define ImpactCalc class.
 """
 
-__all__ = ['ImpactCalc']
+__all__ = ['ImpactCalc', 'ImpactCalcProfile']
 
+from collections import deque
+import contextlib
 import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import h5py
+import numba
 import numpy as np
+import pandas as pd
 from scipy import sparse
 import geopandas as gpd
 
 from climada import CONFIG
 from climada.engine import Impact
+import climada.util.checker as u_check
+from climada.util.hdf5_handler import H5CSRMatrix
 
 LOGGER = logging.getLogger(__name__)
 
+_IMP_MAT_NNZ_BYTES = 40
+"""Estimated memory in bytes per non-zero entry of an impact sub-matrix, including the
+hazard values at the exposure centroids and the intermediate arrays of its computation"""
+
+_MAX_AGG_RATIO = 0.9
+"""The exposures are only aggregated if the number of unique pairs of centroid and impact
+function is at most this share of the number of exposure points"""
+
 
 class ImpactCalc():
     """
@@ -68,6 +90,12 @@ class ImpactCalc():
         # exposures index to use for matrix reconstruction
         self._orig_exp_idx = np.arange(self.exposures.gdf.shape[0])
 
+        # hazard at the centroids of exposure chunks and prepared exposures, used by impact_many
+        self._hazard_cache = {'active': False, 'hazard_key': (), 'entries': {}, 'exposures': None}
+
+        # records the phases of the computation, see profile
+        self._profile = None
+
     @property
     def n_exp_pnt(self):
         """Number of exposure points (rows in gdf)"""
@@ -78,14 +106,70 @@ class ImpactCalc():
         """Number of hazard events (size of event_id array)"""
         return self.hazard.size
 
+    @contextlib.contextmanager
+    def profile(self, trace_memory=True):
+        """Record the wall time, the number of non-zero entries and the peak memory of the
+        phases of the impact computations within this context.
+
+        The phases are the assignment of the centroids, the selection and aggregation of
+        the exposure points, the computation of each exposure chunk, broken down into the
+        extraction of the hazard at the centroids, the mean damage ratio (including the
+        fraction) and the filling of the sub-matrix, and the stitching of the impact matrix
+        and the risk metrics. Each phase is logged at debug level, a summary at info level
+        when the context is left.
+
+        Parameters
+        ----------
+        trace_memory : bool, optional
+            if true, the peak memory allocated in each phase is traced with
+            :py:mod:`tracemalloc`, which slows down the computation. Default: True
+
+        Yields
+        ------
+        ImpactCalcProfile
+            the records of the phases
+
+        Examples
+        --------
+            >>> icalc = ImpactCalc(exp, impfset, haz)
+            >>> with icalc.profile() as prof:
+            ...     imp = icalc.impact()
+            >>> prof.summary()
+        """
+        prof = ImpactCalcProfile(trace_memory)
+        self._profile = prof
+        prof.start()
+        try:
+            yield prof
+        finally:
+            self._profile = None
+            prof.stop()
+            if prof.records:
+                LOGGER.info('Impact computation phases:\n%s', prof.summary().to_string())
+
+    def _phase(self, name, chunk=None, nnz=None):
+        """Context recording a phase of the computation if it is profiled, see
+        :py:meth:`ImpactCalcProfile.phase`"""
+        if self._profile is None:
+            return contextlib.nullcontext({})
+        return self._profile.phase(name, chunk, nnz)
+
     def impact(self, save_mat=True, assign_centroids=True,
-               ignore_cover=False, ignore_deductible=False):
+               ignore_cover=False, ignore_deductible=False, pool=None, dtype=None):
         """Compute the impact of a hazard on exposures.
 
         Parameters
         ----------
-        save_mat : bool, optional
-            if true, save the total impact matrix (events x exposures)
+        save_mat : bool or str or Path, optional
+            if true, save the total impact matrix (events x exposures). If false and no cover
+            or deductible is applied, the exposure points sharing the same centroid and impact
+            function are aggregated before the computation, which is considerably faster
+            for exposures with many points per centroid.
+            If a file path, the impact is written to this HDF5 file (see
+            :py:meth:`climada.engine.impact.Impact.write_hdf5`) and the impact matrix is
+            streamed into the file chunk by chunk, without holding it in memory. The
+            impact matrix of the returned impact is then read from the file on demand, see
+            :py:class:`climada.util.hdf5_handler.H5CSRMatrix`.
             Default: True
         assign_centroids : bool, optional
             indicates whether centroids are assigned to the self.exposures object.
@@ -101,6 +185,19 @@ class ImpactCalc():
             if set to True, the column 'deductible' of the exposures GeoDataFrame, if present, is
             ignored and the impact it not reduced through values in this column.
             Default: False
+        pool : pathos.pool, optional
+            Pool used to compute the impact sub-matrices of the exposure chunks in parallel.
+            The chunks are collected in their original order and reduced sequentially, so the
+            result is identical to the one obtained without pool. The exposures are chunked
+            per impact function and according to the ``max_matrix_size`` configuration
+            parameter. A thread pool (``pathos.pools.ThreadPool``) is recommended: a process
+            pool copies the hazard to the worker of every chunk.
+            Default: None (compute the chunks sequentially)
+        dtype : str or np.dtype, optional
+            floating point data type of the impact matrix, ``float32`` or ``float64``. The
+            impact per event and the expected impact are accumulated in double precision in
+            either case. Default: the ``matrix_dtype`` configuration parameter, see
+            :py:func:`climada.util.checker.matrix_dtype`
 
         Examples
         --------
@@ -116,6 +213,186 @@ class ImpactCalc():
         apply_deductible_to_mat : apply deductible to impact matrix
         apply_cover_to_mat : apply cover to impact matrix
         """
+        dtype = u_check.matrix_dtype(dtype)
+        impf_col = self._check_impfset()
+        exp_gdf = self.minimal_exp_gdf(impf_col, assign_centroids, ignore_cover, ignore_deductible)
+        if exp_gdf.size == 0:
+            return self._return_empty(save_mat, dtype)
+        LOGGER.info('Calculating impact for %s assets (>0) and %s events.',
+                    exp_gdf.size, self.n_events)
+        if pool:
+            LOGGER.info('Using %s CPUs.', pool.nodes)
+        return self._impact_from_exp_gdf(exp_gdf, impf_col, save_mat, pool, dtype=dtype)
+
+    def impact_many(self, impfsets, save_mat=True, assign_centroids=True,
+                    ignore_cover=False, ignore_deductible=False, pool=None, dtype=None):
+        """Compute the impacts of the hazard on the exposures for several impact function sets.
+
+        The exposures and the hazard are prepared only once for all impact function sets:
+        the centroids are assigned, the exposures filtered and aggregated once, and the hazard
+        intensity and fraction at the centroids of the exposure points are extracted once. All
+        of these are kept by this object for subsequent calls, as long as the hazard, the
+        exposures and the arguments are the same. This is much faster than computing the
+        impacts separately, e.g., when calibrating impact functions or sampling their
+        uncertainty. After modifying the exposures GeoDataFrame in place, create a new
+        ``ImpactCalc``.
+
+        The impact functions of all sets must be defined for the impact function ids of the
+        exposures. The attribute :py:attr:`impfset` is not used.
+
+        Parameters
+        ----------
+        impfsets : iterable of climada.entity.ImpactFuncSet
+            impact function sets used to compute the impacts
+        save_mat : bool, optional
+            if true, save the total impact matrix (events x exposures) of each impact.
+            Default: True
+        assign_centroids : bool, optional
+            indicates whether centroids are assigned to the self.exposures object.
+            Default: True
+        ignore_cover : bool, optional
+            if set to True, the column 'cover' of the exposures GeoDataFrame, if present, is
+            ignored. Default: False
+        ignore_deductible : bool, opotional
+            if set to True, the column 'deductible' of the exposures GeoDataFrame, if present,
+            is ignored. Default: False
+        pool : pathos.pool, optional
+            Pool used to compute the impact sub-matrices in parallel, see :py:meth:`impact`.
+            Default: None
+        dtype : str or np.dtype, optional
+            floating point data type of the impact matrices, see :py:meth:`impact`.
+            Default: the ``matrix_dtype`` configuration parameter
+
+        Returns
+        -------
+        list of Impact
+            one impact per impact function set, in the same order
+
+        See Also
+        --------
+        impact : compute the impact for the impact function set of this object
+
+        Examples
+        --------
+            >>> impfsets = [impf_set_creator(v_half=v_half) for v_half in range(40, 80)]
+            >>> impacts = ImpactCalc(exp, impfsets[0], haz).impact_many(impfsets, save_mat=False)
+            >>> [imp.aai_agg for imp in impacts]
+        """
+        if isinstance(save_mat, (str, Path)):
+            raise ValueError("The impact matrices of several impacts cannot be written to"
+                             " one file. Use 'save_mat=True' and write the impacts.")
+        dtype = u_check.matrix_dtype(dtype)
+        impfsets = list(impfsets)
+        if not impfsets:
+            return []
+        impfset_orig = self.impfset
+        try:
+            for impfset in impfsets:
+                self.impfset = impfset
+                impf_col = self._check_impfset()
+            self._use_hazard_cache()
+            exp_gdf, aggregation = self._prepared_exposures(
+                impf_col, assign_centroids, ignore_cover, ignore_deductible, save_mat
+            )
+            if exp_gdf.size == 0:
+                return [self._return_empty(save_mat, dtype) for _ in impfsets]
+            LOGGER.info('Calculating impacts of %s impact function sets for %s assets (>0)'
+                        ' and %s events.', len(impfsets), exp_gdf.size, self.n_events)
+            if pool:
+                LOGGER.info('Using %s CPUs.', pool.nodes)
+
+            impacts = []
+            for impfset in impfsets:
+                self.impfset = impfset
+                impacts.append(self._impact_from_exp_gdf(
+                    exp_gdf, impf_col, save_mat, pool, aggregation, dtype
+                ))
+            return impacts
+        finally:
+            self.impfset = impfset_orig
+            self._hazard_cache['active'] = False
+
+    def impact_gross_net(self, save_mat=True, assign_centroids=True, pool=None, dtype=None):
+        """Compute the impact of a hazard on exposures without and with applied cover and
+        deductible.
+
+        Both impacts are computed from a single pass over the hazard, which is faster than
+        two calls to :py:meth:`impact` with ``ignore_cover`` and ``ignore_deductible``.
+
+        Parameters
+        ----------
+        save_mat : bool, optional
+            if true, save the total impact matrices (events x exposures). Default: True
+        assign_centroids : bool, optional
+            indicates whether centroids are assigned to the self.exposures object.
+            Default: True
+        pool : pathos.pool, optional
+            Pool used to compute the impact sub-matrices in parallel, see :py:meth:`impact`.
+            Default: None
+        dtype : str or np.dtype, optional
+            floating point data type of the impact matrices, see :py:meth:`impact`.
+            Default: the ``matrix_dtype`` configuration parameter
+
+        Returns
+        -------
+        gross : Impact
+            impact without cover and deductible
+        net : Impact
+            impact with applied cover and deductible (insured impact)
+
+        Raises
+        ------
+        ValueError
+            if save_mat is a file path
+
+        See Also
+        --------
+        impact : compute the impact with or without cover and deductible
+        """
+        if isinstance(save_mat, (str, Path)):
+            raise ValueError("The impact matrices of several impacts cannot be written to"
+                             " one file. Use 'save_mat=True' and write the impacts.")
+        dtype = u_check.matrix_dtype(dtype)
+        impf_col = self._check_impfset()
+        exp_gdf = self.minimal_exp_gdf(impf_col, assign_centroids, False, False)
+        if exp_gdf.size == 0:
+            return self._return_empty(save_mat, dtype), self._return_empty(save_mat, dtype)
+        LOGGER.info('Calculating impact and insured impact for %s assets (>0) and %s events.',
+                    exp_gdf.size, self.n_events)
+        if pool:
+            LOGGER.info('Using %s CPUs.', pool.nodes)
+        imp_mat_gen = self.insured_imp_mat_gen(
+            exp_gdf, impf_col, pool=pool, gross=True, dtype=dtype
+        )
+
+        if save_mat:
+            chunks = list(imp_mat_gen)
+            return tuple(
+                self._return_impact(((mats[i], idx) for mats, idx in chunks), save_mat)
+                for i in range(2)
+            )
+        at_event = np.zeros((2, self.n_events))
+        eai_exp = np.zeros((2, self.n_exp_pnt))
+        for chunk, (mats, idx) in enumerate(imp_mat_gen):
+            with self._phase('risk_metrics', chunk, sum(mat.nnz for mat in mats)):
+                for i, sub_imp_mat in enumerate(mats):
+                    at_event[i] += self.at_event_from_mat(sub_imp_mat)
+                    eai_exp[i, self._orig_exp_idx[idx]] += \
+                        self.eai_exp_from_mat(sub_imp_mat, self.hazard.frequency)
+        return tuple(
+            Impact.from_eih(self.exposures, self.hazard, at_event[i], eai_exp[i],
+                            self.aai_agg_from_eai_exp(eai_exp[i]))
+            for i in range(2)
+        )
+
+    def _check_impfset(self):
+        """Check the compatibility of the impact function set with exposures and hazard
+
+        Returns
+        -------
+        str
+            name of the impact function column in the exposures
+        """
         # check for compatibility of exposures and hazard type
         if all(name not in self.exposures.gdf.columns for
                name in ['if_', f'if_{self.hazard.haz_type}',
@@ -146,25 +423,62 @@ class ImpactCalc():
                 f" hazard type \'{self.hazard.haz_type}\'.\nPlease make sure that all exposure "
                 "points are associated with an impact function that is included in the impact "
                 "function set.")
+        return impf_col
 
-        exp_gdf = self.minimal_exp_gdf(impf_col, assign_centroids, ignore_cover, ignore_deductible)
-        if exp_gdf.size == 0:
-            return self._return_empty(save_mat)
-        LOGGER.info('Calculating impact for %s assets (>0) and %s events.',
-                    exp_gdf.size, self.n_events)
-        imp_mat_gen = self.imp_mat_gen(exp_gdf, impf_col)
+    def _impact_from_exp_gdf(self, exp_gdf, impf_col, save_mat, pool, aggregation=None,
+                             dtype=None):
+        """Compute the impact for the minimal exposures geodataframe
 
-        insured = ('cover' in exp_gdf and exp_gdf.cover.max() >= 0) \
-               or ('deductible' in exp_gdf and exp_gdf.deductible.max() > 0)
-        if insured:
+        See :py:meth:`impact` for the parameters. The aggregation of the exposures
+        (see :py:meth:`_aggregation`) can be passed if it is already known.
+        """
+        if aggregation is None:
+            aggregation = self._aggregation(exp_gdf, impf_col, save_mat)
+        if aggregation:
+            agg_gdf, group_idx = aggregation
+            imp_mat_gen = self.imp_mat_gen(agg_gdf, impf_col, pool=pool, dtype=dtype)
+            return self._return_aggregated_impact(
+                imp_mat_gen, exp_gdf.value.values, group_idx
+            )
+
+        if self._is_insured(exp_gdf):
             LOGGER.info("cover and/or deductible columns detected,"
                         " going to calculate insured impact")
-#TODO: make a better impact matrix generator for insured impacts when
-# the impact matrix is already present
-            imp_mat_gen = self.insured_mat_gen(imp_mat_gen, exp_gdf, impf_col)
+            imp_mat_gen = self.insured_imp_mat_gen(exp_gdf, impf_col, pool=pool, dtype=dtype)
+        else:
+            imp_mat_gen = self.imp_mat_gen(exp_gdf, impf_col, pool=pool, dtype=dtype)
 
         return self._return_impact(imp_mat_gen, save_mat)
 
+    @staticmethod
+    def _is_insured(exp_gdf):
+        """Whether cover or deductible apply to the minimal exposures geodataframe"""
+        return ('cover' in exp_gdf and exp_gdf.cover.max() >= 0) \
+            or ('deductible' in exp_gdf and exp_gdf.deductible.max() > 0)
+
+    def _aggregation(self, exp_gdf, impf_col, save_mat):
+        """Aggregate the exposures if possible
+
+        Without cover, deductible and impact matrix, all exposure points sharing a centroid
+        and an impact function can be computed at once.
+
+        Returns
+        -------
+        tuple or False
+            the output of :py:meth:`aggregate_exp_gdf`, False if the exposures cannot or
+            need not be aggregated
+        """
+        if save_mat or self._is_insured(exp_gdf):
+            return False
+        with self._phase('aggregate_exp_gdf', nnz=exp_gdf.shape[0]):
+            agg_gdf, group_idx = self.aggregate_exp_gdf(exp_gdf, impf_col)
+        if agg_gdf.shape[0] > _MAX_AGG_RATIO * exp_gdf.shape[0]:
+            # too few points share centroid and impact function to pay off
+            return False
+        LOGGER.info('Aggregating exposures to %s unique pairs of centroid and impact'
+                    ' function.', agg_gdf.shape[0])
+        return agg_gdf, group_idx
+
     def _return_impact(self, imp_mat_gen, save_mat):
         """Return an impact object from an impact matrix generator
 
@@ -172,8 +486,9 @@ class ImpactCalc():
         ----------
         imp_mat_gen : generator
             Generator of impact matrix and corresponding exposures index
-        save_mat : boolean
-            if true, save the impact matrix
+        save_mat : boolean or str or Path
+            if true, save the impact matrix. If a file path, write the impact to this file
+            with the impact matrix streamed into it.
 
         Returns
         -------
@@ -185,10 +500,13 @@ class ImpactCalc():
         imp_mat_gen : impact matrix generator
         insured_mat_gen: insured impact matrix generator
         """
+        if isinstance(save_mat, (str, Path)):
+            return self._return_impact_file(imp_mat_gen, Path(save_mat))
         if save_mat:
             imp_mat = self.stitch_impact_matrix(imp_mat_gen)
-            at_event, eai_exp, aai_agg = \
-                self.risk_metrics(imp_mat, self.hazard.frequency)
+            with self._phase('risk_metrics'):
+                at_event, eai_exp, aai_agg = \
+                    self.risk_metrics(imp_mat, self.hazard.frequency)
         else:
             imp_mat = None
             at_event, eai_exp, aai_agg = self.stitch_risk_metrics(imp_mat_gen)
@@ -196,14 +514,175 @@ class ImpactCalc():
             self.exposures, self.hazard, at_event, eai_exp, aai_agg, imp_mat
         )
 
-    def _return_empty(self, save_mat):
+    def _return_impact_file(self, imp_mat_gen, file_path):
+        """Write an impact with its impact matrix from an impact matrix generator to a file
+
+        The sub-matrices are first written to a temporary file next to ``file_path`` while
+        the risk metrics are computed. The impact is then written to ``file_path`` and the
+        impact matrix is assembled there in blocks of events that fit into memory
+        (``max_matrix_size`` configuration parameter).
+
+        Parameters
+        ----------
+        imp_mat_gen : generator
+            Generator of impact matrix and corresponding exposures index
+        file_path : Path
+            HDF5 file to write the impact to
+
+        Returns
+        -------
+        Impact
+            Impact object with the impact matrix read from ``file_path`` on demand
+        """
+        LOGGER.info('Writing impact with impact matrix to %s', file_path)
+        at_event = np.zeros(self.n_events)
+        eai_exp = np.zeros(self.n_exp_pnt)
+        row_nnz = np.zeros(self.n_events, dtype=np.int64)
+        dtype = None
+        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.h5', dir=file_path.parent)
+        os.close(tmp_fd)
+        try:
+            with h5py.File(tmp_path, 'w') as tmp_file:
+                n_chunks = 0
+                for mat, idx in imp_mat_gen:
+                    mat = mat.tocsr()
+                    with self._phase('risk_metrics', n_chunks, mat.nnz):
+                        at_event += self.at_event_from_mat(mat)
+                        eai_exp[self._orig_exp_idx[idx]] += \
+                            self.eai_exp_from_mat(mat, self.hazard.frequency)
+                    with self._phase('write_chunk', n_chunks, mat.nnz):
+                        row_nnz[:mat.shape[0]] += np.diff(mat.indptr)
+                        dtype = mat.dtype if dtype is None \
+                            else np.result_type(dtype, mat.dtype)
+                        group = tmp_file.create_group(str(n_chunks))
+                        group.create_dataset('data', data=mat.data)
+                        group.create_dataset('indices', data=mat.indices)
+                        group.create_dataset('indptr', data=np.pad(
+                            mat.indptr, (0, self.n_events - mat.shape[0]), mode='edge'
+                        ))
+                        group.create_dataset('cols', data=self._orig_exp_idx[idx])
+                    n_chunks += 1
+            aai_agg = self.aai_agg_from_eai_exp(eai_exp)
+            impact = Impact.from_eih(
+                self.exposures, self.hazard, at_event, eai_exp, aai_agg
+            )
+            impact.write_hdf5(file_path)
+            with h5py.File(file_path, 'a') as file, h5py.File(tmp_path, 'r') as tmp_file, \
+                    self._phase('stitch', nnz=int(row_nnz.sum())):
+                del file['imp_mat']
+                self._write_stitched_impact_matrix(
+                    file.create_group('imp_mat'),
+                    [tmp_file[str(chunk)] for chunk in range(n_chunks)],
+                    row_nnz, u_check.matrix_dtype(dtype)
+                )
+        finally:
+            os.remove(tmp_path)
+        impact.imp_mat = H5CSRMatrix(file_path, 'imp_mat')
+        return impact
+
+    def _write_stitched_impact_matrix(self, group, chunk_groups, row_nnz, dtype):
+        """Write the impact matrix stitched from sub-matrices in HDF5 groups
+
+        Parameters
+        ----------
+        group : h5py.Group
+            empty group to write the impact matrix to, in the format read by
+            :py:class:`climada.util.hdf5_handler.H5CSRMatrix`
+        chunk_groups : list of h5py.Group
+            groups with the sub-matrices (datasets 'data', 'indices' and 'indptr') and the
+            corresponding columns of the impact matrix (dataset 'cols')
+        row_nnz : np.array
+            number of non-zero entries of the impact matrix per event
+        dtype : np.dtype
+            data type of the impact matrix
+        """
+        nnz = int(row_nnz.sum())
+        idx_dtype = np.int32 if max(nnz, self.n_exp_pnt) <= np.iinfo(np.int32).max else np.int64
+        indptr = np.zeros(self.n_events + 1, dtype=idx_dtype)
+        np.cumsum(row_nnz, out=indptr[1:])
+        group.attrs['shape'] = (self.n_events, self.n_exp_pnt)
+        group.create_dataset('indptr', data=indptr)
+        data_ds = group.create_dataset('data', shape=(nnz,), dtype=dtype)
+        indices_ds = group.create_dataset('indices', shape=(nnz,), dtype=idx_dtype)
+
+        # blocks of events whose entries fit into the memory budget
+        max_nnz = max(CONFIG.max_matrix_size.int() * np.dtype(float).itemsize
+                      // _IMP_MAT_NNZ_BYTES, 1)
+        block_id = indptr[:-1] // max_nnz
+        starts = np.append(0, np.flatnonzero(np.diff(block_id)) + 1)
+        ends = np.append(starts[1:], self.n_events)
+        cols = [chunk['cols'][:].astype(idx_dtype) for chunk in chunk_groups]
+        for start, end in zip(starts, ends):
+            block_indptr = indptr[start:end + 1] - indptr[start]
+            data = np.empty(block_indptr[-1], dtype=dtype)
+            indices = np.empty(block_indptr[-1], dtype=idx_dtype)
+            cursor = block_indptr[:-1].copy()
+            for chunk, chunk_cols in zip(chunk_groups, cols):
+                chunk_indptr = chunk['indptr'][start:end + 1]
+                _stitch_rows(
+                    chunk_indptr - chunk_indptr[0],
+                    chunk['indices'][chunk_indptr[0]:chunk_indptr[-1]],
+                    chunk['data'][chunk_indptr[0]:chunk_indptr[-1]],
+                    chunk_cols, cursor, data, indices
+                )
+            block = sparse.csr_matrix(
+                (data, indices, block_indptr), shape=(end - start, self.n_exp_pnt)
+            )
+            block.sort_indices()
+            data_ds[indptr[start]:indptr[end]] = block.data
+            indices_ds[indptr[start]:indptr[end]] = block.indices
+
+    def _return_aggregated_impact(self, imp_mat_gen, exp_values, group_idx):
+        """Return an impact object (without impact matrix) from an impact matrix generator
+        over aggregated exposures
+
+        The generator must yield the impact per unit value of each group of exposure points,
+        i.e., it is computed from the output of :py:meth:`aggregate_exp_gdf`. The impact per
+        event is computed from the summed values of the groups, while the expected impact
+        of each group is distributed to its exposure points pro rata of their values.
+
+        Parameters
+        ----------
+        imp_mat_gen : generator
+            Generator of impact matrix per unit value and corresponding group index
+        exp_values : np.array
+            Values of the (non-aggregated) exposure points
+        group_idx : np.array
+            Index of the group for each exposure point
+
+        Returns
+        -------
+        Impact
+            Impact Object without impact matrix
+
+        See Also
+        --------
+        aggregate_exp_gdf : aggregate exposure points with same centroid and impact function
+        """
+        group_values = np.bincount(group_idx, weights=exp_values)
+        at_event = np.zeros(self.n_events)
+        eai_group = np.zeros(group_values.size)
+        for chunk, (sub_imp_mat, idx) in enumerate(imp_mat_gen):
+            with self._phase('risk_metrics', chunk, sub_imp_mat.nnz):
+                at_event += sub_imp_mat @ group_values[idx]
+                eai_group[idx] = self.eai_exp_from_mat(sub_imp_mat, self.hazard.frequency)
+        eai_exp = np.zeros(self.n_exp_pnt)
+        eai_exp[self._orig_exp_idx] = exp_values * eai_group[group_idx]
+        aai_agg = self.aai_agg_from_eai_exp(eai_exp)
+        return Impact.from_eih(
+            self.exposures, self.hazard, at_event, eai_exp, aai_agg, None
+        )
+
+    def _return_empty(self, save_mat, dtype=None):
         """
         Return empty impact.
 
         Parameters
         ----------
-        save_mat : bool
-              If true, save impact matrix
+        save_mat : bool or str or Path
+              If true, save impact matrix. If a file path, write the impact to this file.
+        dtype : str or np.dtype, optional
+              data type of the impact matrix. Default: ``matrix_dtype`` configuration parameter
 
         Returns
         -------
@@ -215,13 +694,17 @@ class ImpactCalc():
         aai_agg = 0.0
         if save_mat:
             imp_mat = sparse.csr_matrix((
-                self.n_events, self.n_exp_pnt), dtype=np.float64
+                self.n_events, self.n_exp_pnt), dtype=u_check.matrix_dtype(dtype)
                 )
         else:
             imp_mat = None
-        return Impact.from_eih(
+        impact = Impact.from_eih(
             self.exposures, self.hazard, at_event, eai_exp, aai_agg, imp_mat
         )
+        if isinstance(save_mat, (str, Path)):
+            impact.write_hdf5(save_mat, dtype=imp_mat.dtype)
+            impact.imp_mat = H5CSRMatrix(save_mat, 'imp_mat')
+        return impact
 
     def minimal_exp_gdf(self, impf_col, assign_centroids, ignore_cover, ignore_deductible):
         """Get minimal exposures geodataframe for impact computation
@@ -246,34 +729,73 @@ class ImpactCalc():
             the returned GeoDataFrame, otherwise it is included if present.
         """
         if assign_centroids:
-            self.exposures.assign_centroids(self.hazard, overwrite=True)
+            with self._phase('assign_centroids', nnz=self.n_exp_pnt):
+                self.exposures.assign_centroids(self.hazard, overwrite=True)
         elif self.hazard.centr_exp_col not in self.exposures.gdf.columns:
             raise ValueError("'assign_centroids' is set to 'False' but no centroids are assigned"
                              f" for the given hazard type ({self.hazard.haz_type})."
                              " Run 'exposures.assign_centroids()' beforehand or set"
                              " 'assign_centroids' to 'True'")
-        mask = (
-            (self.exposures.gdf.value.values == self.exposures.gdf.value.values)  # value != NaN
-            & (self.exposures.gdf.value.values != 0)                              # value != 0
-            & (self.exposures.gdf[self.hazard.centr_exp_col].values >= 0)    # centroid assigned
-        )
-
-        columns = ['value', impf_col, self.hazard.centr_exp_col]
-        if not ignore_cover and 'cover' in self.exposures.gdf:
-            columns.append('cover')
-        if not ignore_deductible and 'deductible' in self.exposures.gdf:
-            columns.append('deductible')
-        exp_gdf = gpd.GeoDataFrame(
-            {col: self.exposures.gdf[col].values[mask]
-            for col in columns},
+        with self._phase('minimal_exp_gdf', nnz=self.n_exp_pnt):
+            mask = (
+                (self.exposures.gdf.value.values == self.exposures.gdf.value.values)  # != NaN
+                & (self.exposures.gdf.value.values != 0)                              # != 0
+                & (self.exposures.gdf[self.hazard.centr_exp_col].values >= 0)   # centroid
             )
+
+            columns = ['value', impf_col, self.hazard.centr_exp_col]
+            if not ignore_cover and 'cover' in self.exposures.gdf:
+                columns.append('cover')
+            if not ignore_deductible and 'deductible' in self.exposures.gdf:
+                columns.append('deductible')
+            exp_gdf = gpd.GeoDataFrame(
+                {col: self.exposures.gdf[col].values[mask]
+                for col in columns},
+                )
         if exp_gdf.size == 0:
             LOGGER.warning("No exposures with value >0 in the vicinity of the hazard.")
         self._orig_exp_idx = mask.nonzero()[0]  # update index of kept exposures points in exp_gdf
                                                 # within the full exposures
         return exp_gdf
 
-    def imp_mat_gen(self, exp_gdf, impf_col):
+    def aggregate_exp_gdf(self, exp_gdf, impf_col):
+        """Aggregate the exposure points sharing the same centroid and impact function
+
+        The impact of such exposure points only differs by their value. The returned
+        geodataframe contains one row per unique pair of centroid and impact function,
+        with a value of 1.
+
+        Parameters
+        ----------
+        exp_gdf : GeoDataFrame
+            Geodataframe of the exposures with columns required for impact
+            computation, as returned by :py:meth:`minimal_exp_gdf`.
+        impf_col : str
+            name of the impact function column in the exposures.
+
+        Returns
+        -------
+        agg_gdf : GeoDataFrame
+            Geodataframe with columns impf_col, the centroids column and 'value'
+        group_idx : np.array
+            Index of the row in agg_gdf for each exposure point in exp_gdf
+        """
+        centr_col = self.hazard.centr_exp_col
+        impf_ids = exp_gdf[impf_col].values
+        cent_idx = exp_gdf[centr_col].values
+        # one integer key per pair of impact function and centroid, sorted as the pairs
+        _, impf_code = np.unique(impf_ids, return_inverse=True)
+        pair_key = impf_code.ravel().astype(np.int64) * self.hazard.centroids.size \
+            + cent_idx.astype(np.int64)
+        _, first_idx, group_idx = np.unique(pair_key, return_index=True, return_inverse=True)
+        agg_gdf = gpd.GeoDataFrame({
+            impf_col: impf_ids[first_idx],
+            centr_col: cent_idx[first_idx],
+            'value': np.ones(first_idx.size),
+        })
+        return agg_gdf, group_idx.ravel()
+
+    def imp_mat_gen(self, exp_gdf, impf_col, pool=None, dtype=None):
         """
         Generator of impact sub-matrices and correspoding exposures indices
 
@@ -281,6 +803,18 @@ class ImpactCalc():
         defined memory size. For each chunk, the impact matrix is computed
         and returned, together with the corresponding exposures points index.
 
+        The memory needed for a chunk is estimated from the number of non-zero
+        hazard intensities at the centroids of its exposure points, such that
+        the chunks of a sparse hazard are correspondingly larger. The memory
+        budget of a chunk is that of a dense float matrix with
+        ``max_matrix_size`` elements (configuration parameter).
+
+        If a pool is given, the chunks are computed in parallel, but they are
+        yielded in the same order as in the sequential case. The decomposition
+        into chunks does not depend on the pool. At most two chunks per worker
+        are computed ahead of the consumer, such that the memory held by computed
+        chunks is bounded.
+
         Parameters
         ----------
         exp_gdf : GeoDataFrame
@@ -288,11 +822,11 @@ class ImpactCalc():
             computation.
         impf_col : str
             name of the desired impact column in the exposures.
-
-        Raises
-        ------
-        ValueError
-            if the hazard is larger than the memory limit
+        pool : pathos.pool, optional
+            Pool used to compute the chunks in parallel. Default: None
+        dtype : str or np.dtype, optional
+            floating point data type of the sub-matrices. Default: the ``matrix_dtype``
+            configuration parameter
 
         Yields
         ------
@@ -301,31 +835,134 @@ class ImpactCalc():
 
         """
 
-        def _chunk_exp_idx(haz_size, idx_exp_impf):
+        def _chunk_mat(exp_idx, impf):
+            exp_values = exp_gdf.value.values[exp_idx]
+            cent_idx = exp_gdf[self.hazard.centr_exp_col].values[exp_idx]
+            return self.impact_matrix(exp_values, cent_idx, impf, dtype=dtype)
+
+        yield from self._chunk_gen(exp_gdf, impf_col, _chunk_mat, pool)
+
+    def insured_imp_mat_gen(self, exp_gdf, impf_col, pool=None, gross=False, dtype=None):
+        """
+        Generator of insured impact sub-matrices (with applied cover and deductible)
+        and corresponding exposures indices
+
+        Like :py:meth:`imp_mat_gen`, but the sub-matrices are computed with
+        :py:meth:`insured_impact_matrix`, i.e., the hazard is read only once per chunk for
+        both the impact and the deductible. Deductible and cover are taken from the columns
+        'deductible' and 'cover' of ``exp_gdf``, if present.
+
+        Parameters
+        ----------
+        exp_gdf : GeoDataFrame
+            Geodataframe of the exposures with columns required for impact
+            computation.
+        impf_col : str
+            name of the desired impact column in the exposures.
+        pool : pathos.pool, optional
+            Pool used to compute the chunks in parallel. Default: None
+        gross : bool, optional
+            if true, yield the tuple of impact sub-matrices without and with applied
+            cover and deductible instead of the insured sub-matrix only. Default: False
+        dtype : str or np.dtype, optional
+            floating point data type of the sub-matrices. Default: the ``matrix_dtype``
+            configuration parameter
+
+        Yields
+        ------
+        scipy.sparse.crs_matrix or tuple(scipy.sparse.csr_matrix, scipy.sparse.csr_matrix)
+            insured impact sub-matrix, or tuple of impact and insured impact sub-matrices
+        np.ndarray
+            corresponding exposures indices for each chunk.
+        """
+
+        def _chunk_mat(exp_idx, impf):
+            exp_values = exp_gdf.value.values[exp_idx]
+            cent_idx = exp_gdf[self.hazard.centr_exp_col].values[exp_idx]
+            deductible = exp_gdf.deductible.values[exp_idx] if 'deductible' in exp_gdf else None
+            cover = exp_gdf.cover.values[exp_idx] if 'cover' in exp_gdf else None
+            mats = self.insured_impact_matrix(
+                exp_values, cent_idx, impf, deductible, cover, dtype=dtype
+            )
+            return mats if gross else mats[1]
+
+        yield from self._chunk_gen(exp_gdf, impf_col, _chunk_mat, pool)
+
+    def _chunk_gen(self, exp_gdf, impf_col, chunk_mat, pool):
+        """Decompose the exposures into chunks and compute them, see :py:meth:`imp_mat_gen`
+
+        Parameters
+        ----------
+        exp_gdf : GeoDataFrame
+            Geodataframe of the exposures with columns required for impact
+            computation.
+        impf_col : str
+            name of the desired impact column in the exposures.
+        chunk_mat : callable
+            computes the output for the exposure indices and the impact function of a chunk
+        pool : pathos.pool
+            Pool used to compute the chunks in parallel, or None. At most ``2 * pool.nodes``
+            chunks are submitted to the pool ahead of the consumer.
+
+        Yields
+        ------
+        object, np.ndarray
+            output of chunk_mat and corresponding exposures indices for each chunk.
+        """
+
+        def _chunk_exp_idx(idx_exp_impf, impf):
             '''
             Chunk computations in sizes that roughly fit into memory
             '''
-            max_size = CONFIG.max_matrix_size.int()
-            if haz_size > max_size:
-                raise ValueError(
-                    f"Hazard size '{haz_size}' exceeds maximum matrix size '{max_size}'. "
-                    "Increase max_matrix_size configuration parameter accordingly."
-                )
-            n_chunks = np.ceil(haz_size * len(idx_exp_impf) / max_size)
-            return np.array_split(idx_exp_impf, n_chunks)
-
-        for impf_id in exp_gdf[impf_col].dropna().unique():
-            impf = self.impfset.get_func(
-                haz_type=self.hazard.haz_type, fun_id=impf_id
-                )
-            idx_exp_impf = (exp_gdf[impf_col].values == impf_id).nonzero()[0]
-            for exp_idx in _chunk_exp_idx(self.hazard.size, idx_exp_impf):
-                exp_values = exp_gdf.value.values[exp_idx]
-                cent_idx = exp_gdf[self.hazard.centr_exp_col].values[exp_idx]
-                yield (
-                    self.impact_matrix(exp_values, cent_idx, impf),
-                    exp_idx
+            max_bytes = CONFIG.max_matrix_size.int() * np.dtype(float).itemsize
+            if impf.calc_mdr(0) != 0:
+                # every event has an impact at every exposure point
+                exp_nnz = np.full(idx_exp_impf.size, self.hazard.size)
+            else:
+                cent_idx = exp_gdf[self.hazard.centr_exp_col].values[idx_exp_impf]
+                exp_nnz = centr_nnz[cent_idx]
+            # memory taken by each exposure point, counting one entry for the point itself
+            exp_bytes = (exp_nnz + 1) * _IMP_MAT_NNZ_BYTES
+            # assign each exposure point to the chunk in which its memory starts
+            chunk_id = (np.cumsum(exp_bytes) - exp_bytes) // max_bytes
+            return np.split(idx_exp_impf, np.flatnonzero(np.diff(chunk_id)) + 1)
+
+        def _chunks():
+            chunk = 0
+            for impf_id in exp_gdf[impf_col].dropna().unique():
+                impf = self.impfset.get_func(
+                    haz_type=self.hazard.haz_type, fun_id=impf_id
                     )
+                idx_exp_impf = (exp_gdf[impf_col].values == impf_id).nonzero()[0]
+                for exp_idx in _chunk_exp_idx(idx_exp_impf, impf):
+                    yield chunk, exp_idx, impf
+                    chunk += 1
+
+        def _chunk_out(chunk):
+            chunk, exp_idx, impf = chunk
+            with self._phase('chunk', chunk) as record:
+                out = chunk_mat(exp_idx, impf)
+                record['nnz'] = sum(mat.nnz for mat in out) if isinstance(out, tuple) \
+                    else out.nnz
+            return out, exp_idx
+
+        if exp_gdf.shape[0] == 0:
+            return
+        # number of non-zero intensities per centroid
+        centr_nnz = np.diff(self.hazard._get_csc('intensity').indptr)
+        if pool:
+            # the chunks are yielded in their original order, such that the subsequent
+            # reduction is carried out in the same order as in the sequential case, and at
+            # most two chunks per worker are computed ahead of the consumer
+            pending = deque()
+            for chunk in _chunks():
+                pending.append(pool.apipe(_chunk_out, chunk))
+                if len(pending) >= 2 * pool.nodes:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        else:
+            yield from map(_chunk_out, _chunks())
 
     def insured_mat_gen(self, imp_mat_gen, exp_gdf, impf_col):
         """
@@ -370,29 +1007,334 @@ class ImpactCalc():
                 mat = self.apply_cover_to_mat(mat, cover)
             yield (mat, exp_idx)
 
-    def impact_matrix(self, exp_values, cent_idx, impf):
+    def impact_matrix(self, exp_values, cent_idx, impf, dtype=None):
         """
         Compute the impact matrix for given exposure values,
         assigned centroids, a hazard, and one impact function.
 
+        The intensity (and fraction) of the hazard at the centroids of the exposure points
+        is read once from its column-oriented copy and the impact matrix is filled
+        directly, without intermediate matrices for the mean damage ratio and the fraction.
+
         Parameters
         ----------
         exp_values : np.array
             Exposure values
         cent_idx : np.array
             Hazard centroids assigned to each exposure location
-        hazard : climada.Hazard
-           Hazard object
         impf : climada.entity.ImpactFunc
             one impactfunction comon to all exposure elements in exp_gdf
+        dtype : str or np.dtype, optional
+            floating point data type of the impact matrix. The impacts are computed in double
+            precision and rounded once when stored. Default: the ``matrix_dtype``
+            configuration parameter
 
         Returns
         -------
         scipy.sparse.csr_matrix
             Impact per event (rows) per exposure point (columns)
+
+        Raises
+        ------
+        ValueError
+            if exp_values and cent_idx have different sizes
+        """
+        n_exp_pnt = len(cent_idx)
+        if len(exp_values) != n_exp_pnt:
+            raise ValueError(
+                f"Number of exposure values ({len(exp_values)}) and of centroids"
+                f" ({n_exp_pnt}) differ."
+            )
+        dtype = u_check.matrix_dtype(dtype)
+        if impf.calc_mdr(0) != 0:
+            # the mdr does not vanish outside of the hazard footprint
+            with self._phase('mdr', nnz=self.n_events * n_exp_pnt):
+                return self._impact_matrix_dense_mdr(exp_values, cent_idx, impf).astype(dtype)
+
+        with self._phase('hazard_at_centroids') as record:
+            _, exp_pos, intensity, fraction = self._hazard_at_centroids(cent_idx)
+            record['nnz'] = intensity.nnz
+        with self._phase('mdr', nnz=intensity.nnz):
+            ent_fact = impf.calc_mdr(intensity.data)
+            if fraction is not None:
+                ent_fact = fraction * ent_fact
+
+        with self._phase('fill') as record:
+            # discard entries without impact
+            nonzero = ent_fact != 0
+            ent_ptr, ent_row, indptr = self._entry_layout(intensity, exp_pos, nonzero)
+            data = np.empty(indptr[-1], dtype=dtype)
+            indices = np.empty(indptr[-1], dtype=indptr.dtype)
+            _fill_impact_matrix(
+                ent_ptr, ent_row, ent_fact[nonzero], exp_pos,
+                np.asarray(exp_values, dtype=np.float64), indptr, data, indices
+            )
+            record['nnz'] = int(indptr[-1])
+        mat = sparse.csr_matrix((data, indices, indptr), shape=(intensity.shape[0], n_exp_pnt))
+        mat.has_sorted_indices = True
+        mat.eliminate_zeros()
+        return mat
+
+    def insured_impact_matrix(self, exp_values, cent_idx, impf, deductible=None, cover=None,
+                              dtype=None):
+        """
+        Compute the impact matrix without and with applied deductible and cover for given
+        exposure values, assigned centroids, a hazard, and one impact function.
+
+        The hazard is read once for both matrices: the deductible is weighted with the
+        percentage of affected assets (paa) at the same hazard entries as the mean damage
+        ratio, see :py:meth:`apply_deductible_to_mat` and :py:meth:`apply_cover_to_mat`.
+
+        Parameters
+        ----------
+        exp_values : np.array
+            Exposure values
+        cent_idx : np.array
+            Hazard centroids assigned to each exposure location
+        impf : climada.entity.ImpactFunc
+            one impactfunction comon to all exposure elements in exp_gdf
+        deductible : np.array, optional
+            deductible for each exposure point. Default: None (no deductible)
+        cover : np.array, optional
+            cover for each exposure point. Default: None (no cover)
+        dtype : str or np.dtype, optional
+            floating point data type of the impact matrices, see :py:meth:`impact_matrix`.
+            Default: the ``matrix_dtype`` configuration parameter
+
+        Returns
+        -------
+        imp_mat : scipy.sparse.csr_matrix
+            Impact per event (rows) per exposure point (columns)
+        ins_mat : scipy.sparse.csr_matrix
+            Impact with applied deductible and cover per event (rows) per exposure point
+            (columns)
+
+        Raises
+        ------
+        ValueError
+            if exp_values and cent_idx have different sizes
+        """
+        n_exp_pnt = len(cent_idx)
+        if len(exp_values) != n_exp_pnt:
+            raise ValueError(
+                f"Number of exposure values ({len(exp_values)}) and of centroids"
+                f" ({n_exp_pnt}) differ."
+            )
+        dtype = u_check.matrix_dtype(dtype)
+        if impf.calc_mdr(0) != 0:
+            # the mdr does not vanish outside of the hazard footprint
+            imp_mat = sparse.csr_matrix(self._impact_matrix_dense_mdr(exp_values, cent_idx, impf))
+            ins_mat = imp_mat.copy()
+            if deductible is not None:
+                ins_mat = self.apply_deductible_to_mat(
+                    ins_mat, deductible, self.hazard, cent_idx, impf
+                )
+            if cover is not None:
+                ins_mat = self.apply_cover_to_mat(ins_mat, cover)
+            return imp_mat.astype(dtype), ins_mat.astype(dtype)
+
+        with self._phase('hazard_at_centroids') as record:
+            _, exp_pos, intensity, fraction = self._hazard_at_centroids(cent_idx)
+            record['nnz'] = intensity.nnz
+        with self._phase('mdr', nnz=intensity.nnz):
+            ent_fact = impf.calc_mdr(intensity.data)
+            if fraction is not None:
+                ent_fact = fraction * ent_fact
+            if deductible is None:
+                ent_paa = np.zeros_like(ent_fact)
+                deductible = np.zeros(n_exp_pnt)
+            else:
+                ent_paa = np.interp(intensity.data, impf.intensity, impf.paa)
+
+        with self._phase('fill') as record:
+            # discard entries without impact or deductible
+            nonzero = (ent_fact != 0) | (ent_paa != 0)
+            ent_ptr, ent_row, indptr = self._entry_layout(intensity, exp_pos, nonzero)
+            data = np.empty(indptr[-1], dtype=dtype)
+            ins_data = np.empty(indptr[-1], dtype=dtype)
+            indices = np.empty(indptr[-1], dtype=indptr.dtype)
+            _fill_insured_impact_matrix(
+                ent_ptr, ent_row, ent_fact[nonzero], ent_paa[nonzero], exp_pos,
+                np.asarray(exp_values, dtype=np.float64),
+                np.asarray(deductible, dtype=np.float64),
+                np.zeros(n_exp_pnt) if cover is None else np.asarray(cover, dtype=np.float64),
+                cover is not None, indptr, data, ins_data, indices
+            )
+            record['nnz'] = int(indptr[-1])
+        shape = (intensity.shape[0], n_exp_pnt)
+        imp_mat = sparse.csr_matrix((data, indices, indptr), shape=shape)
+        ins_mat = sparse.csr_matrix((ins_data, indices.copy(), indptr.copy()), shape=shape)
+        for mat in [imp_mat, ins_mat]:
+            mat.has_sorted_indices = True
+            mat.eliminate_zeros()
+        return imp_mat, ins_mat
+
+    @staticmethod
+    def _entry_layout(intensity, exp_pos, selection):
+        """Layout of the impact matrix computed from selected hazard entries
+
+        Parameters
+        ----------
+        intensity : sparse.csc_matrix
+            intensity at the unique centroids of the exposure points, with sorted indices
+        exp_pos : np.array
+            position of the centroid of each exposure point in the columns of intensity
+        selection : np.array of bool
+            hazard entries (intensity.data) contributing to the impact matrix
+
+        Returns
+        -------
+        ent_ptr : np.array
+            the selected entries at centroid position i are ent_ptr[i]:ent_ptr[i + 1]
+        ent_row : np.array
+            row (event) of the selected entries
+        indptr : np.array
+            index pointer of the impact matrix, of the index data type of the matrix
         """
-        n_exp_pnt = len(cent_idx)  # implicitly checks in matrix assignement whether
-                                   # len(cent_idx) == len(exp_values)
+        n_cent = intensity.shape[1]
+        ent_cent = np.repeat(np.arange(n_cent), np.diff(intensity.indptr))[selection]
+        ent_row = intensity.indices[selection]
+        ent_ptr = np.zeros(n_cent + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ent_cent, minlength=n_cent), out=ent_ptr[1:])
+
+        n_events = intensity.shape[0]
+        row_nnz = np.bincount(
+            ent_row, weights=np.bincount(exp_pos, minlength=n_cent)[ent_cent],
+            minlength=n_events
+        ).astype(np.int64)
+        nnz = row_nnz.sum()
+        idx_dtype = np.int32 if max(nnz, exp_pos.size) <= np.iinfo(np.int32).max else np.int64
+        indptr = np.zeros(n_events + 1, dtype=idx_dtype)
+        np.cumsum(row_nnz, out=indptr[1:])
+        return ent_ptr, ent_row, indptr
+
+    def _use_hazard_cache(self):
+        """Activate the cache of the hazard at the centroids of the exposure chunks
+
+        The cache is kept between calls of :py:meth:`impact_many`. It is cleared, together with
+        the prepared exposures, see :py:meth:`_prepared_exposures`, when the hazard or its
+        intensity or fraction matrices changed since the last call, as detected through the
+        column-oriented copies of the matrices, see
+        :py:meth:`climada.hazard.base.Hazard._get_csc`.
+        """
+        # pylint: disable=protected-access
+        hazard_key = (
+            self.hazard,
+            self.hazard._get_csc('intensity'),
+            self.hazard._get_csc('fraction') if self.hazard._get_fraction() is not None
+            else None,
+        )
+        cached_key = self._hazard_cache['hazard_key']
+        if (len(cached_key) != len(hazard_key)
+                or any(cached is not obj for cached, obj in zip(cached_key, hazard_key))):
+            self._hazard_cache['entries'] = {}
+            self._hazard_cache['exposures'] = None
+            self._hazard_cache['hazard_key'] = hazard_key
+        self._hazard_cache['active'] = True
+
+    def _prepared_exposures(self, impf_col, assign_centroids, ignore_cover, ignore_deductible,
+                            save_mat):
+        """Minimal exposures GeoDataFrame and its aggregation, kept between calls
+
+        The prepared exposures are kept in the hazard cache, see :py:meth:`_use_hazard_cache`,
+        and reused as long as the exposures object, its GeoDataFrame and the arguments are the
+        same. The aggregation does not depend on the impact functions.
+
+        Parameters
+        ----------
+        impf_col : str
+            Name of the impact function column in exposures.gdf
+        assign_centroids : bool
+            see :py:meth:`minimal_exp_gdf`
+        ignore_cover : bool
+            see :py:meth:`minimal_exp_gdf`
+        ignore_deductible : bool
+            see :py:meth:`minimal_exp_gdf`
+        save_mat : bool
+            see :py:meth:`_aggregation`
+
+        Returns
+        -------
+        exp_gdf : GeoDataFrame
+            minimal exposures GeoDataFrame, see :py:meth:`minimal_exp_gdf`
+        aggregation : tuple or bool
+            aggregation of the exposure points, see :py:meth:`_aggregation`
+        """
+        exp_key = (self.exposures, self.exposures.gdf)
+        args = (impf_col, bool(assign_centroids), bool(ignore_cover), bool(ignore_deductible))
+        prepared = self._hazard_cache['exposures']
+        if (prepared is None or prepared['args'] != args
+                or any(cached is not obj for cached, obj in zip(prepared['exp_key'], exp_key))):
+            prepared = {
+                'exp_key': exp_key,
+                'args': args,
+                'exp_gdf': self.minimal_exp_gdf(
+                    impf_col, assign_centroids, ignore_cover, ignore_deductible
+                ),
+                'aggregation': {},
+            }
+            self._hazard_cache['exposures'] = prepared
+        exp_gdf = prepared['exp_gdf']
+        if exp_gdf.size == 0:
+            return exp_gdf, False
+        save_mat = bool(save_mat)
+        if save_mat not in prepared['aggregation']:
+            prepared['aggregation'][save_mat] = self._aggregation(exp_gdf, impf_col, save_mat)
+        return exp_gdf, prepared['aggregation'][save_mat]
+
+    def _hazard_at_centroids(self, cent_idx):
+        """Intensity and fraction of the hazard at the centroids of exposure points
+
+        Parameters
+        ----------
+        cent_idx : np.array
+            Hazard centroids assigned to each exposure location
+
+        Returns
+        -------
+        uniq_cent_idx : np.array
+            unique centroids
+        exp_pos : np.array
+            position of the centroid of each exposure point in uniq_cent_idx
+        intensity : sparse.csc_matrix
+            intensity at the unique centroids (n_events x len(uniq_cent_idx)), with sorted
+            indices
+        fraction : np.array or None
+            fraction at the entries of intensity, None if the fraction is empty
+        """
+        if not self._hazard_cache['active']:
+            return self._extract_hazard_at_centroids(cent_idx)
+        key = np.asarray(cent_idx).tobytes()
+        if key not in self._hazard_cache['entries']:
+            self._hazard_cache['entries'][key] = self._extract_hazard_at_centroids(cent_idx)
+        return self._hazard_cache['entries'][key]
+
+    def _extract_hazard_at_centroids(self, cent_idx):
+        """Extract the intensity and fraction of the hazard at the centroids of exposure
+        points, see :py:meth:`_hazard_at_centroids`"""
+        # pylint: disable=protected-access
+        uniq_cent_idx, exp_pos = np.unique(cent_idx, return_inverse=True)
+        intensity = self.hazard._get_csc('intensity')[:, uniq_cent_idx]
+        if not intensity.has_sorted_indices:
+            intensity.sort_indices()
+        fraction = None
+        if self.hazard._get_fraction() is not None:
+            fract_mat = self.hazard._get_csc('fraction')[:, uniq_cent_idx]
+            if not fract_mat.has_sorted_indices:
+                fract_mat.sort_indices()
+            fraction = _lookup_csc(
+                intensity.indptr, intensity.indices,
+                fract_mat.indptr, fract_mat.indices, fract_mat.data
+            )
+        return uniq_cent_idx, exp_pos.ravel(), intensity, fraction
+
+    def _impact_matrix_dense_mdr(self, exp_values, cent_idx, impf):
+        """Compute the impact matrix from the mean damage ratio of the hazard
+
+        Used for impact functions that do not vanish at zero intensity.
+        See :py:meth:`impact_matrix`.
+        """
+        n_exp_pnt = len(cent_idx)
         mdr = self.hazard.get_mdr(cent_idx, impf)
         exp_values_csr = sparse.csr_matrix(  # vector 1 x exp_size
             (exp_values, np.arange(n_exp_pnt), [0, n_exp_pnt]),
@@ -406,16 +1348,51 @@ class ImpactCalc():
     def stitch_impact_matrix(self, imp_mat_gen):
         """
         Make an impact matrix from an impact sub-matrix generator
+
+        The number of non-zero entries per event of all sub-matrices is counted
+        first, such that the data and indices of the impact matrix can be
+        allocated once and each sub-matrix is written directly into place.
+        Entries of the same event and exposure point are summed.
+
+        Parameters
+        ----------
+        imp_mat_gen : generator of tuples (sparse.csr_matrix, np.array)
+            The generator for creating the impact matrix. It returns a part of the full
+            matrix and the associated exposure indices.
+
+        Returns
+        -------
+        sparse.csr_matrix
+            impact matrix with one row per event and one column per exposure point
+            of self.exposures
         """
         # rows: events index
         # cols: exposure point index within self.exposures
-        data, row, col = np.hstack([
-            (mat.data, mat.nonzero()[0], self._orig_exp_idx[idx][mat.nonzero()[1]])
-            for mat, idx in imp_mat_gen
-            ])
-        return sparse.csr_matrix(
-            (data, (row, col)), shape=(self.n_events, self.n_exp_pnt)
-            )
+        chunks = [(mat.tocsr(), idx) for mat, idx in imp_mat_gen]
+        nnz = sum(mat.nnz for mat, _ in chunks)
+        with self._phase('stitch', nnz=nnz):
+            idx_dtype = np.int32 if max(nnz, self.n_exp_pnt) <= np.iinfo(np.int32).max \
+                else np.int64
+            row_nnz = np.zeros(self.n_events, dtype=idx_dtype)
+            for mat, _ in chunks:
+                row_nnz[:mat.shape[0]] += np.diff(mat.indptr).astype(idx_dtype)
+            indptr = np.zeros(self.n_events + 1, dtype=idx_dtype)
+            np.cumsum(row_nnz, out=indptr[1:])
+            dtype = np.result_type(*[mat.dtype for mat, _ in chunks]) if chunks \
+                else u_check.matrix_dtype()
+            data = np.empty(nnz, dtype=dtype)
+            indices = np.empty(nnz, dtype=idx_dtype)
+            cursor = indptr[:-1].copy()
+            for i, (mat, idx) in enumerate(chunks):
+                _stitch_rows(mat.indptr, mat.indices, mat.data,
+                             self._orig_exp_idx[idx].astype(idx_dtype), cursor, data, indices)
+                # release the sub-matrix as soon as it is copied
+                chunks[i] = None
+            imp_mat = sparse.csr_matrix(
+                (data, indices, indptr), shape=(self.n_events, self.n_exp_pnt)
+                )
+            imp_mat.sum_duplicates()
+        return imp_mat
 
     def stitch_risk_metrics(self, imp_mat_gen):
         """Compute the impact metrics from an impact sub-matrix generator
@@ -440,10 +1417,11 @@ class ImpactCalc():
         """
         at_event = np.zeros(self.n_events)
         eai_exp = np.zeros(self.n_exp_pnt)
-        for sub_imp_mat, idx in imp_mat_gen:
-            at_event += self.at_event_from_mat(sub_imp_mat)
-            eai_exp[self._orig_exp_idx[idx]] += \
-                self.eai_exp_from_mat(sub_imp_mat, self.hazard.frequency)
+        for chunk, (sub_imp_mat, idx) in enumerate(imp_mat_gen):
+            with self._phase('risk_metrics', chunk, sub_imp_mat.nnz):
+                at_event += self.at_event_from_mat(sub_imp_mat)
+                eai_exp[self._orig_exp_idx[idx]] += \
+                    self.eai_exp_from_mat(sub_imp_mat, self.hazard.frequency)
         aai_agg = self.aai_agg_from_eai_exp(eai_exp)
         return at_event, eai_exp, aai_agg
 
@@ -539,9 +1517,9 @@ class ImpactCalc():
         Returns
         -------
         at_event : np.array
-            impact for each hazard event
+            impact for each hazard event, accumulated in double precision
         """
-        return np.asarray(np.sum(mat, axis=1)).ravel()
+        return np.asarray(mat.sum(axis=1, dtype=np.float64)).ravel()
 
     @staticmethod
     def aai_agg_from_eai_exp(eai_exp):
@@ -586,3 +1564,252 @@ class ImpactCalc():
         at_event = cls.at_event_from_mat(mat)
         aai_agg = cls.aai_agg_from_eai_exp(eai_exp)
         return at_event, eai_exp, aai_agg
+
+
+
+class ImpactCalcProfile():
+    """Records of the phases of impact computations, see :py:meth:`ImpactCalc.profile`
+
+    Each record holds the name of the phase, the exposure chunk it belongs to (if any), its
+    wall time in seconds, the number of non-zero matrix entries (or exposure points)
+    processed, and the peak memory in bytes allocated on top of the memory in use at its
+    start, if memory is traced. Phases may be nested, e.g., the computation of a chunk
+    comprises the extraction of the hazard, the mean damage ratio and the filling of the
+    sub-matrix.
+
+    If the chunks are computed in parallel, their wall times overlap and the memory peaks
+    of concurrent phases are not separated.
+
+    Attributes
+    ----------
+    trace_memory : bool
+        whether the peak memory of the phases is traced
+    records : list of dict
+        records of the phases in the order in which they ended
+    """
+
+    def __init__(self, trace_memory=True):
+        """Initialize empty records
+
+        Parameters
+        ----------
+        trace_memory : bool, optional
+            whether to trace the peak memory of the phases with :py:mod:`tracemalloc`.
+            Default: True
+        """
+        self.trace_memory = trace_memory
+        self.records = []
+        self._local = threading.local()
+        self._started_tracing = False
+
+    def start(self):
+        """Start tracing the memory, if required and not yet done"""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """Stop tracing the memory, if started by :py:meth:`start`"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def phase(self, name, chunk=None, nnz=None):
+        """Record a phase of the computation
+
+        Parameters
+        ----------
+        name : str
+            name of the phase
+        chunk : int, optional
+            index of the exposure chunk. Default: the chunk of the enclosing phase, if any
+        nnz : int, optional
+            number of non-zero entries processed, can also be set in the yielded record
+
+        Yields
+        ------
+        dict
+            the record of the phase, completed when the phase ends
+        """
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        stack = self._local.stack
+        if chunk is None and stack:
+            chunk = stack[-1]['chunk']
+        record = {'phase': name, 'chunk': chunk, 'nnz': nnz}
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # the peak of the enclosing phase so far is lost by resetting it
+                stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_start'] = current
+            record['_peak'] = current
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['time'] = time.perf_counter() - start
+            stack.pop()
+            record['peak_bytes'] = None
+            if tracing:
+                peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                record['peak_bytes'] = peak - record.pop('_start')
+                if stack:
+                    stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+            self.records.append(record)
+            LOGGER.debug('Phase %s (chunk %s): %.3f s, %s non-zero entries, %s bytes peak',
+                         name, chunk, record['time'], record['nnz'], record['peak_bytes'])
+
+    def to_dataframe(self):
+        """Records as dataframe
+
+        Returns
+        -------
+        pandas.DataFrame
+            one row per record with columns 'phase', 'chunk', 'time', 'nnz' and
+            'peak_bytes'
+        """
+        return pd.DataFrame(
+            self.records, columns=['phase', 'chunk', 'time', 'nnz', 'peak_bytes']
+        ).astype({'chunk': 'Int64', 'nnz': 'Int64', 'peak_bytes': 'Int64'})
+
+    def summary(self):
+        """Summary of the records per phase
+
+        Returns
+        -------
+        pandas.DataFrame
+            for each phase (index), the number of records ('count'), the total wall time
+            ('time') and number of non-zero entries ('nnz'), and the maximum peak memory
+            ('peak_bytes'), in the order in which the phases first ended
+        """
+        records = self.to_dataframe()
+        return records.groupby('phase', sort=False).agg(
+            count=('time', 'size'), time=('time', 'sum'),
+            nnz=('nnz', 'sum'), peak_bytes=('peak_bytes', 'max'),
+        )
+
+
+@numba.njit(nogil=True)
+def _lookup_csc(indptr, indices, indptr_val, indices_val, data_val):
+    """Values of a csc matrix at the entries of another csc matrix of the same shape
+
+    Both matrices must have sorted indices. Entries that are not stored in the first matrix
+    have value 0.
+
+    Parameters
+    ----------
+    indptr, indices : np.array
+        index arrays of the matrix defining the entries
+    indptr_val, indices_val, data_val : np.array
+        index and data arrays of the matrix holding the values
+
+    Returns
+    -------
+    np.array
+        values at the entries, in the order of indices
+    """
+    values = np.zeros(indices.size, dtype=np.float64)
+    for col in range(indptr.size - 1):
+        start, end = indptr_val[col], indptr_val[col + 1]
+        for idx in range(indptr[col], indptr[col + 1]):
+            pos = start + np.searchsorted(indices_val[start:end], indices[idx])
+            if pos < end and indices_val[pos] == indices[idx]:
+                values[idx] = data_val[pos]
+    return values
+
+
+@numba.njit(nogil=True)
+def _fill_impact_matrix(ent_ptr, ent_row, ent_fact, exp_pos, exp_values, indptr, data, indices):
+    """Fill the data and indices of the impact matrix
+
+    Each hazard entry (mean damage ratio times fraction) at the centroid of an exposure point
+    is multiplied with its value. The exposure points are traversed in order, so that the
+    column indices of each row of the impact matrix are sorted.
+
+    Parameters
+    ----------
+    ent_ptr : np.array
+        the hazard entries at centroid position i are ent_ptr[i]:ent_ptr[i + 1]
+    ent_row : np.array
+        row (event) of the hazard entries
+    ent_fact : np.array
+        mean damage ratio times fraction of the hazard entries
+    exp_pos : np.array
+        centroid position of each exposure point
+    exp_values : np.array
+        values of the exposure points
+    indptr : np.array
+        index pointer of the impact matrix
+    data, indices : np.array
+        data and column indices of the impact matrix, filled in place
+    """
+    cursor = indptr[:-1].copy()
+    for col in range(exp_pos.size):
+        for k in range(ent_ptr[exp_pos[col]], ent_ptr[exp_pos[col] + 1]):
+            row = ent_row[k]
+            data[cursor[row]] = ent_fact[k] * exp_values[col]
+            indices[cursor[row]] = col
+            cursor[row] += 1
+
+
+@numba.njit(nogil=True)
+def _fill_insured_impact_matrix(ent_ptr, ent_row, ent_fact, ent_paa, exp_pos, exp_values,
+                                deductible, cover, apply_cover, indptr, data, ins_data, indices):
+    """Fill the data and indices of the impact matrix without and with applied deductible
+    and cover
+
+    The impact is filled as in :py:func:`_fill_impact_matrix`. The insured impact is the
+    impact minus the deductible weighted with the percentage of affected assets, clipped
+    to the range [0, cover] if the cover is applied.
+
+    Parameters
+    ----------
+    ent_ptr, ent_row, ent_fact, exp_pos, exp_values, indptr, indices : np.array
+        see :py:func:`_fill_impact_matrix`
+    ent_paa : np.array
+        percentage of affected assets of the hazard entries
+    deductible, cover : np.array
+        deductible and cover of the exposure points
+    apply_cover : bool
+        whether the cover is applied
+    data, ins_data : np.array
+        data of the impact matrix and of the insured impact matrix, filled in place
+    """
+    cursor = indptr[:-1].copy()
+    for col in range(exp_pos.size):
+        for k in range(ent_ptr[exp_pos[col]], ent_ptr[exp_pos[col] + 1]):
+            row = ent_row[k]
+            pos = cursor[row]
+            data[pos] = ent_fact[k] * exp_values[col]
+            ins_data[pos] = data[pos] - ent_paa[k] * deductible[col]
+            if apply_cover:
+                ins_data[pos] = np.minimum(np.maximum(ins_data[pos], 0.), cover[col])
+            indices[pos] = col
+            cursor[row] += 1
+
+
+@numba.njit(nogil=True)
+def _stitch_rows(indptr, indices, data, col_map, cursor, data_out, indices_out):
+    """Copy the rows of an impact sub-matrix into the impact matrix
+
+    Parameters
+    ----------
+    indptr, indices, data : np.array
+        index pointer, column indices and data of the sub-matrix in CSR format
+    col_map : np.array
+        column of the impact matrix for each column of the sub-matrix
+    cursor : np.array
+        next free position of each row in data_out and indices_out, updated in place
+    data_out, indices_out : np.array
+        data and column indices of the impact matrix, filled in place
+    """
+    for row in range(indptr.size - 1):
+        for k in range(indptr[row], indptr[row + 1]):
+            data_out[cursor[row]] = data[k]
+            indices_out[cursor[row]] = col_map[indices[k]]
+            cursor[row] += 1
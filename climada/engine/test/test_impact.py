@@ -19,21 +19,27 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 Test Impact class.
 """
 import unittest
+from unittest.mock import patch
 from pathlib import Path
 from tempfile import TemporaryDirectory
 import numpy as np
 import numpy.testing as npt
+import pandas as pd
+import pyarrow.parquet as pq
 from scipy import sparse
 import h5py
+from pathos.pools import ThreadPool
 from pyproj import CRS
 from rasterio.crs import CRS as rCRS
 import datetime as dt
 
+from climada.entity import Exposures
 from climada.entity.entity_def import Entity
 from climada.hazard.base import Hazard
 from climada.engine import Impact, ImpactCalc
 from climada.util.constants import ENT_DEMO_TODAY, DEF_CRS, DEMO_DIR, DEF_FREQ_UNIT
 import climada.util.coordinates as u_coord
+from climada.util.hdf5_handler import H5CSRMatrix
 
 from climada.hazard.test.test_base import HAZ_TEST_TC
 
@@ -239,6 +245,197 @@ class TestImpactConcat(unittest.TestCase):
         self.assertEqual(impact.frequency_unit, self.imp1.frequency_unit)
         self.assertEqual(impact.crs, self.imp1.crs)
 
+    def test_files(self):
+        """Test concatenation of impact files, in memory and to a file"""
+        ref = Impact.concat([self.imp1, self.imp2])
+        with TemporaryDirectory() as tmpdir:
+            paths = [Path(tmpdir, "imp1.h5"), Path(tmpdir, "imp2.h5")]
+            self.imp1.write_hdf5(paths[0])
+            self.imp2.write_hdf5(paths[1])
+            out_path = Path(tmpdir, "concat.h5")
+            for imp_list, file_path in [
+                (paths, None), (iter([self.imp1, paths[1]]), None), (paths, out_path)
+            ]:
+                with self.subTest(file_path=file_path):
+                    impact = Impact.concat(imp_list, file_path=file_path)
+                    for attr in ("event_id", "event_name", "date", "frequency", "at_event",
+                                 "eai_exp", "aai_agg", "coord_exp", "unit", "crs"):
+                        npt.assert_array_equal(getattr(impact, attr), getattr(ref, attr))
+                    npt.assert_array_equal(impact.imp_mat.toarray(), ref.imp_mat.toarray())
+            self.assertIsInstance(impact.imp_mat, H5CSRMatrix)
+            self.assertEqual(impact.imp_mat.dtype, ref.imp_mat.dtype)
+            npt.assert_array_equal(Impact.from_hdf5(out_path).imp_mat.toarray(),
+                                   ref.imp_mat.toarray())
+
+            # The output must not be an input file
+            with self.assertRaises(ValueError) as cm:
+                Impact.concat([paths[0], impact], file_path=out_path)
+            self.assertIn("cannot be overwritten", str(cm.exception))
+
+            # Errors are raised as for impacts in memory
+            self.imp2.crs = "OTHER"
+            self.imp2.write_hdf5(paths[1])
+            with self.assertRaises(ValueError) as cm:
+                Impact.concat(paths)
+            self.assertIn("Attribute 'crs' must be unique among impacts", str(cm.exception))
+
+
+class TestImpactExtend(unittest.TestCase):
+    """test Impact.extend_with_events"""
+
+    def setUp(self):
+        """Split the test hazard into historical and new events"""
+        self.exp = ENT.exposures.copy()
+        self.exp.assign_centroids(HAZ)
+        self.haz_old = HAZ.select(event_id=HAZ.event_id[:-10])
+        self.haz_new = HAZ.select(event_id=HAZ.event_id[-10:])
+        self.imp_full = ImpactCalc(self.exp, ENT.impact_funcs, HAZ).impact(
+            assign_centroids=False
+        )
+
+    def test_extend_pass(self):
+        """Test that extending equals computing the impact of all events"""
+        for save_mat in [True, False]:
+            with self.subTest(save_mat=save_mat):
+                imp = ImpactCalc(self.exp, ENT.impact_funcs, self.haz_old).impact(
+                    save_mat=save_mat, assign_centroids=False
+                )
+                imp.extend_with_events(self.exp, ENT.impact_funcs, self.haz_new)
+                npt.assert_array_equal(imp.event_id, self.imp_full.event_id)
+                self.assertEqual(imp.event_name, self.imp_full.event_name)
+                npt.assert_array_equal(imp.date, self.imp_full.date)
+                npt.assert_array_equal(imp.frequency, self.imp_full.frequency)
+                npt.assert_array_equal(imp.at_event, self.imp_full.at_event)
+                npt.assert_allclose(imp.eai_exp, self.imp_full.eai_exp, rtol=1e-12)
+                self.assertAlmostEqual(imp.aai_agg, self.imp_full.aai_agg,
+                                       delta=1e-12 * self.imp_full.aai_agg)
+                if save_mat:
+                    self.assertEqual((imp.imp_mat != self.imp_full.imp_mat).nnz, 0)
+                else:
+                    self.assertEqual(imp.imp_mat.shape, (0, 0))
+
+    def test_extend_reset_frequency_pass(self):
+        """Test rescaling the frequencies to the extended period"""
+        self.haz_old.date = np.full(self.haz_old.size, dt.date(2000, 1, 1).toordinal())
+        self.haz_new.date = np.full(self.haz_new.size, dt.date(2003, 6, 1).toordinal())
+        imp = ImpactCalc(self.exp, ENT.impact_funcs, self.haz_old).impact(
+            assign_centroids=False
+        )
+        imp.extend_with_events(self.exp, ENT.impact_funcs, self.haz_new, reset_frequency=True)
+        npt.assert_allclose(imp.frequency, self.imp_full.frequency / 4)
+        npt.assert_allclose(imp.eai_exp, self.imp_full.eai_exp / 4, rtol=1e-12)
+        self.assertAlmostEqual(imp.aai_agg, self.imp_full.aai_agg / 4,
+                               delta=1e-12 * self.imp_full.aai_agg)
+
+    def test_extend_fail(self):
+        """Test errors for inconsistent inputs"""
+        imp = ImpactCalc(self.exp, ENT.impact_funcs, self.haz_old).impact(
+            assign_centroids=False
+        )
+        with self.assertRaisesRegex(ValueError, "Duplicate event IDs"):
+            imp.extend_with_events(self.exp, ENT.impact_funcs, self.haz_old)
+        exp = self.exp.copy()
+        exp.gdf = exp.gdf.iloc[1:]
+        with self.assertRaisesRegex(ValueError, "exposures differ"):
+            imp.extend_with_events(exp, ENT.impact_funcs, self.haz_new)
+        self.haz_new.frequency_unit = '1/day'
+        with self.assertRaisesRegex(ValueError, "frequency unit"):
+            imp.extend_with_events(self.exp, ENT.impact_funcs, self.haz_new)
+        npt.assert_array_equal(imp.event_id, self.haz_old.event_id)
+
+
+class TestImpactUpdateExposures(unittest.TestCase):
+    """test Impact.update_exposures"""
+
+    def test_update_pass(self):
+        """Test that updating equals computing the impact of the modified exposures"""
+        exp = ENT.exposures.copy()
+        imp = ImpactCalc(exp, ENT.impact_funcs, HAZ).impact()
+
+        gdf = exp.gdf.drop(index=exp.gdf.index[[3, 10]]).reset_index(drop=True)
+        gdf.loc[[0, 5], 'value'] *= 2
+        gdf.loc[7, 'longitude'] += 0.1
+        added = exp.gdf.iloc[[1, 2]].copy()
+        added['value'] = [1e6, 2e6]
+        gdf = pd.concat([gdf, added], ignore_index=True)
+        exp_new = Exposures(gdf, crs=exp.crs)
+        imp.update_exposures(exp_new, ENT.impact_funcs, HAZ, changed=[0, 5, 7], removed=[3, 10])
+
+        imp_ref = ImpactCalc(exp_new, ENT.impact_funcs, HAZ).impact()
+        self.assertEqual(imp.imp_mat.shape, imp_ref.imp_mat.shape)
+        self.assertEqual((imp.imp_mat != imp_ref.imp_mat).nnz, 0)
+        npt.assert_array_equal(imp.coord_exp, imp_ref.coord_exp)
+        npt.assert_array_equal(imp.eai_exp, imp_ref.eai_exp)
+        npt.assert_allclose(imp.at_event, imp_ref.at_event, rtol=1e-12)
+        self.assertAlmostEqual(imp.aai_agg, imp_ref.aai_agg, delta=1e-12 * imp_ref.aai_agg)
+        self.assertEqual(imp.tot_value, imp_ref.tot_value)
+
+    def test_update_removed_only(self):
+        """Test that removing exposure points does not compute any impact"""
+        exp = ENT.exposures.copy()
+        imp = ImpactCalc(exp, ENT.impact_funcs, HAZ).impact()
+        exp_new = Exposures(exp.gdf.drop(index=exp.gdf.index[[3, 10]]), crs=exp.crs)
+        with patch.object(ImpactCalc, 'impact') as impact:
+            imp.update_exposures(exp_new, ENT.impact_funcs, HAZ, removed=[3, 10])
+        impact.assert_not_called()
+
+        imp_ref = ImpactCalc(exp_new, ENT.impact_funcs, HAZ).impact()
+        self.assertEqual(imp.imp_mat.shape, imp_ref.imp_mat.shape)
+        self.assertEqual((imp.imp_mat != imp_ref.imp_mat).nnz, 0)
+        npt.assert_array_equal(imp.coord_exp, imp_ref.coord_exp)
+        npt.assert_array_equal(imp.eai_exp, imp_ref.eai_exp)
+        npt.assert_allclose(imp.at_event, imp_ref.at_event, rtol=1e-12)
+        self.assertAlmostEqual(imp.aai_agg, imp_ref.aai_agg, delta=1e-12 * imp_ref.aai_agg)
+        self.assertEqual(imp.tot_value, imp_ref.tot_value)
+
+    def test_update_non_unique_index(self):
+        """Test updating exposures with duplicated index labels"""
+        exp = ENT.exposures.copy()
+        imp = ImpactCalc(exp, ENT.impact_funcs, HAZ).impact()
+        added = exp.gdf.iloc[[1, 2]].copy()
+        added['longitude'] += 0.1
+        exp_new = Exposures(pd.concat([exp.gdf, added]), crs=exp.crs)
+        self.assertFalse(exp_new.gdf.index.is_unique)
+        imp.update_exposures(exp_new, ENT.impact_funcs, HAZ, changed=[1])
+
+        imp_ref = ImpactCalc(exp_new.copy(), ENT.impact_funcs, HAZ).impact()
+        self.assertEqual((imp.imp_mat != imp_ref.imp_mat).nnz, 0)
+        npt.assert_array_equal(imp.eai_exp, imp_ref.eai_exp)
+        centr_col = HAZ.centr_exp_col
+        npt.assert_array_equal(exp_new.gdf[centr_col].values[:-2],
+                               exp.gdf[centr_col].values)
+        self.assertEqual(exp_new.gdf[centr_col].values[-1],
+                         HAZ.centroids.get_closest_point(added.longitude.values[-1],
+                                                         added.latitude.values[-1])[2])
+
+    def test_update_float32(self):
+        """Test that the impacts of a single precision matrix are summed in double precision"""
+        exp = ENT.exposures.copy()
+        imp = ImpactCalc(exp, ENT.impact_funcs, HAZ).impact(dtype='float32')
+        exp_new = exp.copy()
+        exp_new.gdf.loc[0, 'value'] *= 2
+        imp.update_exposures(exp_new, ENT.impact_funcs, HAZ, changed=[0])
+        imp_ref = ImpactCalc(exp_new, ENT.impact_funcs, HAZ).impact(dtype='float32')
+        self.assertEqual(imp.imp_mat.dtype, np.float32)
+        self.assertEqual(imp.at_event.dtype, np.float64)
+        npt.assert_allclose(imp.at_event, imp_ref.at_event, rtol=1e-12)
+        self.assertAlmostEqual(imp.aai_agg, imp_ref.aai_agg, delta=1e-12 * imp_ref.aai_agg)
+
+    def test_update_fail(self):
+        """Test errors for inconsistent inputs"""
+        exp = ENT.exposures.copy()
+        imp = ImpactCalc(exp, ENT.impact_funcs, HAZ).impact()
+        exp_new = exp.copy()
+        exp_new.gdf.loc[0, 'longitude'] += 0.1
+        with self.assertRaisesRegex(ValueError, "unchanged exposure points differ"):
+            imp.update_exposures(exp_new, ENT.impact_funcs, HAZ)
+        exp_new = Exposures(exp.gdf.iloc[1:], crs=exp.crs)
+        with self.assertRaisesRegex(ValueError, "must consist of"):
+            imp.update_exposures(exp_new, ENT.impact_funcs, HAZ)
+        imp = ImpactCalc(exp, ENT.impact_funcs, HAZ).impact(save_mat=False)
+        with self.assertRaisesRegex(ValueError, "impact matrix is missing"):
+            imp.update_exposures(exp, ENT.impact_funcs, HAZ, changed=[0])
+
 
 class TestFreqCurve(unittest.TestCase):
     """Test exceedence frequency curve computation"""
@@ -365,6 +562,31 @@ class TestImpactPerYear(unittest.TestCase):
         self.assertFalse(1959 in iys_yr)
         self.assertEqual(len(iys_all_yr_1940), 61)
 
+    def test_impact_per_year_select(self):
+        """Test the years of the events after selection and reassignment of the dates"""
+        imp = dummy_impact()
+        imp.date = np.array([dt.date(1999, 12, 31).toordinal(),
+                             dt.date(2000, 1, 1).toordinal(),
+                             dt.date(2000, 6, 1).toordinal(),
+                             dt.date(2003, 1, 1).toordinal(),
+                             dt.date(2003, 12, 31).toordinal(),
+                             dt.date(2005, 1, 1).toordinal()])
+        iys = imp.impact_per_year(all_years=False)
+        self.assertEqual(list(iys), [1999, 2000, 2003, 2005])
+        self.assertEqual(iys[2000], imp.at_event[1] + imp.at_event[2])
+
+        imp_sel = imp.select(event_ids=[11, 12, 13])
+        iys_sel = imp_sel.impact_per_year()
+        self.assertEqual(list(iys_sel), [2000, 2001, 2002, 2003])
+        self.assertEqual(iys_sel[2000], iys[2000])
+        self.assertEqual(iys_sel[2001], 0)
+        self.assertEqual(iys_sel[2003], imp.at_event[3])
+
+        imp.date = imp.date + 1
+        self.assertEqual(list(imp.impact_per_year(all_years=False)), [2000, 2003, 2004, 2005])
+        imp.date[:3] += 366
+        self.assertEqual(list(imp.impact_per_year(all_years=False)), [2001, 2003, 2004, 2005])
+
     def test_impact_per_year_empty(self):
         """Test result for empty impact"""
         imp = Impact()
@@ -478,6 +700,71 @@ class TestIO(unittest.TestCase):
             0, len([i for i, j in zip(imp_write.event_name, imp_read.event_name) if i != j]))
         self.assertIsInstance(imp_read.crs, str)
 
+    def test_parquet_io(self):
+        """Test write and read in parquet, with and without partitioning"""
+        imp_write = ImpactCalc(ENT.exposures, ENT.impact_funcs, HAZ).impact()
+        regions = np.arange(imp_write.coord_exp.shape[0]) % 3
+        for partition_by in [None, 'year', 'region']:
+            with TemporaryDirectory() as tmpdir:
+                imp_write.write_parquet(tmpdir, imp_mat=True, partition_by=partition_by,
+                                        agg_regions=regions)
+                imp_read = Impact.from_parquet(tmpdir)
+
+            np.testing.assert_array_equal(imp_write.event_id, imp_read.event_id)
+            np.testing.assert_array_equal(imp_write.date, imp_read.date)
+            np.testing.assert_array_equal(imp_write.coord_exp, imp_read.coord_exp)
+            np.testing.assert_array_equal(imp_write.eai_exp, imp_read.eai_exp)
+            np.testing.assert_array_equal(imp_write.at_event, imp_read.at_event)
+            np.testing.assert_array_equal(imp_write.frequency, imp_read.frequency)
+            np.testing.assert_array_equal(imp_write.imp_mat.toarray(),
+                                          imp_read.imp_mat.toarray())
+            self.assertEqual(imp_write.event_name, imp_read.event_name)
+            self.assertEqual(imp_write.tot_value, imp_read.tot_value)
+            self.assertEqual(imp_write.aai_agg, imp_read.aai_agg)
+            self.assertEqual(imp_write.unit, imp_read.unit)
+            self.assertEqual(imp_write.haz_type, imp_read.haz_type)
+
+        with self.assertRaises(ValueError):
+            imp_write.write_parquet(DATA_FOLDER, partition_by='month')
+
+    def test_parquet_partition_region(self):
+        """Test the datasets written in parquet partitioned by region"""
+        imp_write = ImpactCalc(ENT.exposures, ENT.impact_funcs, HAZ).impact()
+        regions = np.array(['A', 'B', 'C'])[np.arange(imp_write.coord_exp.shape[0]) % 3]
+        with TemporaryDirectory() as tmpdir:
+            imp_write.write_parquet(tmpdir, imp_mat=True, partition_by='region',
+                                    agg_regions=regions)
+            self.assertEqual(
+                sorted(path.name for path in Path(tmpdir, 'exposures').iterdir()),
+                ['region=A', 'region=B', 'region=C'])
+            exposures = pq.read_table(Path(tmpdir, 'exposures')).sort_by('exp_idx')
+            np.testing.assert_array_equal(exposures['region'].to_numpy().astype(str), regions)
+            entries = pq.read_table(Path(tmpdir, 'imp_mat'))
+            np.testing.assert_array_equal(
+                entries['region'].to_numpy().astype(str),
+                regions[entries['exp_idx'].to_numpy()])
+            imp_read = Impact.from_parquet(tmpdir)
+        np.testing.assert_array_equal(imp_write.coord_exp, imp_read.coord_exp)
+        np.testing.assert_array_equal(imp_write.eai_exp, imp_read.eai_exp)
+        np.testing.assert_array_equal(imp_write.imp_mat.toarray(), imp_read.imp_mat.toarray())
+
+    def test_parquet_overwrite(self):
+        """Test that writing twice in parquet into the same directory replaces the data"""
+        imp_write = ImpactCalc(ENT.exposures, ENT.impact_funcs, HAZ).impact()
+        with TemporaryDirectory() as tmpdir:
+            imp_write.write_parquet(tmpdir, imp_mat=True, partition_by='year')
+            imp_write.write_parquet(tmpdir, imp_mat=True, partition_by='year')
+            imp_read = Impact.from_parquet(tmpdir)
+            np.testing.assert_array_equal(imp_write.event_id, imp_read.event_id)
+            np.testing.assert_array_equal(imp_write.eai_exp, imp_read.eai_exp)
+            np.testing.assert_array_equal(imp_write.imp_mat.toarray(),
+                                          imp_read.imp_mat.toarray())
+
+            # the impact matrix of a former write is removed
+            imp_write.write_parquet(tmpdir)
+            self.assertFalse(Path(tmpdir, 'imp_mat').exists())
+            self.assertEqual(Impact.from_parquet(tmpdir).imp_mat.shape, (0, 0))
+
     def test_write_imp_mat(self):
         """Test write_excel_imp_mat function"""
         impact = Impact()
@@ -517,6 +804,41 @@ class TestRPmatrix(unittest.TestCase):
         self.assertAlmostEqual(np.max(impact_rp), 2916964966.388219, places=5)
         self.assertAlmostEqual(np.min(impact_rp), 444457580.131494, places=5)
 
+    def test_local_exceedance_imp_sparse(self):
+        """Test local impacts per return period against the fit at each exposure point"""
+        n_events, n_exp = 200, 300
+        rng = np.random.default_rng(0)
+        imp_mat = sparse.random(n_events, n_exp, density=0.1, format='csr', random_state=0)
+        imp_mat.data = rng.uniform(-0.1, 1, imp_mat.nnz) * 1e6
+        # tied impacts of events with different frequencies
+        imp_mat.data[:50] = 1e5
+        frequency = rng.uniform(0.001, 0.01, n_events)
+        impact = Impact(
+            event_id=np.arange(n_events), event_name=list(range(n_events)),
+            date=np.ones(n_events), frequency=frequency, at_event=np.zeros(n_events),
+            coord_exp=np.zeros((n_exp, 2)), eai_exp=np.zeros(n_exp), imp_mat=imp_mat,
+        )
+        return_periods = np.array([5, 10, 50, 100, 250])
+
+        imp_dense = imp_mat.toarray()
+        impact_rp_ref = np.zeros((return_periods.size, n_exp))
+        for cen_idx in range(n_exp):
+            sort_pos = np.argsort(imp_dense[:, cen_idx])[::-1]
+            impact_rp_ref[:, cen_idx] = Impact._cen_return_imp(
+                imp_dense[sort_pos, cen_idx], np.cumsum(frequency[sort_pos]), 0,
+                return_periods
+            )
+
+        impact_rp = impact.local_exceedance_imp(return_periods)
+        npt.assert_allclose(impact_rp, impact_rp_ref, rtol=1e-9, atol=1e-6)
+        impact_rp_pool = impact.local_exceedance_imp(return_periods, pool=ThreadPool(2))
+        npt.assert_array_equal(impact_rp_pool, impact_rp)
+
+        # without any impact
+        impact.imp_mat = sparse.csr_matrix((n_events, n_exp))
+        impact_rp_pool = impact.local_exceedance_imp(return_periods, pool=ThreadPool(2))
+        npt.assert_array_equal(impact_rp_pool, np.zeros((return_periods.size, n_exp)))
+
 
 class TestImpactReg(unittest.TestCase):
     """Test impact aggregation per aggregation region or admin 0"""
@@ -546,6 +868,28 @@ class TestImpactReg(unittest.TestCase):
         self.assertEqual(at_reg_event.shape[0], self.imp.at_event.shape[0])
         self.assertEqual(at_reg_event.shape[1], np.unique(region_ids).shape[0])
 
+        # Sparse output
+        at_reg_sparse = self.imp.impact_at_reg(region_ids, sparse_output=True)
+        self.assertTrue(all(isinstance(dtype, pd.SparseDtype) for dtype in at_reg_sparse.dtypes))
+        pd.testing.assert_frame_equal(at_reg_sparse.sparse.to_dense(), at_reg_event)
+
+    def test_eai_exp_at_reg(self):
+        """Test expected impact per region"""
+        eai_reg = self.imp.eai_exp_at_reg(["B", "A"])
+        npt.assert_array_equal(eai_reg.index, ["A", "B"])
+        npt.assert_array_equal(eai_reg.values, self.imp.eai_exp[::-1])
+
+        eai_reg = self.imp.eai_exp_at_reg(["A", "A"])
+        self.assertAlmostEqual(eai_reg["A"], self.imp.aai_agg)
+
+    def test_agg_regions_size_fail(self):
+        """Check error if the regions do not match the exposure points"""
+        for agg_regions in [["A"], ["A", "B", "C"]]:
+            with self.assertRaisesRegex(ValueError, "number of aggregation regions"):
+                self.imp.eai_exp_at_reg(agg_regions)
+            with self.assertRaisesRegex(ValueError, "number of aggregation regions"):
+                self.imp.impact_at_reg(agg_regions)
+
     def test_admin0(self):
         """Test with aggregation to countries"""
         # Let's specify sample cities' coords
@@ -765,6 +1109,17 @@ class TestSelect(unittest.TestCase):
         self.assertIsInstance(sel_imp, Impact)
         self.assertIsInstance(sel_imp.imp_mat, sparse.csr_matrix)
 
+    def test_select_float32_pass(self):
+        """Test that the impacts of a single precision matrix are summed in double precision"""
+        imp = dummy_impact()
+        imp.imp_mat = imp.imp_mat.astype(np.float32)
+        sel_imp = imp.select(coord_exp=np.array([1, 2]), event_ids=[10, 11, 12])
+        self.assertEqual(sel_imp.imp_mat.dtype, np.float32)
+        self.assertEqual(sel_imp.at_event.dtype, np.float64)
+        self.assertEqual(sel_imp.eai_exp.dtype, np.float64)
+        np.testing.assert_array_equal(sel_imp.at_event, [0, 1, 2])
+        np.testing.assert_array_almost_equal_nulp(sel_imp.eai_exp, [1/6+2])
+
     def test_select_event_identity_pass(self):
         """ test select same impact with event name, id and date """
 
@@ -1013,6 +1368,30 @@ class TestImpactH5IO(unittest.TestCase):
                     self.filepath, self.impact, dense_imp_mat=dense
                 )
 
+    def test_write_hdf5_dtype(self):
+        """Test writing the impact matrix in single precision"""
+        for dense in (True, False):
+            with self.subTest(dense_imp_mat=dense):
+                self.impact.write_hdf5(self.filepath, dense_imp_mat=dense, dtype="float32")
+                impact_read = Impact.from_hdf5(self.filepath)
+                self.assertEqual(impact_read.imp_mat.dtype, np.float32)
+                npt.assert_allclose(
+                    impact_read.imp_mat.toarray(), self.impact.imp_mat.toarray(), rtol=1e-6
+                )
+                npt.assert_array_equal(impact_read.at_event, self.impact.at_event)
+
+        # without dtype, the data type of the impact matrix is kept
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                impact = Impact.from_hdf5(self.filepath, lazy=lazy)
+                with TemporaryDirectory() as tmpdir:
+                    file_path = Path(tmpdir, "test_dtype.h5")
+                    impact.write_hdf5(file_path)
+                    self.assertEqual(Impact.from_hdf5(file_path).imp_mat.dtype, np.float32)
+        self.impact.write_hdf5(self.filepath)
+        self.assertEqual(Impact.from_hdf5(self.filepath).imp_mat.dtype,
+                         self.impact.imp_mat.dtype)
+
     def test_write_hdf5_without_imp_mat(self):
         """Test writing an impact into an H5 file with an empty impact matrix"""
         self.impact.imp_mat = sparse.csr_matrix(np.empty((0, 0)))
@@ -1122,6 +1501,18 @@ class TestImpactH5IO(unittest.TestCase):
         impact = Impact.from_hdf5(self.filepath)
         npt.assert_array_equal(impact.imp_mat.toarray(), [[0, 1, 2], [3, 0, 0]])
 
+        # Check lazy reading of the sparse impact matrix
+        impact = Impact.from_hdf5(self.filepath, lazy=True)
+        self.assertIsInstance(impact.imp_mat, H5CSRMatrix)
+        npt.assert_array_equal(impact.at_event, at_event)
+        npt.assert_array_equal(impact.imp_mat.toarray(), [[0, 1, 2], [3, 0, 0]])
+        imp_sel = impact.select(event_ids=[2])
+        self.assertIsInstance(imp_sel.imp_mat, sparse.csr_matrix)
+        npt.assert_array_equal(imp_sel.imp_mat.toarray(), [[3, 0, 0]])
+        npt.assert_array_equal(impact._build_exp_event(1).gdf["value"], [0, 1, 2])
+        npt.assert_array_equal(impact.local_exceedance_imp([10, 100]),
+                               Impact.from_hdf5(self.filepath).local_exceedance_imp([10, 100]))
+
         # Check with non-string event_name
         event_name = [1.2, 2]
         with h5py.File(self.filepath, "r+") as file:
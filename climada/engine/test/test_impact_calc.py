@@ -25,16 +25,19 @@ from scipy import sparse
 import geopandas as gpd
 from copy import deepcopy
 from pathlib import Path
+from pathos.pools import ThreadPool
 
 from climada import CONFIG
 from climada.entity.entity_def import Entity
 from climada.entity import Exposures, ImpactFuncSet, ImpactFunc
 from climada.hazard.base import Hazard
+from climada.hazard.centroids import Centroids
 from climada.engine import ImpactCalc, Impact
-from climada.engine.impact_calc import LOGGER as ILOG
+from climada.engine.impact_calc import LOGGER as ILOG, _IMP_MAT_NNZ_BYTES
 from climada.util.constants import ENT_DEMO_TODAY, DEMO_DIR
 from climada.util.api_client import Client
 from climada.util.config import Config
+from climada.util.hdf5_handler import H5CSRMatrix
 
 from climada.test import get_test_file
 
@@ -291,6 +294,285 @@ class TestImpactCalc(unittest.TestCase):
         self.assertAlmostEqual(6.570532945599105e+11, impact.tot_value)
         self.assertAlmostEqual(6.512201157564421e+09, impact.aai_agg, 5)
 
+    def test_calc_impact_save_mat_file_pass(self):
+        """Test streaming the impact matrix to a file"""
+        exp = ENT.exposures.copy()
+        exp.gdf.cover /= 1e3
+        exp.gdf.deductible += 1e5
+        icalc = ImpactCalc(exp, ENT.impact_funcs, HAZ)
+        impact_ref = icalc.impact(save_mat=True)
+        file_path = DATA_FOLDER / 'test_impact_calc_save_mat.h5'
+        max_matrix_size = CONFIG.max_matrix_size.int()
+        # several chunks and blocks of events
+        CONFIG.max_matrix_size = Config(val=HAZ.size * 10, root=CONFIG)
+        try:
+            impact = icalc.impact(save_mat=file_path)
+        finally:
+            CONFIG.max_matrix_size = Config(val=max_matrix_size, root=CONFIG)
+        self.assertIsInstance(impact.imp_mat, H5CSRMatrix)
+        imp_mat = impact.imp_mat.tocsr()
+        self.assertTrue(imp_mat.has_sorted_indices)
+        self.assertEqual((imp_mat != impact_ref.imp_mat).nnz, 0)
+        np.testing.assert_allclose(impact.at_event, impact_ref.at_event, rtol=1e-12)
+        np.testing.assert_allclose(impact.eai_exp, impact_ref.eai_exp, rtol=1e-12)
+        self.assertAlmostEqual(impact.aai_agg, impact_ref.aai_agg,
+                               delta=1e-12 * impact_ref.aai_agg)
+        np.testing.assert_array_equal(
+            impact.imp_mat[[10, -1]].toarray(), impact_ref.imp_mat[[10, -1]].toarray()
+        )
+
+        impact_read = Impact.from_hdf5(file_path)
+        self.assertEqual((impact_read.imp_mat != impact_ref.imp_mat).nnz, 0)
+        np.testing.assert_array_equal(impact_read.at_event, impact.at_event)
+        self.assertEqual(impact_read.aai_agg, impact.aai_agg)
+        with self.assertRaises(ValueError):
+            impact.write_hdf5(file_path)
+        with self.assertRaises(ValueError):
+            icalc.impact_many([ENT.impact_funcs], save_mat=file_path)
+        file_path.unlink()
+
+    def test_calc_impact_float32_pass(self):
+        """Test the impact matrix in single precision"""
+        exp = ENT.exposures.copy()
+        icalc = ImpactCalc(exp, ENT.impact_funcs, HAZ)
+        impact_ref = icalc.impact(save_mat=True)
+        impact = icalc.impact(save_mat=True, assign_centroids=False, dtype='float32')
+        self.assertEqual(impact.imp_mat.dtype, np.float32)
+        self.assertEqual(impact.at_event.dtype, np.float64)
+        self.assertEqual(impact.eai_exp.dtype, np.float64)
+        np.testing.assert_allclose(impact.imp_mat.toarray(), impact_ref.imp_mat.toarray(),
+                                   rtol=1e-6)
+        np.testing.assert_allclose(impact.at_event, impact_ref.at_event, rtol=1e-6)
+        np.testing.assert_allclose(impact.eai_exp, impact_ref.eai_exp, rtol=1e-6)
+        self.assertAlmostEqual(impact.aai_agg, impact_ref.aai_agg,
+                               delta=1e-6 * impact_ref.aai_agg)
+
+        # configuration parameter, insured impact and impact matrix in a file
+        exp.gdf.cover /= 1e3
+        exp.gdf.deductible += 1e5
+        impact_ref = icalc.impact(save_mat=True, assign_centroids=False)
+        file_path = DATA_FOLDER / 'test_impact_calc_float32.h5'
+        matrix_dtype = CONFIG.matrix_dtype.str()
+        CONFIG.matrix_dtype = Config(val='float32', root=CONFIG)
+        try:
+            impact = icalc.impact(save_mat=file_path, assign_centroids=False)
+        finally:
+            CONFIG.matrix_dtype = Config(val=matrix_dtype, root=CONFIG)
+        self.assertEqual(impact.imp_mat.dtype, np.float32)
+        np.testing.assert_allclose(impact.imp_mat.toarray(), impact_ref.imp_mat.toarray(),
+                                   rtol=1e-6)
+        np.testing.assert_allclose(impact.eai_exp, impact_ref.eai_exp, rtol=1e-6)
+        self.assertEqual(Impact.from_hdf5(file_path).imp_mat.dtype, np.float32)
+        file_path.unlink()
+
+        with self.assertRaises(ValueError):
+            icalc.impact(assign_centroids=False, dtype=int)
+
+    def test_profile_pass(self):
+        """Test recording the phases of the impact computation"""
+        icalc = ImpactCalc(ENT.exposures.copy(), ENT.impact_funcs, HAZ)
+        impact_ref = icalc.impact(save_mat=True)
+        with icalc.profile() as prof:
+            impact = icalc.impact(save_mat=True)
+        np.testing.assert_array_equal(impact.at_event, impact_ref.at_event)
+        self.assertIsNone(icalc._profile)
+        records = prof.to_dataframe()
+        self.assertEqual(
+            list(records.phase.unique()),
+            ['assign_centroids', 'minimal_exp_gdf', 'hazard_at_centroids', 'mdr', 'fill',
+             'chunk', 'stitch', 'risk_metrics']
+        )
+        chunks = records[records.phase == 'chunk']
+        np.testing.assert_array_equal(chunks.chunk, np.arange(chunks.shape[0]))
+        self.assertEqual(chunks.nnz.sum(), impact_ref.imp_mat.nnz)
+        self.assertTrue((records.time >= 0).all())
+        self.assertTrue((records.peak_bytes >= 0).all())
+        summary = prof.summary()
+        self.assertEqual(summary.loc['stitch', 'nnz'], impact_ref.imp_mat.nnz)
+        self.assertEqual(summary.loc['chunk', 'count'], chunks.shape[0])
+
+        with icalc.profile(trace_memory=False) as prof:
+            icalc.impact(save_mat=False, assign_centroids=False)
+        records = prof.to_dataframe()
+        self.assertNotIn('assign_centroids', list(records.phase))
+        self.assertNotIn('stitch', list(records.phase))
+        self.assertTrue(records.peak_bytes.isna().all())
+
+    def test_calc_impact_pool_pass(self):
+        """Test that computing the chunks in parallel gives identical results"""
+        exp = ENT.exposures.copy()
+        exp.gdf.cover /= 1e3
+        exp.gdf.deductible += 1e5
+        # Alter the default config to enable chunking
+        max_matrix_size = CONFIG.max_matrix_size.int()
+        CONFIG.max_matrix_size = Config(val=HAZ.size * 10, root=CONFIG)
+        for exposures in [ENT.exposures, exp]:
+            icalc = ImpactCalc(exposures, ENT.impact_funcs, HAZ)
+            pool = ThreadPool(nodes=2)
+            for save_mat in [True, False]:
+                imp = icalc.impact(save_mat=save_mat, assign_centroids=False)
+                imp_pool = icalc.impact(save_mat=save_mat, assign_centroids=False, pool=pool)
+                np.testing.assert_array_equal(imp.at_event, imp_pool.at_event)
+                np.testing.assert_array_equal(imp.eai_exp, imp_pool.eai_exp)
+                self.assertEqual(imp.aai_agg, imp_pool.aai_agg)
+                if save_mat:
+                    np.testing.assert_array_equal(imp.imp_mat.toarray(),
+                                                  imp_pool.imp_mat.toarray())
+            pool.close()
+            pool.join()
+            pool.clear()
+        CONFIG.max_matrix_size = Config(val=max_matrix_size, root=CONFIG)
+
+    def test_imp_mat_gen_pool_window(self):
+        """Test that the pool computes at most two chunks per worker ahead of the consumer"""
+        max_matrix_size = CONFIG.max_matrix_size.int()
+        # one chunk per exposure point
+        CONFIG.max_matrix_size = Config(val=1, root=CONFIG)
+        exp_gdf = ENT.exposures.gdf.copy()
+        exp_gdf['centr_TC'] = np.arange(exp_gdf.shape[0]) % HAZ.centroids.size
+        icalc = ImpactCalc(ENT.exposures, ENT.impact_funcs, HAZ)
+        pool = ThreadPool(nodes=2)
+        ref = list(icalc.imp_mat_gen(exp_gdf, 'impf_TC'))
+        self.assertGreater(len(ref), 4 * pool.nodes)
+        with patch.object(pool, 'apipe', wraps=pool.apipe) as apipe:
+            imp_mat_gen = icalc.imp_mat_gen(exp_gdf, 'impf_TC', pool=pool)
+            for n_out, (mat, exp_idx) in enumerate(imp_mat_gen, start=1):
+                self.assertLessEqual(apipe.call_count, n_out + 2 * pool.nodes - 1)
+                np.testing.assert_array_equal(mat.toarray(), ref[n_out - 1][0].toarray())
+                np.testing.assert_array_equal(exp_idx, ref[n_out - 1][1])
+        self.assertEqual(n_out, len(ref))
+        pool.close()
+        pool.join()
+        pool.clear()
+        CONFIG.max_matrix_size = Config(val=max_matrix_size, root=CONFIG)
+
+    def test_calc_impact_aggregated_pass(self):
+        """Test that exposure points sharing centroid and impact function are aggregated"""
+        exp = ENT.exposures.copy()
+        exp.gdf = exp.gdf.drop(columns=['cover', 'deductible'])
+        exp.assign_centroids(HAZ)
+        exp.gdf['centr_TC'] = exp.gdf['centr_TC'].values[::-1]
+        exp.gdf.loc[::3, 'centr_TC'] = exp.gdf['centr_TC'].values[0]
+        exp.gdf.loc[::4, 'value'] *= -1
+        icalc = ImpactCalc(exp, ENT.impact_funcs, HAZ)
+        with self.assertLogs(ILOG, level='INFO') as logs:
+            impact = icalc.impact(save_mat=False, assign_centroids=False)
+        self.assertIn('Aggregating exposures to', logs.output[-1])
+        impact_mat = icalc.impact(save_mat=True, assign_centroids=False)
+        np.testing.assert_allclose(impact.at_event, impact_mat.at_event, rtol=1e-12)
+        np.testing.assert_allclose(impact.eai_exp, impact_mat.eai_exp, rtol=1e-12)
+        self.assertAlmostEqual(impact.aai_agg, impact_mat.aai_agg, delta=1e-12 * impact.aai_agg)
+        self.assertEqual(impact.imp_mat.shape, (0, 0))
+
+    def test_aggregate_exp_gdf(self):
+        """Test the unique pairs of centroid and impact function of the exposures"""
+        exp_gdf = gpd.GeoDataFrame({
+            'impf_TC': [2, 1, 2, 1, 2],
+            'centr_TC': [5, 7, 5, 5, 0],
+            'value': [1., 2., 3., 4., 5.],
+        })
+        icalc = ImpactCalc(ENT.exposures, ENT.impact_funcs, HAZ)
+        agg_gdf, group_idx = icalc.aggregate_exp_gdf(exp_gdf, 'impf_TC')
+        np.testing.assert_array_equal(agg_gdf['impf_TC'], [1, 1, 2, 2])
+        np.testing.assert_array_equal(agg_gdf['centr_TC'], [5, 7, 0, 5])
+        np.testing.assert_array_equal(agg_gdf['value'], np.ones(4))
+        self.assertEqual(agg_gdf['impf_TC'].dtype, exp_gdf['impf_TC'].dtype)
+        np.testing.assert_array_equal(group_idx, [3, 1, 3, 0, 2])
+
+    def test_calc_impact_not_aggregated(self):
+        """Test that exposures are not aggregated if few points share centroids"""
+        exp = ENT.exposures.copy()
+        exp.gdf = exp.gdf.drop(columns=['cover', 'deductible'])
+        exp.gdf['centr_TC'] = np.arange(exp.gdf.shape[0]) % HAZ.centroids.size
+        exp.gdf.loc[0, 'centr_TC'] = exp.gdf['centr_TC'].values[1]
+        icalc = ImpactCalc(exp, ENT.impact_funcs, HAZ)
+        with patch.object(icalc, '_return_aggregated_impact') as return_aggregated, \
+                patch.object(icalc, 'aggregate_exp_gdf',
+                             wraps=icalc.aggregate_exp_gdf) as aggregate:
+            impact = icalc.impact(save_mat=False, assign_centroids=False)
+        aggregate.assert_called_once()
+        return_aggregated.assert_not_called()
+        impact_mat = icalc.impact(save_mat=True, assign_centroids=False)
+        np.testing.assert_allclose(impact.at_event, impact_mat.at_event, rtol=1e-12)
+
+    def test_calc_impact_many_pass(self):
+        """Test that impact_many equals separate impact computations"""
+        impfset = ImpactFuncSet.from_excel(ENT_DEMO_TODAY)
+        impfset_mod = ImpactFuncSet.from_excel(ENT_DEMO_TODAY)
+        for impf in impfset_mod.get_func('TC'):
+            impf.mdd *= 0.5
+            impf.intensity += 5
+        icalc = ImpactCalc(ENT.exposures, impfset, HAZ)
+        impacts = icalc.impact_many([impfset, impfset_mod, impfset])
+        self.assertIs(icalc.impfset, impfset)
+        self.assertFalse(icalc._hazard_cache['active'])
+        self.assertNotEqual(icalc._hazard_cache['entries'], {})
+        self.assertEqual(len(impacts), 3)
+        for impact, ifs in zip(impacts, [impfset, impfset_mod, impfset]):
+            ref = ImpactCalc(ENT.exposures, ifs, HAZ).impact()
+            np.testing.assert_array_equal(impact.imp_mat.toarray(), ref.imp_mat.toarray())
+            np.testing.assert_array_equal(impact.at_event, ref.at_event)
+            np.testing.assert_array_equal(impact.eai_exp, ref.eai_exp)
+            self.assertEqual(impact.aai_agg, ref.aai_agg)
+        self.assertLess(impacts[1].aai_agg, impacts[0].aai_agg)
+
+    def test_calc_impact_many_error(self):
+        """Test that impact_many checks all impact function sets"""
+        impfset = ImpactFuncSet.from_excel(ENT_DEMO_TODAY)
+        icalc = ImpactCalc(ENT.exposures, impfset, HAZ)
+        with self.assertRaises(AttributeError):
+            icalc.impact_many([impfset, ImpactFuncSet()])
+        self.assertIs(icalc.impfset, impfset)
+        self.assertEqual(icalc.impact_many([]), [])
+
+    def test_calc_impact_many_cache(self):
+        """Test that impact_many reuses the hazard between calls until it is modified"""
+        impfset = ImpactFuncSet.from_excel(ENT_DEMO_TODAY)
+        haz = deepcopy(HAZ)
+        icalc = ImpactCalc(ENT.exposures, impfset, haz)
+        with patch.object(icalc, '_extract_hazard_at_centroids',
+                          wraps=icalc._extract_hazard_at_centroids) as extract:
+            impact = icalc.impact_many([impfset])[0]
+            n_extract = extract.call_count
+            self.assertGreater(n_extract, 0)
+            self.assertEqual(icalc.impact_many([impfset])[0].aai_agg, impact.aai_agg)
+            self.assertEqual(extract.call_count, n_extract)
+
+            haz.intensity.data *= 2
+            haz.clear_matrix_cache()
+            impact_mod = icalc.impact_many([impfset])[0]
+            self.assertEqual(extract.call_count, 2 * n_extract)
+        ref = ImpactCalc(ENT.exposures, impfset, haz).impact()
+        np.testing.assert_array_equal(impact_mod.at_event, ref.at_event)
+        self.assertGreater(impact_mod.aai_agg, impact.aai_agg)
+
+    def test_calc_impact_many_prepared_exposures(self):
+        """Test that impact_many prepares the exposures once until the hazard is modified"""
+        impfset = ImpactFuncSet.from_excel(ENT_DEMO_TODAY)
+        exp = ENT.exposures.copy()
+        haz = deepcopy(HAZ)
+        icalc = ImpactCalc(exp, impfset, haz)
+        kwargs = dict(save_mat=False, ignore_cover=True, ignore_deductible=True)
+        with patch.object(icalc, 'minimal_exp_gdf', wraps=icalc.minimal_exp_gdf) as minimal, \
+                patch.object(icalc, 'aggregate_exp_gdf',
+                             wraps=icalc.aggregate_exp_gdf) as aggregate:
+            impact = icalc.impact_many([impfset], **kwargs)[0]
+            self.assertEqual(icalc.impact_many([impfset], **kwargs)[0].aai_agg, impact.aai_agg)
+            self.assertEqual(minimal.call_count, 1)
+            self.assertEqual(aggregate.call_count, 1)
+
+            icalc.impact_many([impfset], save_mat=True, ignore_cover=True,
+                              ignore_deductible=True)
+            self.assertEqual(minimal.call_count, 1)
+            self.assertEqual(aggregate.call_count, 1)
+
+            icalc.impact_many([impfset], save_mat=False)
+            self.assertEqual(minimal.call_count, 2)
+
+            haz.clear_matrix_cache()
+            icalc.impact_many([impfset], save_mat=False)
+            self.assertEqual(minimal.call_count, 3)
+
     def test_calc_insured_impact_pass(self):
         """Test compute insured impact"""
         exp = ENT.exposures.copy()
@@ -411,6 +693,29 @@ class TestImpactCalc(unittest.TestCase):
         self.assertAlmostEqual(6.570532945599105e+11, impact.tot_value)
         self.assertAlmostEqual(143180396, impact.aai_agg, delta=1)
 
+    def test_calc_impact_gross_net_pass(self):
+        """Test computing the impact without and with cover and deductible together"""
+        exp = ENT.exposures.copy()
+        exp.gdf.cover /= 1e3
+        exp.gdf.deductible += 1e5
+        impfset = ImpactFuncSet.from_excel(ENT_DEMO_TODAY)
+        icalc = ImpactCalc(exp, impfset, HAZ)
+        for save_mat in [True, False]:
+            with self.subTest(save_mat=save_mat):
+                gross, net = icalc.impact_gross_net(save_mat=save_mat)
+                gross_ref = icalc.impact(
+                    save_mat=True, ignore_cover=True, ignore_deductible=True
+                )
+                net_ref = icalc.impact(save_mat=True)
+                for impact, ref in [(gross, gross_ref), (net, net_ref)]:
+                    np.testing.assert_allclose(impact.at_event, ref.at_event, rtol=1e-12)
+                    np.testing.assert_allclose(impact.eai_exp, ref.eai_exp, rtol=1e-12)
+                    self.assertAlmostEqual(impact.aai_agg, ref.aai_agg,
+                                           delta=1e-12 * ref.aai_agg)
+                    if save_mat:
+                        self.assertEqual((impact.imp_mat != ref.imp_mat).nnz, 0)
+                self.assertLess(net.aai_agg, gross.aai_agg)
+
     def test_minimal_exp_gdf(self):
         """Test obtain minimal exposures gdf"""
         icalc = ImpactCalc(ENT.exposures, ENT.impact_funcs, HAZ)
@@ -438,6 +743,23 @@ class TestImpactCalc(unittest.TestCase):
             mat.toarray(),
             [[1.0, 1.0, 0.0, 0.0], [0.0, 3.0, 2.0, 0.0], [0.0, 2.0, 2.0, 4.0]],
         )
+        self.assertTrue(mat.has_canonical_format)
+        self.assertEqual(mat.indices.dtype, np.int32)
+        self.assertEqual(mat.indptr.dtype, np.int32)
+
+        # exposure points in permuted order
+        icalc._orig_exp_idx = np.array([3, 2, 1, 0])
+        mat = icalc.stitch_impact_matrix(iter(imp_mat_gen))
+        np.testing.assert_array_equal(
+            mat.toarray(),
+            [[0.0, 0.0, 1.0, 1.0], [0.0, 2.0, 3.0, 0.0], [4.0, 2.0, 2.0, 0.0]],
+        )
+        self.assertTrue(mat.has_sorted_indices)
+
+        # no sub-matrices
+        mat = icalc.stitch_impact_matrix(iter([]))
+        self.assertEqual(mat.shape, (3, 4))
+        self.assertEqual(mat.nnz, 0)
 
     def test_apply_deductible_to_mat(self):
         """Test applying a deductible to an impact matrix"""
@@ -476,13 +798,22 @@ class TestImpactMatrixCalc(unittest.TestCase):
     """Verify the computation of the impact matrix"""
 
     def setUp(self):
-        """Mock the methods called by 'impact_matrix'"""
-        self.hazard = create_autospec(HAZ)
-        self.hazard.get_mdr.return_value = sparse.csr_matrix(
-            [[0.0, 0.5, -1.0], [1.0, 2.0, 1.0]]
+        """Set up a small hazard used by 'impact_matrix'"""
+        self.hazard = Hazard(
+            'TC',
+            intensity=sparse.csr_matrix(
+                [[0.0, 5.0, 0.0, 0.0, 10.0], [0.0, 10.0, 5.0, 3.0, 5.0]]
+            ),
+            fraction=sparse.csr_matrix(
+                [[0.0, 1.0, 1.0, 1.0, 1.0], [0.0, 0.5, 1.0, 0.0, 2.0]]
+            ),
+            centroids=Centroids(lat=np.zeros(5), lon=np.arange(5)),
+            event_id=np.array([1, 2]),
+            frequency=np.ones(2),
         )
-        self.hazard._get_fraction.return_value = sparse.csr_matrix(
-            [[1.0, 1.0, 1.0], [-0.5, 0.5, 2.0]]
+        self.impf = ImpactFunc(
+            haz_type='TC', id=1, intensity=np.array([0.0, 10.0]),
+            mdd=np.array([0.0, 1.0]), paa=np.ones(2)
         )
         self.exposure_values = np.array([10.0, 20.0, -30.0])
         self.centroids = np.array([1, 2, 4])
@@ -491,18 +822,65 @@ class TestImpactMatrixCalc(unittest.TestCase):
     def test_correct_calculation(self):
         """Assert that the calculation of the impact matrix is correct"""
         impact_matrix = self.icalc.impact_matrix(
-            self.exposure_values, self.centroids, ENT.impact_funcs
+            self.exposure_values, self.centroids, self.impf
         )
         np.testing.assert_array_equal(
-            impact_matrix.toarray(), [[0.0, 10.0, 30.0], [-5.0, 20.0, -60.0]]
+            impact_matrix.toarray(), [[5.0, 0.0, -30.0], [5.0, 10.0, -30.0]]
         )
+        self.assertTrue(impact_matrix.has_canonical_format)
+        self.assertTrue(all(impact_matrix.data != 0))
 
-        # Check if hazard methods were called with expected arguments
-        with self.subTest("Internal call to hazard instance"):
-            self.hazard.get_mdr.assert_called_once_with(
-                self.centroids, ENT.impact_funcs
-            )
-            self.hazard._get_fraction.assert_called_once_with(self.centroids)
+    def test_repeated_centroids(self):
+        """Assert that exposure points sharing centroids are computed correctly"""
+        self.hazard.fraction = sparse.csr_matrix((2, 5))
+        impact_matrix = self.icalc.impact_matrix(
+            np.array([1.0, 2.0, 4.0, 8.0]), np.array([4, 0, 4, 1]), self.impf
+        )
+        np.testing.assert_array_equal(
+            impact_matrix.toarray(), [[1.0, 0.0, 4.0, 4.0], [0.5, 0.0, 2.0, 8.0]]
+        )
+        self.assertEqual(impact_matrix.nnz, 6)
+        self.assertTrue(impact_matrix.has_canonical_format)
+
+    def test_mdr_nonzero_at_zero_intensity(self):
+        """Impact functions with mdr(0) != 0 have an impact outside of the footprint"""
+        impf = ImpactFunc(
+            haz_type='TC', id=1, intensity=np.array([0.0, 10.0]),
+            mdd=np.array([0.1, 1.0]), paa=np.ones(2)
+        )
+        self.hazard.fraction = sparse.csr_matrix((2, 5))
+        impact_matrix = self.icalc.impact_matrix(
+            self.exposure_values, self.centroids, impf
+        )
+        mdr = impf.calc_mdr(self.hazard.intensity.toarray()[:, self.centroids])
+        np.testing.assert_allclose(impact_matrix.toarray(), mdr * self.exposure_values)
+
+    def test_insured_impact_matrix(self):
+        """Assert that the insured impact matrix equals applying deductible and cover"""
+        impf = ImpactFunc(
+            haz_type='TC', id=1, intensity=np.array([0.0, 4.0, 10.0]),
+            mdd=np.array([0.0, 0.0, 1.0]), paa=np.array([0.0, 0.5, 1.0])
+        )
+        exp_values = np.array([10.0, 20.0, 30.0, 40.0])
+        cent_idx = np.array([1, 2, 4, 3])
+        deductible = np.array([1.0, 2.0, 0.0, 5.0])
+        cover = np.array([3.0, 100.0, 20.0, 100.0])
+        for ded, cov in [(deductible, cover), (deductible, None), (None, cover)]:
+            with self.subTest(deductible=ded, cover=cov):
+                imp_mat, ins_mat = self.icalc.insured_impact_matrix(
+                    exp_values, cent_idx, impf, ded, cov
+                )
+                ref = self.icalc.impact_matrix(exp_values, cent_idx, impf)
+                np.testing.assert_array_equal(imp_mat.toarray(), ref.toarray())
+                if ded is not None:
+                    ref = self.icalc.apply_deductible_to_mat(
+                        ref, ded, self.hazard, cent_idx, impf
+                    )
+                if cov is not None:
+                    ref = self.icalc.apply_cover_to_mat(ref, cov)
+                np.testing.assert_array_equal(ins_mat.toarray(), ref.toarray())
+                self.assertTrue(ins_mat.has_canonical_format)
+                self.assertTrue(all(ins_mat.data != 0))
 
     def test_wrong_sizes(self):
         """Calling 'impact_matrix' with wrongly sized argument results in errors"""
@@ -528,9 +906,11 @@ class TestImpactMatrixGenerator(unittest.TestCase):
         self.hazard.haz_type = "haz_type"
         self.hazard.centr_exp_col = "centr_col"
         self.hazard.size = 1
+        self.hazard._get_csc.return_value = sparse.csc_matrix((1, 30))
 
         # Mock the Impact function (set)
         self.impf = MagicMock(name="impact_function")
+        self.impf.calc_mdr.return_value = 0
         self.impfset = create_autospec(ENT.impact_funcs)
         self.impfset.get_func.return_value = self.impf
 
@@ -564,17 +944,22 @@ class TestImpactMatrixGenerator(unittest.TestCase):
         )
         self.icalc.impact_matrix.assert_has_calls(
             [
-                call(np.array([0.0]), np.array([0]), self.impf),
-                call(np.array([1.0]), np.array([10]), self.impf),
-                call(np.array([2.0]), np.array([20]), self.impf),
+                call(np.array([0.0]), np.array([0]), self.impf, dtype=None),
+                call(np.array([1.0]), np.array([10]), self.impf, dtype=None),
+                call(np.array([2.0]), np.array([20]), self.impf, dtype=None),
             ]
         )
 
     def test_chunking(self):
         """Verify that chunking works as expected"""
-        # n_chunks = hazard.size * len(centr_idx) / max_size = 2 * 5 / 4 = 2.5
-        CONFIG.max_matrix_size = Config(val=4, root=CONFIG)
+        # memory budget of three non-zero entries, each exposure point counting as one entry
+        CONFIG.max_matrix_size = Config(
+            val=3 * _IMP_MAT_NNZ_BYTES // np.dtype(float).itemsize, root=CONFIG
+        )
         self.hazard.size = 2
+        self.hazard._get_csc.return_value = sparse.csc_matrix(
+            np.array([[1, 0, 1, 0, 0], [0, 0, 1, 0, 0]])
+        )
 
         arr_len = 5
         exp_gdf = gpd.GeoDataFrame(
@@ -588,16 +973,38 @@ class TestImpactMatrixGenerator(unittest.TestCase):
         out_list = [exp_idx for _, exp_idx in gen]
 
         # Expect three chunks
-        self.assertEqual(len(out_list[0]), 2)
-        self.assertEqual(len(out_list[1]), 2)
-        self.assertEqual(len(out_list[2]), 1)
+        self.assertEqual(len(out_list), 3)
+        np.testing.assert_array_equal(out_list[0], [0, 1])
+        np.testing.assert_array_equal(out_list[1], [2])
+        np.testing.assert_array_equal(out_list[2], [3, 4])
+
+    def test_chunking_dense_mdr(self):
+        """Verify that all events count if the impact function is non-zero at zero intensity"""
+        # n_chunks = (hazard.size + 1) * len(centr_idx) / 3 = 3 * 5 / 3 = 5
+        CONFIG.max_matrix_size = Config(
+            val=3 * _IMP_MAT_NNZ_BYTES // np.dtype(float).itemsize, root=CONFIG
+        )
+        self.hazard.size = 2
+        self.impf.calc_mdr.return_value = 0.1
+
+        arr_len = 5
+        exp_gdf = gpd.GeoDataFrame(
+            {
+                "impact_functions": np.zeros(arr_len, dtype=np.int64),
+                "centr_col": np.array(list(range(arr_len))),
+                "value": np.ones(arr_len, dtype=np.float64),
+            }
+        )
+        gen = self.icalc.imp_mat_gen(exp_gdf=exp_gdf, impf_col="impact_functions")
+        out_list = [exp_idx for _, exp_idx in gen]
+        self.assertEqual(len(out_list), 5)
 
-    def test_chunk_error(self):
-        """Assert that too large hazard results in error"""
+    def test_large_sparse_hazard(self):
+        """Assert that a hazard larger than the memory limit is chunked per exposure point"""
         self.hazard.size = 2
         gen = self.icalc.imp_mat_gen(exp_gdf=self.exp_gdf, impf_col="impact_functions")
-        with self.assertRaises(ValueError):
-            list(gen)
+        out_list = [exp_idx for _, exp_idx in gen]
+        np.testing.assert_array_equal(out_list, [[0], [1], [2]])
 
     def test_empty_exp(self):
         """imp_mat_gen should return an empty iterator for an empty dataframe"""
@@ -664,30 +1071,29 @@ class TestInsuredImpactMatrixGenerator(unittest.TestCase):
 
 class TestImpactMatrix(unittest.TestCase):
     """Test Impact matrix computation"""
-    def setUp(self):
-        """Initialize mock"""
-        hazard = create_autospec(HAZ)
-        impact_funcs = create_autospec(ENT.impact_funcs)
-        self.icalc = ImpactCalc(ENT.exposures, impact_funcs, hazard)
-
-        mdr = sparse.csr_matrix([[1.0, 0.0, 2.0], [-1.0, 0.5, 1.0]])
-        mdr.eliminate_zeros()
-        self.icalc.hazard.get_mdr.return_value = mdr
-        fraction = sparse.csr_matrix([[1.0, 1.0, 1.0], [1.0, 0.0, -1.0]])
-        fraction.eliminate_zeros()
-        self.icalc.hazard._get_fraction.return_value = fraction
 
     def test_impact_matrix(self):
-        """Check if impact matrix calculations and calls to hazard are correct"""
-        exp_values = np.array([1.0, 2.0, 4.0])
-        centroid_idx = np.array([0, 2, 3])
-        impact_matrix = self.icalc.impact_matrix(exp_values, centroid_idx, "impf")
-
-        np.testing.assert_array_equal(
-            impact_matrix.toarray(), [[1.0, 0.0, 8.0], [-1.0, 0.0, -4.0]]
-        )
-        self.icalc.hazard.get_mdr.assert_called_once_with(centroid_idx, "impf")
-        self.icalc.hazard._get_fraction.assert_called_once_with(centroid_idx)
+        """Check the impact matrix against the product of mdr, fraction and values"""
+        rng = np.random.default_rng(0)
+        impf = ImpactFuncSet.from_excel(ENT_DEMO_TODAY).get_func(haz_type='TC', fun_id=1)
+        haz_frac = deepcopy(HAZ)
+        haz_frac.fraction = HAZ.intensity.copy()
+        haz_frac.fraction.data = rng.uniform(size=haz_frac.fraction.nnz)
+        for haz in [HAZ, haz_frac]:
+            icalc = ImpactCalc(ENT.exposures, ENT.impact_funcs, haz)
+            cent_idx = rng.integers(0, haz.centroids.size, size=200)
+            exp_values = rng.uniform(1, 10, size=200)
+            impact_matrix = icalc.impact_matrix(exp_values, cent_idx, impf)
+
+            mdr = haz.get_mdr(cent_idx, impf)
+            fract = haz._get_fraction(cent_idx)
+            if fract is not None:
+                mdr = fract.multiply(mdr)
+            expected = mdr.multiply(sparse.csr_matrix(exp_values))
+            self.assertIsInstance(impact_matrix, sparse.csr_matrix)
+            self.assertEqual(impact_matrix.shape, (haz.size, 200))
+            self.assertEqual(impact_matrix.nnz, expected.nnz)
+            np.testing.assert_array_equal(impact_matrix.toarray(), expected.toarray())
 
 
 @patch.object(Impact, "from_eih")
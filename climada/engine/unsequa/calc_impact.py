@@ -335,19 +335,7 @@ def _map_impact_calc(
 
     """
     uncertainty_values = []
-    for _, sample in sample_chunks.iterrows():
-        exp_samples = sample[exp_input_var.labels].to_dict()
-        impf_samples = sample[impf_input_var.labels].to_dict()
-        haz_samples = sample[haz_input_var.labels].to_dict()
-
-        exp = exp_input_var.evaluate(**exp_samples)
-        impf = impf_input_var.evaluate(**impf_samples)
-        haz = haz_input_var.evaluate(**haz_samples)
-
-        exp.assign_centroids(haz, overwrite=False)
-        imp = ImpactCalc(exposures=exp, impfset=impf, hazard=haz)\
-                .impact(assign_centroids=False, save_mat=False)
-
+    for imp in _impact_samples(sample_chunks, exp_input_var, impf_input_var, haz_input_var):
         # Extract from climada.impact the chosen metrics
         freq_curve = imp.calc_freq_curve(rp).impact
 
@@ -364,3 +352,60 @@ def _map_impact_calc(
         uncertainty_values.append([imp.aai_agg, freq_curve, eai_exp, at_event])
 
     return list(zip(*uncertainty_values))
+
+
+def _impact_samples(sample_chunks, exp_input_var, impf_input_var, haz_input_var):
+    """
+    Compute the impact for all parameter samples
+
+    If neither the exposures nor the hazard are uncertain, they are evaluated
+    and prepared only once and all impact function sets are computed with
+    ImpactCalc.impact_many.
+
+    Parameters
+    ----------
+    sample_chunks : pd.DataFrame
+        Dataframe of the parameter samples
+    exp_input_var : InputVar or Exposures
+        Exposure uncertainty variable
+    impf_input_var : InputVar if ImpactFuncSet
+        Impact function set uncertainty variable
+    haz_input_var: InputVar or Hazard
+        Hazard uncertainty variable
+
+    Returns
+    -------
+    iterable of climada.engine.Impact
+        impact for each sample, in the order of sample_chunks
+    """
+    if exp_input_var.labels or haz_input_var.labels:
+        return (
+            _impact_sample(sample, exp_input_var, impf_input_var, haz_input_var)
+            for _, sample in sample_chunks.iterrows()
+            )
+    if sample_chunks.empty:
+        return []
+    exp = exp_input_var.evaluate()
+    haz = haz_input_var.evaluate()
+    exp.assign_centroids(haz, overwrite=False)
+    impfs = [
+        impf_input_var.evaluate(**sample[impf_input_var.labels].to_dict())
+        for _, sample in sample_chunks.iterrows()
+        ]
+    return ImpactCalc(exposures=exp, impfset=impfs[0], hazard=haz)\
+            .impact_many(impfs, assign_centroids=False, save_mat=False)
+
+
+def _impact_sample(sample, exp_input_var, impf_input_var, haz_input_var):
+    """Compute the impact for one parameter sample"""
+    exp_samples = sample[exp_input_var.labels].to_dict()
+    impf_samples = sample[impf_input_var.labels].to_dict()
+    haz_samples = sample[haz_input_var.labels].to_dict()
+
+    exp = exp_input_var.evaluate(**exp_samples)
+    impf = impf_input_var.evaluate(**impf_samples)
+    haz = haz_input_var.evaluate(**haz_samples)
+
+    exp.assign_centroids(haz, overwrite=False)
+    return ImpactCalc(exposures=exp, impfset=impf, hazard=haz)\
+            .impact(assign_centroids=False, save_mat=False)
@@ -25,14 +25,13 @@ import copy
 import datetime as dt
 import logging
 from typing import Optional,List
-import warnings
+import weakref
 
 import geopandas as gpd
 import numpy as np
 from pathos.pools import ProcessPool as Pool
 from scipy import sparse
 
-from climada import CONFIG
 from climada.hazard.plot import HazardPlot
 from climada.hazard.io import HazardIO
 from climada.hazard.centroids.centr import Centroids
@@ -40,10 +39,16 @@ import climada.util.checker as u_check
 import climada.util.constants as u_const
 import climada.util.coordinates as u_coord
 import climada.util.dates_times as u_dt
+import climada.util.exceedance as u_exc
+from climada.util.hdf5_handler import H5CSRMatrix
 
 
 LOGGER = logging.getLogger(__name__)
 
+_CSC_CACHE = weakref.WeakKeyDictionary()
+"""Column-oriented copies of the intensity and fraction matrices of Hazard objects,
+see Hazard._get_csc"""
+
 
 class Hazard(HazardIO, HazardPlot):
     """
@@ -226,8 +231,11 @@ class Hazard(HazardIO, HazardPlot):
         ValueError
             If matrices are ill-formed or ill-shaped in relation to each other
         """
-        u_check.prune_csr_matrix(self.intensity)
-        u_check.prune_csr_matrix(self.fraction)
+        for mat in [self.intensity, self.fraction]:
+            # matrices read on demand from a file are stored as written
+            if not isinstance(mat, H5CSRMatrix):
+                u_check.prune_csr_matrix(mat)
+        self.clear_matrix_cache()
         if self.fraction.nnz > 0:
             if self.intensity.shape != self.fraction.shape:
                 raise ValueError(
@@ -348,7 +356,10 @@ class Hazard(HazardIO, HazardPlot):
                 np.argwhere(self.event_id == n)[0,0]
                 for n in event_id
                 if n in self.event_id[sel_ev]
-                ])
+                ], dtype=int)
+            if not sel_ev.size:
+                LOGGER.info('No hazard with id %s', event_id)
+                return None
 
         # filter centroids
         sel_cen = self.centroids.select_mask(reg_id=reg_id, extent=extent)
@@ -357,13 +368,23 @@ class Hazard(HazardIO, HazardPlot):
             return None
 
         # Sanitize fraction, because we check non-zero entries later
-        self.fraction.eliminate_zeros()
+        if not isinstance(self.fraction, H5CSRMatrix):
+            self.fraction.eliminate_zeros()
 
         # Perform attribute selection
+        all_ev = sel_ev.size == self.event_id.size and np.all(sel_ev == np.arange(sel_ev.size))
         for (var_name, var_val) in self.__dict__.items():
             if isinstance(var_val, np.ndarray) and var_val.ndim == 1 \
                     and var_val.size > 0:
                 setattr(haz, var_name, var_val[sel_ev])
+            elif isinstance(var_val, H5CSRMatrix):
+                # only the rows of the selected events are read from the file, in blocks
+                # reduced to the selected centroids
+                setattr(haz, var_name,
+                        var_val.read_rows(sel_ev, None if np.all(sel_cen) else sel_cen))
+            elif var_name in ('intensity', 'fraction') and all_ev and not np.all(sel_cen):
+                # selection of centroids only, from the column-oriented copy
+                setattr(haz, var_name, self._get_csc(var_name)[:, sel_cen].tocsr())
             elif isinstance(var_val, sparse.csr_matrix):
                 setattr(haz, var_name, var_val[sel_ev, :][:, sel_cen])
             elif isinstance(var_val, list) and var_val:
@@ -435,23 +456,32 @@ class Hazard(HazardIO, HazardPlot):
 
         """
 
-        if val == 'intensity':
-            cent_nz = (self.intensity != 0).sum(axis=0).nonzero()[1]
-        if val == 'fraction':
-            cent_nz = (self.fraction != 0).sum(axis=0).nonzero()[1]
+        if val in ('intensity', 'fraction'):
+            mat = getattr(self, val)
+            cent_nz = np.unique(mat.indices[:mat.nnz][mat.data[:mat.nnz] != 0])
         lon_nz = self.centroids.lon[cent_nz]
         lat_nz = self.centroids.lat[cent_nz]
         return self.select(extent=u_coord.toggle_extent_bounds(
             u_coord.latlon_bounds(lat=lat_nz, lon=lon_nz, buffer=buffer)
         ))
 
-    def local_exceedance_inten(self, return_periods=(25, 50, 100, 250)):
+    def local_exceedance_inten(self, return_periods=(25, 50, 100, 250), pool=None):
         """Compute exceedance intensity map for given return periods.
 
+        At each centroid, the intensities above ``intensity_thres`` are sorted in descending
+        order and a straight line is fitted to them as function of the logarithm of their
+        cumulative frequencies. The fits of all centroids are computed at once from the
+        non-zero entries of the intensity matrix, see
+        :py:func:`climada.util.exceedance.exceedance_fit`.
+
         Parameters
         ----------
         return_periods : np.array
             return periods to consider
+        pool : pathos.pool, optional
+            Pool used to compute blocks of centroids in parallel. A thread pool
+            (``pathos.pools.ThreadPool``) avoids copying the intensity matrix to each
+            worker. Default: None
 
         Returns
         -------
@@ -463,25 +493,13 @@ class Hazard(HazardIO, HazardPlot):
                 LOGGER.warning('Return period %1.1f exceeds max. event return period.', period)
         LOGGER.info('Computing exceedance intenstiy map for return periods: %s',
                     return_periods)
-        num_cen = self.intensity.shape[1]
-        inten_stats = np.zeros((len(return_periods), num_cen))
-        cen_step = CONFIG.max_matrix_size.int() // self.intensity.shape[0]
-        if not cen_step:
-            raise ValueError('Increase max_matrix_size configuration parameter to >'
-                             f' {self.intensity.shape[0]}')
-        # separte in chunks
-        chk = -1
-        for chk in range(int(num_cen / cen_step)):
-            self._loc_return_inten(
-                np.array(return_periods),
-                self.intensity[:, chk * cen_step:(chk + 1) * cen_step].toarray(),
-                inten_stats[:, chk * cen_step:(chk + 1) * cen_step])
-        self._loc_return_inten(
-            np.array(return_periods),
-            self.intensity[:, (chk + 1) * cen_step:].toarray(),
-            inten_stats[:, (chk + 1) * cen_step:])
+        intensity = self._get_csc('intensity')
+        inten_stats = u_exc.exceedance_fit(
+            intensity, self.frequency, return_periods,
+            threshold=self.intensity_thres, pool=pool
+        )
         # set values below 0 to zero if minimum of hazard.intensity >= 0:
-        if np.min(inten_stats) < 0 <= self.intensity.min():
+        if np.min(inten_stats) < 0 <= intensity.min():
             LOGGER.warning('Exceedance intenstiy values below 0 are set to 0. \
                    Reason: no negative intensity values were found in hazard.')
             inten_stats[inten_stats < 0] = 0
@@ -493,7 +511,7 @@ class Hazard(HazardIO, HazardPlot):
             LOGGER.debug('Resetting event_id.')
             self.event_id = np.arange(1, self.event_id.size + 1)
 
-    def local_return_period(self, threshold_intensities=(5., 10., 20.)):
+    def local_return_period(self, threshold_intensities=(5., 10., 20.), pool=None):
         """Compute local return periods for given hazard intensities. The used method
         is fitting the ordered intensitites per centroid to the corresponding cummulated
         frequency with a step function.
@@ -503,6 +521,8 @@ class Hazard(HazardIO, HazardPlot):
         threshold_intensities : np.array
             User-specified hazard intensities for which the return period should be calculated
             locally (at each centroid). Defaults to (5, 10, 20)
+        pool : pathos.pool, optional
+            Pool used to compute blocks of centroids in parallel. Default: None
 
         Returns
         -------
@@ -531,23 +551,9 @@ class Hazard(HazardIO, HazardPlot):
         # Ensure threshold_intensities is a numpy array
         threshold_intensities = np.array(threshold_intensities)
 
-        num_cen = self.intensity.shape[1]
-        return_periods = np.zeros((len(threshold_intensities), num_cen))
-
-        # batch_centroids = number of centroids that are handled in parallel: 
-        # batch_centroids = maximal matrix size // number of events
-        batch_centroids = CONFIG.max_matrix_size.int() // self.intensity.shape[0]
-        if batch_centroids < 1:
-            raise ValueError('Increase max_matrix_size configuration parameter to >'
-                             f'{self.intensity.shape[0]}')
-
-        # Process the intensities in chunks of centroids
-        for start_col in range(0, num_cen, batch_centroids):
-            end_col = min(start_col + batch_centroids, num_cen)
-            return_periods[:, start_col:end_col] = self._loc_return_period(
-                threshold_intensities,
-                self.intensity[:, start_col:end_col].toarray()
-                )
+        return_periods = u_exc.exceedance_return_period(
+            self._get_csc('intensity'), self.frequency, threshold_intensities, pool=pool
+        )
 
         # create the output GeoDataFrame
         gdf = gpd.GeoDataFrame(geometry = self.centroids.gdf['geometry'],
@@ -637,8 +643,7 @@ class Hazard(HazardIO, HazardPlot):
             key are years, values array with event_ids of that year
 
         """
-        orig_year = np.array([dt.datetime.fromordinal(date).year
-                              for date in self.date[self.orig]])
+        orig_year = u_dt.ordinal_to_year(self.date[self.orig])
         orig_yearset = {}
         for year in np.unique(orig_year):
             orig_yearset[year] = self.event_id[self.orig][orig_year == year]
@@ -697,81 +702,6 @@ class Hazard(HazardIO, HazardPlot):
             ev_set.add((ev_name, ev_date))
         return ev_set
 
-    def _loc_return_inten(self, return_periods, inten, exc_inten):
-        """Compute local exceedence intensity for given return period.
-
-        Parameters
-        ----------
-        return_periods: np.array
-            return periods to consider
-        cen_pos: int
-            centroid position
-
-        Returns
-        -------
-            np.array
-        """
-        # sorted intensity
-        sort_pos = np.argsort(inten, axis=0)[::-1, :]
-        columns = np.ones(inten.shape, int)
-        # pylint: disable=unsubscriptable-object  # pylint/issues/3139
-        columns *= np.arange(columns.shape[1])
-        inten_sort = inten[sort_pos, columns]
-        # cummulative frequency at sorted intensity
-        freq_sort = self.frequency[sort_pos]
-        np.cumsum(freq_sort, axis=0, out=freq_sort)
-
-        for cen_idx in range(inten.shape[1]):
-            exc_inten[:, cen_idx] = self._cen_return_inten(
-                inten_sort[:, cen_idx], freq_sort[:, cen_idx],
-                self.intensity_thres, return_periods)
-
-    def _loc_return_period(self, threshold_intensities, inten):
-        """Compute local return periods for user-specified threshold intensities
-         for a subset of hazard centroids
-
-        Parameters
-        ----------
-        threshold_intensities: np.array
-            User-specified hazard intensities for which the return period should be calculated
-            locally (at each centroid).
-        inten: np.array
-            subarray of full hazard intensities corresponding to a subset of the centroids
-            (rows corresponds to events, columns correspond to centroids)
-
-        Returns
-        -------
-            np.array
-            (rows corresponds to threshold_intensities, columns correspond to centroids)
-        """
-        # Assuming inten is sorted and calculating cumulative frequency
-        sort_pos = np.argsort(inten, axis=0)[::-1, :]
-        inten_sort = inten[sort_pos, np.arange(inten.shape[1])]
-        freq_sort = self.frequency[sort_pos]
-        freq_sort = np.cumsum(freq_sort, axis=0)
-        return_periods = np.zeros((len(threshold_intensities), inten.shape[1]))
-
-        for cen_idx in range(inten.shape[1]):
-            sorted_inten_cen = inten_sort[:, cen_idx]
-            cum_freq_cen = freq_sort[:, cen_idx]
-
-            for i, intensity in enumerate(threshold_intensities):
-                # Find the first occurrence where the intensity is less than the sorted intensities
-                exceedance_index = np.searchsorted(sorted_inten_cen[::-1], intensity, side='left')
-
-                # Calculate exceedance probability
-                if exceedance_index < len(cum_freq_cen):
-                    exceedance_probability = cum_freq_cen[-exceedance_index - 1]
-                else:
-                    exceedance_probability = 0  # Or set a default minimal probability
-
-                # Calculate and store return period
-                if exceedance_probability > 0:
-                    return_periods[i, cen_idx] = 1 / exceedance_probability
-                else:
-                    return_periods[i, cen_idx] = np.nan
-        return return_periods
-
     def _check_events(self):
         """Check that all attributes but centroids contain consistent data.
         Put default date, event_name and orig if not provided. Check not
@@ -818,22 +748,7 @@ class Hazard(HazardIO, HazardPlot):
         -------
             np.array
         """
-        inten_th = np.asarray(inten > inten_th).squeeze()
-        inten_cen = inten[inten_th]
-        freq_cen = freq[inten_th]
-        if not inten_cen.size:
-            return np.zeros((return_periods.size,))
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                pol_coef = np.polyfit(np.log(freq_cen), inten_cen, deg=1)
-        except ValueError:
-            pol_coef = np.polyfit(np.log(freq_cen), inten_cen, deg=0)
-        inten_fit = np.polyval(pol_coef, np.log(1 / return_periods))
-        wrong_inten = (return_periods > np.max(1 / freq_cen)) & np.isnan(inten_fit)
-        inten_fit[wrong_inten] = 0.
-
-        return inten_fit
+        return u_exc.cen_exceedance_fit(inten, freq, inten_th, return_periods)
 
     def append(self, *others):
         """Append the events and centroids to this hazard object.
@@ -1093,7 +1008,7 @@ class Hazard(HazardIO, HazardPlot):
 
         """
         uniq_cent_idx, indices = np.unique(cent_idx, return_inverse=True)
-        mdr = self.intensity[:, uniq_cent_idx]
+        mdr = self._get_csc('intensity')[:, uniq_cent_idx]
         if impf.calc_mdr(0) == 0:
             mdr.data = impf.calc_mdr(mdr.data)
         else:
@@ -1102,8 +1017,8 @@ class Hazard(HazardIO, HazardPlot):
                 "hazard intensity including 0 which can be very time consuming.",
             impf.id)
             mdr_array = impf.calc_mdr(mdr.toarray().ravel()).reshape(mdr.shape)
-            mdr = sparse.csr_matrix(mdr_array)
-        return mdr[:, indices]
+            mdr = sparse.csc_matrix(mdr_array)
+        return mdr[:, indices].tocsr()
 
     def get_paa(self, cent_idx, impf):
         """
@@ -1131,9 +1046,9 @@ class Hazard(HazardIO, HazardPlot):
 
         """
         uniq_cent_idx, indices = np.unique(cent_idx, return_inverse=True)
-        paa = self.intensity[:, uniq_cent_idx]
+        paa = self._get_csc('intensity')[:, uniq_cent_idx]
         paa.data = np.interp(paa.data, impf.intensity, impf.paa)
-        return paa[:, indices]
+        return paa[:, indices].tocsr()
 
     def _get_fraction(self, cent_idx=None):
         """
@@ -1157,4 +1072,50 @@ class Hazard(HazardIO, HazardPlot):
             return None
         if cent_idx is None:
             return self.fraction
-        return self.fraction[:, cent_idx]
+        return self._get_csc('fraction')[:, cent_idx].tocsr()
+
+    def clear_matrix_cache(self):
+        """Discard the column-oriented copies of the intensity and fraction matrices
+
+        The copies are used to select centroids, e.g., when computing impacts. They are
+        renewed automatically when a matrix or its arrays ``data``, ``indices`` or
+        ``indptr`` are reassigned, or when the number of stored values changes. After
+        modifying the values of these arrays in place, e.g., ``haz.intensity.data *= 2``,
+        call this method or :py:meth:`check_matrices`.
+        """
+        _CSC_CACHE.pop(self, None)
+
+    def _get_csc(self, attr):
+        """
+        Return a column-oriented copy of the intensity or fraction matrix.
+
+        Selecting centroids (columns) of a csr matrix is slow, this copy is used instead.
+        It is created on first use and kept until :py:meth:`clear_matrix_cache` or
+        :py:meth:`check_matrices` is called, or until the matrix or its arrays are
+        reassigned, or its shape or number of stored values change. In-place modifications
+        of the values of the arrays are not detected.
+
+        Parameters
+        ----------
+        attr : str
+            'intensity' or 'fraction'
+
+        Returns
+        -------
+        sparse.csc_matrix
+            copy of the matrix in csc format
+        """
+        mat = getattr(self, attr)
+        if isinstance(mat, H5CSRMatrix):
+            # matrices read from a file cannot be modified
+            buffers = [mat]
+        else:
+            buffers = [mat, mat.data, mat.indices, mat.indptr]
+        cache = _CSC_CACHE.setdefault(self, {})
+        refs, mat_csc = cache.get(attr, ([], None))
+        if (len(refs) != len(buffers)
+                or any(ref() is not buf for ref, buf in zip(refs, buffers))
+                or mat_csc.shape != mat.shape or mat_csc.nnz != mat.nnz):
+            mat_csc = mat.tocsr().tocsc()
+            cache[attr] = ([weakref.ref(buf) for buf in buffers], mat_csc)
+        return mat_csc
@@ -30,11 +30,12 @@ import h5py
 import numpy as np
 import pandas as pd
 import rasterio
-import sparse as sp
 from scipy import sparse
 import xarray as xr
 
+from climada import CONFIG
 from climada.hazard.centroids.centr import Centroids
+import climada.util.checker as u_check
 import climada.util.constants as u_const
 import climada.util.coordinates as u_coord
 import climada.util.dates_times as u_dt
@@ -130,8 +131,11 @@ class HazardIO():
             Default: None, which will use the class default ('' for vanilla
             `Hazard` objects, and hard coded in some subclasses)
         pool : pathos.pool, optional
-            Pool that will be used for parallel computation when applicable.
-            Default: None
+            Pool that will be used to read the files in parallel, preserving their order.
+            A thread pool (``pathos.pools.ThreadPool``) shares the grid computations
+            between the files, see :py:func:`climada.util.coordinates.read_raster`, and
+            avoids copying the data between processes, as rasterio releases the GIL
+            while reading. Default: None
         src_crs : crs, optional
             source CRS. Provide it if error without it.
         window : rasterio.windows.Windows, optional
@@ -177,38 +181,17 @@ class HazardIO():
             width=width, height=height, resampling=resampling, return_meta=True,
         )
 
-        if pool:
-            chunksize = max(min(len(files_intensity) // pool.ncpus, 1000), 1)
-            inten_list = pool.map(
-                _values_from_raster_files,
-                [[f] for f in files_intensity], itertools.repeat(meta),
-                itertools.repeat(band), itertools.repeat(src_crs),
-                itertools.repeat(window), itertools.repeat(geometry),
-                itertools.repeat(dst_crs), itertools.repeat(transform),
-                itertools.repeat(width), itertools.repeat(height),
-                itertools.repeat(resampling), chunksize=chunksize)
-            intensity = sparse.vstack(inten_list, format='csr')
-            if files_fraction is not None:
-                fract_list = pool.map(
-                    _values_from_raster_files,
-                    [[f] for f in files_fraction], itertools.repeat(meta),
-                    itertools.repeat(band), itertools.repeat(src_crs),
-                    itertools.repeat(window), itertools.repeat(geometry),
-                    itertools.repeat(dst_crs), itertools.repeat(transform),
-                    itertools.repeat(width), itertools.repeat(height),
-                    itertools.repeat(resampling), chunksize=chunksize)
-                fraction = sparse.vstack(fract_list, format='csr')
-        else:
-            intensity = _values_from_raster_files(
-                files_intensity, meta=meta, band=band, src_crs=src_crs, window=window,
+        intensity = _values_from_raster_files(
+            files_intensity, meta=meta, band=band, src_crs=src_crs, window=window,
+            geometry=geometry, dst_crs=dst_crs, transform=transform, width=width,
+            height=height, resampling=resampling, pool=pool,
+        )
+        if files_fraction is not None:
+            fraction = _values_from_raster_files(
+                files_fraction, meta=meta, band=band, src_crs=src_crs, window=window,
                 geometry=geometry, dst_crs=dst_crs, transform=transform, width=width,
-                height=height, resampling=resampling,
+                height=height, resampling=resampling, pool=pool,
             )
-            if files_fraction is not None:
-                fraction = _values_from_raster_files(
-                    files_fraction, meta=meta, band=band, src_crs=src_crs, window=window,
-                    geometry=geometry, dst_crs=dst_crs, transform=transform, width=width,
-                    height=height, resampling=resampling)
 
         if files_fraction is None:
             fraction = intensity.copy()
@@ -272,6 +255,8 @@ class HazardIO():
         data_vars: Optional[Dict[str, str]] = None,
         crs: str = u_const.DEF_CRS,
         rechunk: bool = False,
+        chunk_events: Optional[int] = None,
+        intensity_threshold: Optional[float] = None,
     ):
         """Read raster-like data from an xarray Dataset
 
@@ -348,6 +333,16 @@ class HazardIO():
             be forced by rechunking the data. Ideally, you would select the chunks in
             that manner when opening the dataset before passing it to this function.
             Defaults to ``False``.
+        chunk_events : int, optional
+            Number of events of the intensity and fraction that are loaded into memory at
+            a time, to be converted into sparse matrices. If the dataset is backed by dask,
+            e.g., if it was opened with ``chunks``, only these events are computed at a
+            time, such that the memory usage is bounded by the size of the block. Defaults
+            to the dask chunks along the event dimension, or to as many events as fit in
+            the ``max_matrix_size`` configuration parameter if the data is not chunked.
+        intensity_threshold : float, optional
+            If given, intensities smaller than this threshold are set to zero, and thus
+            not stored in the sparse intensity matrix. Defaults to ``None``.
 
         Returns
         -------
@@ -582,24 +577,38 @@ class HazardIO():
             crs=crs,
         )
 
-        def to_csr_matrix(array: xr.DataArray) -> sparse.csr_matrix:
-            """Store a numpy array as sparse matrix, optimizing storage space
+        def to_csr_matrix(
+            array: xr.DataArray, threshold: Optional[float] = None
+        ) -> sparse.csr_matrix:
+            """Store a data array as sparse matrix, block by block of events
 
-            The CSR matrix stores NaNs explicitly, so we set them to zero.
+            Only one block of events is loaded (and computed, if the array is backed by
+            dask) and densified at a time. The CSR matrix stores NaNs explicitly, so we set
+            them to zero, as well as values smaller than the threshold.
             """
-            array = array.where(array.notnull(), 0)
-            array = xr.apply_ufunc(
-                sp.COO.from_numpy,
-                array,
-                dask="parallelized",
-                output_dtypes=[array.dtype]
-            )
-            sparse_coo = array.compute().data  # Load into memory
-            return sparse_coo.tocsr()  # Convert sparse.COO to scipy.sparse.csr_matrix
+            array = array.transpose("event", "lat_lon")
+            num_events, num_cen = array.shape
+            if chunk_events is not None:
+                block_ends = np.arange(chunk_events, num_events + chunk_events, chunk_events)
+            elif array.chunks is not None:
+                block_ends = np.cumsum(array.chunks[0])
+            else:
+                block_size = max(1, CONFIG.max_matrix_size.int() // max(1, num_cen))
+                block_ends = np.arange(block_size, num_events + block_size, block_size)
+            blocks = [sparse.csr_matrix((0, num_cen), dtype=array.dtype)]
+            for start, end in zip(np.append(0, block_ends[:-1]), block_ends):
+                values = array[start:min(end, num_events)].values
+                zero = np.zeros(values.shape, dtype=bool)
+                if np.issubdtype(values.dtype, np.inexact):
+                    zero |= np.isnan(values)
+                if threshold is not None:
+                    zero |= values < threshold
+                blocks.append(sparse.csr_matrix(np.where(zero, 0, values)))
+            return sparse.vstack(blocks, format="csr")
 
         # Read the intensity data
         LOGGER.debug("Loading Hazard intensity from DataArray '%s'", intensity)
-        intensity_matrix = to_csr_matrix(data[intensity])
+        intensity_matrix = to_csr_matrix(data[intensity], intensity_threshold)
 
         # Define accessors for xarray DataArrays
         def default_accessor(array: xr.DataArray) -> np.ndarray:
@@ -990,7 +999,7 @@ class HazardIO():
                     )
                     dst.write(raster.astype(meta['dtype']), i_ev + 1)
 
-    def write_hdf5(self, file_name, todense=False):
+    def write_hdf5(self, file_name, todense=False, chunk_events=None, compression='gzip'):
         """Write hazard in hdf5 format.
 
         Parameters
@@ -1000,7 +1009,37 @@ class HazardIO():
         todense: bool
             if True write the sparse matrices as hdf5.dataset by converting them to dense format
             first. This increases readability of the file for other programs. default: False
+        chunk_events : int, optional
+            if given, the arrays of the events and the sparse matrices are stored in
+            resizable datasets, compressed in chunks of about this number of events. Then,
+            reading a selection of events only decompresses the chunks of these events, see
+            :py:meth:`from_hdf5`, and events can be added with :py:meth:`append_hdf5`.
+            Default: None (contiguous datasets without compression)
+        compression : str, optional
+            compression filter of the chunked datasets, 'gzip' or 'lzf', or None. Ignored
+            if ``chunk_events`` is None. Default: 'gzip'
+
+        Raises
+        ------
+        ValueError
+            if the intensity or fraction matrix is read on demand from ``file_name`` itself
         """
+        for mat in [self.intensity, self.fraction]:
+            if isinstance(mat, u_hdf5.H5CSRMatrix) \
+                    and pathlib.Path(file_name).resolve() == mat.file_path.resolve():
+                raise ValueError(f"The hazard matrices are read from {file_name}, which"
+                                 " therefore cannot be overwritten.")
+
+        def create_dataset(group, name, data, dtype=None, values_per_event=1.):
+            """Create a dataset, in resizable chunks of events if required"""
+            if chunk_events is None:
+                return group.create_dataset(name, data=data, dtype=dtype)
+            return group.create_dataset(
+                name, data=data, dtype=dtype, maxshape=(None,),
+                chunks=(max(1, int(chunk_events * values_per_event)),),
+                compression=compression, shuffle=compression is not None,
+            )
+
         LOGGER.info('Writing %s', file_name)
         with h5py.File(file_name, 'w') as hf_data:
             str_dt = h5py.special_dtype(vlen=str)
@@ -1009,25 +1048,30 @@ class HazardIO():
                     # Centroids have their own write_hdf5 method,
                     # which is invoked at the end of this method (s.b.)
                     continue
-                elif isinstance(var_val, sparse.csr_matrix):
+                elif isinstance(var_val, (sparse.csr_matrix, u_hdf5.H5CSRMatrix)):
+                    var_val = var_val.tocsr()
                     if todense:
                         hf_data.create_dataset(var_name, data=var_val.toarray())
                     else:
+                        nnz_per_event = var_val.nnz / max(1, var_val.shape[0])
                         hf_csr = hf_data.create_group(var_name)
-                        hf_csr.create_dataset('data', data=var_val.data)
-                        hf_csr.create_dataset('indices', data=var_val.indices)
-                        hf_csr.create_dataset('indptr', data=var_val.indptr)
+                        create_dataset(hf_csr, 'data', var_val.data,
+                                       values_per_event=nnz_per_event)
+                        create_dataset(hf_csr, 'indices', var_val.indices,
+                                       values_per_event=nnz_per_event)
+                        create_dataset(hf_csr, 'indptr', var_val.indptr)
                         hf_csr.attrs['shape'] = var_val.shape
                 elif isinstance(var_val, str):
                     hf_str = hf_data.create_dataset(var_name, (1,), dtype=str_dt)
                     hf_str[0] = var_val
                 elif isinstance(var_val, list) and var_val and isinstance(var_val[0], str):
-                    hf_str = hf_data.create_dataset(var_name, (len(var_val),), dtype=str_dt)
-                    for i_ev, var_ev in enumerate(var_val):
-                        hf_str[i_ev] = var_ev
+                    create_dataset(hf_data, var_name, var_val, dtype=str_dt)
                 elif var_val is not None and var_name != 'pool':
                     try:
-                        hf_data.create_dataset(var_name, data=var_val)
+                        if isinstance(var_val, np.ndarray) and var_val.ndim == 1:
+                            create_dataset(hf_data, var_name, var_val)
+                        else:
+                            hf_data.create_dataset(var_name, data=var_val)
                     except TypeError:
                         LOGGER.warning(
                             "write_hdf5: the class member %s is skipped, due to its "
@@ -1038,6 +1082,74 @@ class HazardIO():
                         )
         self.centroids.write_hdf5(file_name, mode='a')
 
+    def append_hdf5(self, file_name):
+        """Append the events of this hazard to a hazard file, without rewriting it.
+
+        The file must have been written by :py:meth:`write_hdf5` with ``chunk_events``,
+        for the same hazard type, units and centroids. The index pointers of the sparse
+        matrices in the file are converted to 64 bit integers once they would overflow.
+
+        Parameters
+        ----------
+        file_name: str
+            file name to append to, with h5 format
+
+        Raises
+        ------
+        ValueError
+            if the file cannot be appended to, if its centroids differ from the centroids
+            of this hazard, or if it contains events with the same identifiers as this hazard
+        """
+        LOGGER.info('Appending to %s', file_name)
+        if not np.array_equal(Centroids.from_hdf5(file_name).coord, self.centroids.coord):
+            raise ValueError(f"The centroids of the hazard in {file_name} differ.")
+        num_ev = self.event_id.size
+        with h5py.File(file_name, 'a') as hf_data:
+            for var_name in ['haz_type', 'units']:
+                if var_name in hf_data and \
+                        u_hdf5.to_string(hf_data[var_name][0]) != getattr(self, var_name):
+                    raise ValueError(f"The {var_name} of the hazard in {file_name} differs.")
+            if 'event_id' not in hf_data or hf_data['event_id'].maxshape != (None,):
+                raise ValueError(f"{file_name} was not written with chunks of events.")
+            if np.isin(self.event_id, hf_data['event_id'][:]).any():
+                raise ValueError("There are events with the same identifier.")
+            event_arrays, matrices = {}, {}
+            for (var_name, var_val) in self.__dict__.items():
+                if isinstance(var_val, (sparse.csr_matrix, u_hdf5.H5CSRMatrix)):
+                    hf_csr = hf_data.get(var_name)
+                    if not isinstance(hf_csr, h5py.Group) \
+                            or hf_csr['indptr'].maxshape != (None,):
+                        raise ValueError(f"{var_name} in {file_name} cannot be appended to.")
+                    if hf_csr.attrs['shape'][1] != var_val.shape[1]:
+                        raise ValueError(f"The centroids of {var_name} in {file_name} differ.")
+                    matrices[var_name] = var_val.tocsr()
+                elif var_name != 'centroids' and len(np.shape(var_val)) == 1 \
+                        and len(var_val) == num_ev:
+                    if var_name not in hf_data or hf_data[var_name].maxshape != (None,):
+                        raise ValueError(f"{var_name} in {file_name} cannot be appended to.")
+                    event_arrays[var_name] = var_val
+            # every array of the events in the file must grow, else they are misaligned
+            file_num_ev = hf_data['event_id'].shape[0]
+            for var_name, dset in hf_data.items():
+                if isinstance(dset, h5py.Dataset) and dset.maxshape == (None,) \
+                        and dset.shape[0] == file_num_ev and var_name not in event_arrays:
+                    raise ValueError(f"{var_name} of the events in {file_name} is missing in"
+                                     " the hazard.")
+
+            for var_name, var_val in event_arrays.items():
+                _append_to_dataset(hf_data[var_name], var_val)
+            for var_name, var_val in matrices.items():
+                hf_csr = hf_data[var_name]
+                file_ev, num_cen = hf_csr.attrs['shape']
+                if hf_csr['data'].shape[0] + var_val.nnz > \
+                        np.iinfo(hf_csr['indptr'].dtype).max:
+                    _recast_dataset(hf_csr, 'indptr', np.int64)
+                _append_to_dataset(hf_csr['indptr'],
+                                   var_val.indptr[1:] + hf_csr['data'].shape[0])
+                _append_to_dataset(hf_csr['data'], var_val.data)
+                _append_to_dataset(hf_csr['indices'], var_val.indices)
+                hf_csr.attrs['shape'] = (file_ev + var_val.shape[0], num_cen)
+
     def read_hdf5(self, *args, **kwargs):
         """This function is deprecated, use Hazard.from_hdf5."""
         LOGGER.warning("The use of Hazard.read_hdf5 is deprecated."
@@ -1045,21 +1157,54 @@ class HazardIO():
         self.__dict__ = self.__class__.from_hdf5(*args, **kwargs).__dict__
 
     @classmethod
-    def from_hdf5(cls, file_name):
+    def from_hdf5(cls, file_name, dtype=None, lazy=False, event_id=None, date=None,
+                  extent=None, reg_id=None):
         """Read hazard in hdf5 format.
 
+        The events and centroids can be selected while reading, as in
+        :py:meth:`climada.hazard.Hazard.select`. Then only the rows of the sparse intensity
+        and fraction matrices of the selected events are read from the file.
+
         Parameters
         ----------
         file_name: str
             file name to read, with h5 format
+        dtype : str or np.dtype, optional
+            floating point data type of the intensity and fraction matrices, ``float32`` or
+            ``float64``. Default: the ``matrix_dtype`` configuration parameter, see
+            :py:func:`climada.util.checker.matrix_dtype`
+        lazy : bool, optional
+            if True and no selection is given, sparse intensity and fraction matrices are
+            not read, but referenced as :py:class:`climada.util.hdf5_handler.H5CSRMatrix`,
+            of which the rows are read on demand, e.g., in
+            :py:meth:`climada.hazard.Hazard.select`. Their values keep the data type of
+            the file. The file must not be modified while it is referenced.
+            Default: False
+        event_id : list of int, optional
+            ids of the events to read. Default: None (all events)
+        date : array-like of length 2 containing str or int, optional
+            (initial date, final date) of the events to read, in string ISO format
+            ('2011-01-02') or datetime ordinal integer. Default: None (all events)
+        extent : tuple(float, float, float, float), optional
+            extent of the centroids to read as (min_lon, max_lon, min_lat, max_lat).
+            Default: None (all centroids)
+        reg_id : int, optional
+            region identifier of the centroids to read. Default: None (all centroids)
 
         Returns
         -------
         haz : climada.hazard.Hazard
             Hazard object from the provided MATLAB file
 
+        Raises
+        ------
+        ValueError
+            if no event or no centroid matches the selection
         """
         LOGGER.info('Reading %s', file_name)
+        dtype = u_check.matrix_dtype(dtype)
+        selection = dict(event_id=event_id, date=date, extent=extent, reg_id=reg_id)
+        selection = {key: val for key, val in selection.items() if val is not None}
         # NOTE: This is a stretch. We instantiate one empty object to iterate over its
         #       attributes. But then we create a new one with the attributes filled!
         haz = cls()
@@ -1075,10 +1220,13 @@ class HazardIO():
                 elif isinstance(var_val, sparse.csr_matrix):
                     hf_csr = hf_data.get(var_name)
                     if isinstance(hf_csr, h5py.Dataset):
-                        hazard_kwargs[var_name] = sparse.csr_matrix(hf_csr)
+                        hazard_kwargs[var_name] = sparse.csr_matrix(hf_csr, dtype=dtype)
+                    elif lazy or selection:
+                        hazard_kwargs[var_name] = u_hdf5.H5CSRMatrix(file_name, var_name)
                     else:
                         hazard_kwargs[var_name] = sparse.csr_matrix(
-                            (hf_csr['data'][:], hf_csr['indices'][:], hf_csr['indptr'][:]),
+                            (hf_csr['data'].astype(dtype)[:], hf_csr['indices'][:],
+                             hf_csr['indptr'][:]),
                             hf_csr.attrs['shape'])
                 elif isinstance(var_val, str):
                     hazard_kwargs[var_name] = u_hdf5.to_string(
@@ -1090,7 +1238,15 @@ class HazardIO():
                     hazard_kwargs[var_name] = hf_data.get(var_name)
         hazard_kwargs["centroids"] = Centroids.from_hdf5(file_name)
         # Now create the actual object we want to return!
-        return cls(**hazard_kwargs)
+        haz = cls(**hazard_kwargs)
+        if not selection:
+            return haz
+        haz = haz.select(**selection)
+        if haz is None:
+            raise ValueError(f"No hazard in {file_name} matches the selection {selection}.")
+        haz.intensity = haz.intensity.astype(dtype, copy=False)
+        haz.fraction = haz.fraction.astype(dtype, copy=False)
+        return haz
 
     @staticmethod
     def _read_att_mat(data, file_name, var_names, centroids):
@@ -1183,15 +1339,39 @@ class HazardIO():
         return attrs
 
 
+def _append_to_dataset(dset, values):
+    """Append values to a resizable one-dimensional dataset"""
+    size = dset.shape[0]
+    dset.resize((size + len(values),))
+    dset[size:] = values
+
+
+def _recast_dataset(group, name, dtype, block_size=10_000_000):
+    """Replace a resizable one-dimensional dataset of a group by a copy with another data
+    type, keeping its chunks and compression. The values are copied in blocks."""
+    dset = group[name]
+    tmp_name = f'{name}_{np.dtype(dtype).name}'
+    new_dset = group.create_dataset(
+        tmp_name, shape=dset.shape, dtype=dtype, maxshape=dset.maxshape, chunks=dset.chunks,
+        compression=dset.compression, compression_opts=dset.compression_opts,
+        shuffle=dset.shuffle,
+    )
+    for start in range(0, dset.shape[0], block_size):
+        new_dset[start:start + block_size] = dset[start:start + block_size]
+    del group[name]
+    group.move(tmp_name, name)
+
+
 def _values_from_raster_files(
     file_names, meta, band=None, src_crs=None, window=None,
     geometry=None, dst_crs=None, transform=None, width=None,
-    height=None, resampling=rasterio.warp.Resampling.nearest,
+    height=None, resampling=rasterio.warp.Resampling.nearest, pool=None,
 ):
     """Read raster of bands and set 0 values to the masked ones.
 
     Each band is an event. Select region using window or geometry. Reproject input by proving
-    dst_crs and/or (transform, width, height).
+    dst_crs and/or (transform, width, height). The reprojection transform or the window and
+    mask of the geometry are computed once for all files with the same grid.
 
     The main purpose of this function is to read intensity/fraction values from raster files for
     use in Hazard.read_raster. It is implemented as a separate helper function (instead of a
@@ -1221,6 +1401,8 @@ def _values_from_raster_files(
         number of lats for transform
     resampling : rasterio.warp,.Resampling optional
         resampling function used for reprojection to dst_crs
+    pool : pathos.pool, optional
+        Pool used to read the files in parallel, preserving their order. Default: None
 
     Raises
     ------
@@ -1233,18 +1415,25 @@ def _values_from_raster_files(
     """
     if band is None:
         band = [1]
+    grid_cache = {}
 
-    values = []
-    for file_name in file_names:
+    def read_file(file_name):
+        """Read the bands of a file as sparse rows"""
         tmp_meta, data = u_coord.read_raster(
             file_name, band, src_crs, window, geometry, dst_crs,
-            transform, width, height, resampling,
+            transform, width, height, resampling, grid_cache=grid_cache,
         )
         if (tmp_meta['crs'] != meta['crs']
                 or tmp_meta['transform'] != meta['transform']
                 or tmp_meta['height'] != meta['height']
                 or tmp_meta['width'] != meta['width']):
             raise ValueError('Raster data is inconsistent with contained raster.')
-        values.append(sparse.csr_matrix(data))
+        return sparse.csr_matrix(data)
+
+    if pool:
+        chunksize = max(min(len(file_names) // pool.nodes, 1000), 1)
+        values = pool.map(read_file, file_names, chunksize=chunksize)
+    else:
+        values = [read_file(file_name) for file_name in file_names]
 
     return sparse.vstack(values, format='csr')
@@ -20,11 +20,12 @@ Test Hazard base class.
 """
 
 import unittest
+import copy
 
 from pathlib import Path
 import numpy as np
 from scipy import sparse
-from pathos.pools import ProcessPool as Pool
+from pathos.pools import ProcessPool as Pool, ThreadPool
 
 from climada import CONFIG
 from climada.hazard.base import Hazard
@@ -1033,6 +1034,8 @@ class TestStats(unittest.TestCase):
         haz.intensity = sparse.csr_matrix(np.zeros(haz.intensity.shape))
         inten_stats = haz.local_exceedance_inten(return_period)
         self.assertTrue(np.array_equal(inten_stats, np.zeros((4, 100))))
+        inten_stats_pool = haz.local_exceedance_inten(return_period, pool=ThreadPool(2))
+        np.testing.assert_array_equal(inten_stats_pool, inten_stats)
 
     def test_ref_all_pass(self):
         """Compare against reference."""
@@ -1048,7 +1051,10 @@ class TestStats(unittest.TestCase):
         self.assertAlmostEqual(inten_stats[1][66], 70.608592953031405)
         self.assertAlmostEqual(inten_stats[3][33], 88.510983305123631)
         self.assertAlmostEqual(inten_stats[2][99], 79.717518054203623)
-        
+
+        inten_stats_pool = haz.local_exceedance_inten(return_period, pool=ThreadPool(2))
+        np.testing.assert_array_equal(inten_stats_pool, inten_stats)
+
     def test_local_return_period(self):
         """Compare local return periods against reference."""
         haz = dummy_hazard()
@@ -1233,6 +1239,61 @@ class TestImpactFuncs(unittest.TestCase):
         frac = haz._get_fraction(np.array([0, 1]))
         self.assertIsNone(frac)
 
+    def test_get_csc(self):
+        haz = dummy_hazard()
+
+        intensity_csc = haz._get_csc('intensity')
+        self.assertIsInstance(intensity_csc, sparse.csc_matrix)
+        np.testing.assert_array_equal(intensity_csc.toarray(), haz.intensity.toarray())
+        self.assertIs(haz._get_csc('intensity'), intensity_csc)
+        np.testing.assert_array_equal(
+            haz._get_csc('fraction').toarray(), haz.fraction.toarray())
+
+        #reassigned matrix
+        haz.intensity = haz.intensity * 2
+        self.assertIsNot(haz._get_csc('intensity'), intensity_csc)
+        np.testing.assert_array_equal(
+            haz._get_csc('intensity').toarray(), haz.intensity.toarray())
+
+        #reassigned array
+        intensity_csc = haz._get_csc('intensity')
+        haz.intensity.data = haz.intensity.data * 2
+        self.assertIsNot(haz._get_csc('intensity'), intensity_csc)
+        np.testing.assert_array_equal(
+            haz._get_csc('intensity').toarray(), haz.intensity.toarray())
+
+        #modified in place, not detected until the cache is cleared
+        intensity_csc = haz._get_csc('intensity')
+        haz.intensity.data *= 2
+        self.assertIs(haz._get_csc('intensity'), intensity_csc)
+        haz.clear_matrix_cache()
+        self.assertIsNot(haz._get_csc('intensity'), intensity_csc)
+        np.testing.assert_array_equal(
+            haz._get_csc('intensity').toarray(), haz.intensity.toarray())
+
+        #indices modified in place and cache cleared
+        intensity_csc = haz._get_csc('intensity')
+        haz.intensity.indices[:] = haz.intensity.indices[::-1].copy()
+        haz.intensity.has_sorted_indices = False
+        haz.clear_matrix_cache()
+        np.testing.assert_array_equal(
+            haz._get_csc('intensity').toarray(), haz.intensity.toarray())
+
+        #modified in place and checked
+        intensity_csc = haz._get_csc('intensity')
+        haz.intensity.data *= 2
+        haz.check_matrices()
+        np.testing.assert_array_equal(
+            haz._get_csc('intensity').toarray(), haz.intensity.toarray())
+
+        #copies have their own cache
+        haz_copy = copy.deepcopy(haz)
+        haz_copy.intensity.data[:] = 1
+        haz_copy.check_matrices()
+        self.assertEqual(haz_copy._get_csc('intensity').max(), 1)
+        np.testing.assert_array_equal(
+            haz._get_csc('intensity').toarray(), haz.intensity.toarray())
+
 
 # Execute Tests
 if __name__ == "__main__":
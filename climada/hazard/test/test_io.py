@@ -27,11 +27,15 @@ from tempfile import TemporaryDirectory
 from pyproj import CRS
 import numpy as np
 from scipy.sparse import csr_matrix
+import h5py
 import xarray as xr
 
 from climada.hazard.base import Hazard
+from climada.hazard.centroids import Centroids
+from climada.hazard.io import _recast_dataset
 from climada.util.constants import DEF_FREQ_UNIT, HAZ_TEMPLATE_XLS, HAZ_DEMO_FL, DEF_CRS
 from climada.hazard.test.test_base import DATA_DIR, dummy_hazard
+from climada.util.hdf5_handler import H5CSRMatrix
 
 
 class TestReadDefaultNetCDF(unittest.TestCase):
@@ -161,6 +165,24 @@ class TestReadDefaultNetCDF(unittest.TestCase):
         self.assertEqual(hazard.haz_type, "TC")
         self.assertEqual(hazard.units, "m/s")
 
+    def test_chunk_events_threshold(self):
+        """Load the intensity block by block of events, with a threshold"""
+        for chunks in [None, dict(time=1)]:
+            with xr.open_dataset(self.netcdf_path, chunks=chunks) as dataset:
+                dataset["intensity"] = dataset["intensity"].where(dataset["intensity"] != 7)
+                for chunk_events in [None, 1, 5]:
+                    hazard = Hazard.from_xarray_raster(
+                        dataset, "", "", chunk_events=chunk_events, intensity_threshold=4
+                    )
+                    self._assert_default_types(hazard)
+                    np.testing.assert_array_equal(
+                        hazard.intensity.toarray(), [[0, 0, 0, 0, 4, 5], [6, 0, 8, 9, 10, 11]]
+                    )
+                    self.assertEqual(hazard.intensity.nnz, 7)
+                np.testing.assert_array_equal(
+                    dataset["intensity"].isel(time=0).values, [[0, 1, 2], [3, 4, 5]]
+                )
+
     def test_event_no_time(self):
         """Test if an event coordinate that is not a time works"""
         with xr.open_dataset(self.netcdf_path) as dataset:
@@ -682,6 +704,150 @@ class TestHDF5(unittest.TestCase):
         self.assertTrue(np.array_equal(hazard.date, hazard_read.date))
         self.assertTrue(np.array_equal(hazard_read.event_id, np.array([])))  # Empty array
 
+    def test_write_read_dtype(self):
+        """Read the hazard matrices in single precision"""
+        hazard = dummy_hazard()
+        with TemporaryDirectory() as tmpdir:
+            file_name = Path(tmpdir, 'test_dtype.h5')
+            hazard.write_hdf5(file_name)
+            hazard_read = Hazard.from_hdf5(file_name, dtype='float32')
+            self.assertEqual(hazard_read.intensity.dtype, np.float32)
+            self.assertEqual(hazard_read.fraction.dtype, np.float32)
+            self.assertEqual(hazard_read.frequency.dtype, np.float64)
+            np.testing.assert_allclose(
+                hazard_read.intensity.toarray(), hazard.intensity.toarray(), rtol=1e-6
+            )
+            np.testing.assert_allclose(
+                hazard_read.fraction.toarray(), hazard.fraction.toarray(), rtol=1e-6
+            )
+            with self.assertRaises(ValueError):
+                Hazard.from_hdf5(file_name, dtype='int64')
+
+    def test_read_select_lazy(self):
+        """Select events and centroids while reading, and read the matrices on demand"""
+        hazard = dummy_hazard()
+        with TemporaryDirectory() as tmpdir:
+            file_name = Path(tmpdir, 'test_select.h5')
+            hazard.write_hdf5(file_name)
+
+            hazard_read = Hazard.from_hdf5(file_name, lazy=True)
+            self.assertIsInstance(hazard_read.intensity, H5CSRMatrix)
+            self.assertIsInstance(hazard_read.fraction, H5CSRMatrix)
+            with self.assertRaises(ValueError):
+                hazard_read.write_hdf5(file_name)
+
+            for selection in [dict(event_id=[4, 2]), dict(date=(2, 3)),
+                              dict(extent=(1, 5, 0, 4)), dict(event_id=[3], extent=(3, 7, 2, 6))]:
+                ref = hazard.select(**selection)
+                for haz_sel in [Hazard.from_hdf5(file_name, **selection),
+                                hazard_read.select(**selection)]:
+                    self.assertIsInstance(haz_sel.intensity, csr_matrix)
+                    np.testing.assert_array_equal(haz_sel.event_id, ref.event_id)
+                    self.assertEqual(haz_sel.event_name, ref.event_name)
+                    np.testing.assert_array_equal(haz_sel.centroids.coord, ref.centroids.coord)
+                    np.testing.assert_array_equal(haz_sel.intensity.toarray(),
+                                                  ref.intensity.toarray())
+                    np.testing.assert_array_equal(haz_sel.fraction.toarray(),
+                                                  ref.fraction.toarray())
+
+            # selecting centroids only reads the matrices in blocks of rows
+            with patch.object(H5CSRMatrix, 'BLOCK_NNZ', 2), \
+                    patch.object(H5CSRMatrix, '_read_block', autospec=True,
+                                 side_effect=H5CSRMatrix._read_block) as read_block:
+                haz_sel = hazard_read.select(extent=(1, 5, 0, 4))
+            self.assertGreater(read_block.call_count, 2)
+            for call_args in read_block.call_args_list:
+                block_ptr = call_args.args[2]
+                self.assertTrue(block_ptr[-1] - block_ptr[0] <= 2 or block_ptr.size == 2)
+            np.testing.assert_array_equal(haz_sel.intensity.toarray(),
+                                          hazard.select(extent=(1, 5, 0, 4)).intensity.toarray())
+
+            haz_sel = Hazard.from_hdf5(file_name, dtype='float32', event_id=[1])
+            self.assertEqual(haz_sel.intensity.dtype, np.float32)
+            with self.assertRaises(ValueError):
+                Hazard.from_hdf5(file_name, event_id=[5])
+            with self.assertRaises(ValueError):
+                Hazard.from_hdf5(file_name, extent=(10, 20, 10, 20))
+
+    def test_write_chunked_append(self):
+        """Write a hazard in compressed chunks of events and append events to the file"""
+        hazard = dummy_hazard()
+        with TemporaryDirectory() as tmpdir:
+            file_name = Path(tmpdir, 'test_chunked.h5')
+            hazard.select(event_id=[1, 2]).write_hdf5(file_name, chunk_events=2)
+            with h5py.File(file_name, 'r') as hf_data:
+                self.assertEqual(hf_data['intensity']['data'].compression, 'gzip')
+                self.assertEqual(hf_data['intensity']['indptr'].chunks, (2,))
+                self.assertEqual(hf_data['event_name'].maxshape, (None,))
+                self.assertEqual(hf_data['intensity']['indptr'].dtype,
+                                 hazard.intensity.indptr.dtype)
+                self.assertEqual(hf_data['intensity']['indices'].dtype,
+                                 hazard.intensity.indices.dtype)
+            haz_no_name = hazard.select(event_id=[3, 4])
+            haz_no_name.event_name = []
+            with self.assertRaises(ValueError) as cm:
+                haz_no_name.append_hdf5(file_name)
+            self.assertIn("event_name of the events", str(cm.exception))
+            with h5py.File(file_name, 'r') as hf_data:
+                self.assertEqual(hf_data['event_id'].shape, (2,))
+                self.assertEqual(hf_data['intensity'].attrs['shape'][0], 2)
+            hazard.select(event_id=[3, 4]).append_hdf5(file_name)
+
+            hazard_read = Hazard.from_hdf5(file_name)
+            np.testing.assert_array_equal(hazard_read.event_id, hazard.event_id)
+            self.assertEqual(hazard_read.event_name, hazard.event_name)
+            np.testing.assert_array_equal(hazard_read.date, hazard.date)
+            np.testing.assert_array_equal(hazard_read.orig, hazard.orig)
+            np.testing.assert_array_equal(hazard_read.frequency, hazard.frequency)
+            np.testing.assert_array_equal(hazard_read.intensity.toarray(),
+                                          hazard.intensity.toarray())
+            np.testing.assert_array_equal(hazard_read.fraction.toarray(),
+                                          hazard.fraction.toarray())
+
+            with self.assertRaises(ValueError) as cm:
+                hazard.select(event_id=[3]).append_hdf5(file_name)
+            self.assertIn("same identifier", str(cm.exception))
+            haz_moved = hazard.select(event_id=[3])
+            haz_moved.event_id = np.array([10])
+            haz_moved.centroids = Centroids(lat=haz_moved.centroids.lat + 1,
+                                            lon=haz_moved.centroids.lon,
+                                            crs=haz_moved.centroids.crs)
+            with self.assertRaises(ValueError) as cm:
+                haz_moved.append_hdf5(file_name)
+            self.assertIn("centroids of the hazard", str(cm.exception))
+            hazard.write_hdf5(file_name)
+            with self.assertRaises(ValueError) as cm:
+                hazard.append_hdf5(file_name)
+            self.assertIn("not written with chunks", str(cm.exception))
+
+    def test_append_recast_indptr(self):
+        """Convert the index pointer of a chunked file to 64 bit integers when appending"""
+        hazard = dummy_hazard()
+        with TemporaryDirectory() as tmpdir:
+            file_name = Path(tmpdir, 'test_recast.h5')
+            hazard.select(event_id=[1, 2]).write_hdf5(file_name, chunk_events=2)
+            with h5py.File(file_name, 'a') as hf_data:
+                _recast_dataset(hf_data['intensity'], 'indptr', np.int8, block_size=2)
+                indptr = hf_data['intensity']['indptr']
+                self.assertEqual(indptr.dtype, np.int8)
+                self.assertEqual(indptr.chunks, (2,))
+                self.assertEqual(indptr.compression, 'gzip')
+                self.assertEqual(indptr.maxshape, (None,))
+            # the index pointer overflows after about 40 events of 3 values
+            haz_append = hazard.select(event_id=[3])
+            for event_id in range(10, 60):
+                haz_append.event_id = np.array([event_id])
+                haz_append.append_hdf5(file_name)
+            with h5py.File(file_name, 'r') as hf_data:
+                self.assertEqual(hf_data['intensity']['indptr'].dtype, np.int64)
+                self.assertEqual(hf_data['intensity']['indptr'].chunks, (2,))
+            hazard_read = Hazard.from_hdf5(file_name)
+            np.testing.assert_array_equal(hazard_read.event_id,
+                                          np.concatenate([[1, 2], np.arange(10, 60)]))
+            np.testing.assert_array_equal(
+                hazard_read.intensity.toarray(),
+                hazard.intensity.toarray()[[0, 1] + [2] * 50])
+
 
 # Execute Tests
 if __name__ == "__main__":
@@ -24,6 +24,7 @@ import numpy as np
 import datetime as dt
 from pathlib import Path
 from scipy import sparse
+from rasterio.windows import Window
 
 from climada import CONFIG
 from climada.hazard import tc_tracks as tc
@@ -76,6 +77,20 @@ class TestCentroids(unittest.TestCase):
         pool.close()
         pool.join()
 
+    def test_read_raster_thread_pool_pass(self):
+        """Test from_raster constructor with a thread pool and several files"""
+        from pathos.pools import ThreadPool
+        window = Window(10, 20, 50, 60)
+        haz_ref = Hazard.from_raster([HAZ_DEMO_FL, HAZ_DEMO_FL], haz_type='FL', window=window)
+        pool = ThreadPool(2)
+        haz_fl = Hazard.from_raster([HAZ_DEMO_FL] * 2, [HAZ_DEMO_FL] * 2, haz_type='FL',
+                                    window=window, pool=pool)
+        pool.close()
+        pool.join()
+        self.assertEqual(haz_fl.intensity.shape, (2, 60 * 50))
+        np.testing.assert_array_equal(haz_fl.intensity.toarray(), haz_ref.intensity.toarray())
+        np.testing.assert_array_equal(haz_fl.fraction.toarray(), haz_ref.intensity.toarray())
+
     def test_read_write_vector_pass(self):
         """Test write_raster: Rasterize intensity from vector data"""
         haz_fl = Hazard(
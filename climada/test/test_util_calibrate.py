@@ -56,7 +56,8 @@ class TestScipyMinimizeOptimizer(unittest.TestCase):
         self.data = pd.DataFrame(
             data={"a": [3, 1], "b": [0.2, 0.01]}, index=self.events
         )
-        self.impact_to_dataframe = lambda impact: impact.impact_at_reg(["a", "b"])
+        # the third exposure point is outside of the hazard
+        self.impact_to_dataframe = lambda impact: impact.impact_at_reg(["a", "b", "b"])
         self.impact_func_creator = lambda slope: ImpactFuncSet(
             [
                 ImpactFunc(
@@ -150,7 +151,8 @@ class TestBayesianOptimizer(unittest.TestCase):
         self.data = pd.DataFrame(
             data={"a": [3, 1], "b": [0.2, 0.01]}, index=self.events
         )
-        self.impact_to_dataframe = lambda impact: impact.impact_at_reg(["a", "b"])
+        # the third exposure point is outside of the hazard
+        self.impact_to_dataframe = lambda impact: impact.impact_at_reg(["a", "b", "b"])
         self.impact_func_creator = lambda slope: ImpactFuncSet(
             [
                 ImpactFunc(
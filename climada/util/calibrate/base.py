@@ -76,7 +76,8 @@ class Input:
         ``scipy.minimize.NonlinearConstraint``, or a mapping. See the documentation for
         the selected optimization algorithm on which data types are supported.
     impact_calc_kwds : Mapping (str, Any), optional
-        Keyword arguments to :py:meth:`climada.engine.impact_calc.ImpactCalc.impact`.
+        Keyword arguments to :py:meth:`climada.engine.impact_calc.ImpactCalc.impact` (and
+        :py:meth:`climada.engine.impact_calc.ImpactCalc.impact_many`).
         Defaults to ``{"assign_centroids": False}`` (by default, centroids are assigned
         here via the ``assign_centroids`` parameter, to avoid assigning them each time
         the impact is calculated).
@@ -411,6 +412,7 @@ class Optimizer(ABC):
     """
 
     input: Input
+    _impact_calc: Optional[ImpactCalc] = field(default=None, init=False, repr=False)
 
     def _target_func(self, data: pd.DataFrame, predicted: pd.DataFrame) -> Number:
         """Target function for the optimizer
@@ -476,12 +478,14 @@ class Optimizer(ABC):
         params = self._kwargs_to_impact_func_creator(*args, **kwargs)
         impf_set = self.input.impact_func_creator(**params)
 
-        # Compute the impact
-        impact = ImpactCalc(
-            exposures=self.input.exposure,
-            impfset=impf_set,
-            hazard=self.input.hazard,
-        ).impact(**self.input.impact_calc_kwds)
+        # Compute the impact, reusing the exposure and hazard preparation of former calls
+        if self._impact_calc is None:
+            self._impact_calc = ImpactCalc(
+                exposures=self.input.exposure,
+                impfset=impf_set,
+                hazard=self.input.hazard,
+            )
+        impact = self._impact_calc.impact_many([impf_set], **self.input.impact_calc_kwds)[0]
 
         # Transform to DataFrame, align, and compute target function
         data_aligned, impact_df_aligned = self.input.impact_to_aligned_df(
@@ -25,12 +25,15 @@ __all__ = [
     'array_optional',
     'array_default',
     'prune_csr_matrix',
+    'matrix_dtype',
 ]
 
 import logging
 import numpy as np
 import scipy.sparse as sparse
 
+from climada.util.config import CONFIG
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -214,3 +217,35 @@ def prune_csr_matrix(matrix: sparse.csr_matrix):
     matrix.check_format()
     matrix.eliminate_zeros()
     matrix.sum_duplicates()
+
+
+def matrix_dtype(dtype=None):
+    """Floating point data type of the hazard and impact matrices.
+
+    The matrices of a hazard (intensity and fraction) and the impact matrix can be held in
+    single precision to halve their memory footprint. Quantities accumulated from them, like
+    the impact per event or the expected annual impact, are always computed in double
+    precision.
+
+    Parameters
+    ----------
+    dtype : str or np.dtype, optional
+        requested data type, ``float32`` or ``float64``. Default: the ``matrix_dtype``
+        configuration parameter
+
+    Returns
+    -------
+    np.dtype
+        data type of the matrices
+
+    Raises
+    ------
+    ValueError
+        If the data type is neither ``float32`` nor ``float64``
+    """
+    if dtype is None:
+        dtype = CONFIG.matrix_dtype.str()
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError(f"Matrix data type must be float32 or float64, not {dtype}.")
+    return dtype
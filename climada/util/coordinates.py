@@ -1864,7 +1864,8 @@ def _add_gdal_vsi_prefix(path):
     return str(path)
 
 def read_raster(file_name, band=None, src_crs=None, window=None, geometry=None,
-                dst_crs=None, transform=None, width=None, height=None, resampling="nearest"):
+                dst_crs=None, transform=None, width=None, height=None, resampling="nearest",
+                grid_cache=None):
     """Read raster of bands and set 0-values to the masked ones.
 
     Parameters
@@ -1889,6 +1890,11 @@ def read_raster(file_name, band=None, src_crs=None, window=None, geometry=None,
         Resampling method to use, encoded as an integer value (see `rasterio.enums.Resampling`).
         String values like `"nearest"` or `"bilinear"` are resolved to attributes of
         `rasterio.enums.Resampling`. Default: "nearest"
+    grid_cache : dict, optional
+        If given, the computations that only depend on the grid of the file, i.e., the
+        transform of the reprojection to dst_crs or the window and mask of the geometry,
+        are stored in this dictionary and reused for files with the same grid. Pass the
+        same dictionary when reading several files with the same arguments. Default: None
 
     Returns
     -------
@@ -1905,6 +1911,7 @@ def read_raster(file_name, band=None, src_crs=None, window=None, geometry=None,
     with rasterio.Env():
         with rasterio.open(_add_gdal_vsi_prefix(file_name), 'r') as src:
             dst_meta = src.meta.copy()
+            grid_key = (str(src.crs), tuple(src.transform), src.width, src.height)
 
             if dst_crs or transform:
                 LOGGER.debug('Reprojecting ...')
@@ -1912,12 +1919,29 @@ def read_raster(file_name, band=None, src_crs=None, window=None, geometry=None,
                 src_crs = src.crs if src_crs is None else src_crs
                 if not src_crs:
                     src_crs = rasterio.crs.CRS.from_user_input(DEF_CRS)
-                transform = (transform, width, height) if transform else None
+                if transform:
+                    transform = (transform, width, height)
+                elif grid_cache is not None:
+                    cache_key = ('reproject', grid_key, str(src_crs), str(dst_crs))
+                    if cache_key not in grid_cache:
+                        grid_cache[cache_key] = rasterio.warp.calculate_default_transform(
+                            src_crs, dst_crs, src.width, src.height, *src.bounds)
+                    transform = grid_cache[cache_key]
                 inten = _read_raster_reproject(src, src_crs, dst_meta, band=band,
                                                geometry=geometry, dst_crs=dst_crs,
                                                transform=transform, resampling=resampling)
             else:
-                if geometry:
+                if geometry and grid_cache is not None:
+                    # as rasterio.mask.mask, with the window and mask computed once per grid
+                    cache_key = ('geometry', grid_key)
+                    if cache_key not in grid_cache:
+                        grid_cache[cache_key] = rasterio.mask.raster_geometry_mask(
+                            src, geometry, crop=True)
+                    shape_mask, trans, geom_window = grid_cache[cache_key]
+                    masked_array = src.read(band, window=geom_window, masked=True)
+                    inten = masked_array.data
+                    inten[masked_array.mask | shape_mask] = 0
+                elif geometry:
                     inten, trans = rasterio.mask.mask(src, geometry, crop=True, indexes=band)
                     if dst_meta['nodata'] and np.isnan(dst_meta['nodata']):
                         inten[np.isnan(inten)] = 0
@@ -81,6 +81,55 @@ def datetime64_to_ordinal(datetime):
 
     return [pd.to_datetime(i_dt.tolist()).toordinal() for i_dt in datetime]
 
+ORDINAL_EPOCH = dt.date(1970, 1, 1).toordinal()
+"""Ordinal of the epoch of numpy datetime64, 1970-01-01"""
+
+def ordinal_to_datetime64(ordinal):
+    """Converts from ordinal dates to numpy datetime64 dates, without loop over the dates.
+
+    Parameters
+    ----------
+    ordinal : int or list or np.array
+        input datetime ordinal
+
+    Returns
+    -------
+    np.datetime64 or np.array of dtype datetime64[D]
+    """
+    return (np.asarray(ordinal, dtype=np.int64) - ORDINAL_EPOCH).astype('datetime64[D]')
+
+def ordinal_to_year(ordinal):
+    """Extract the years from ordinal dates, without loop over the dates.
+
+    Parameters
+    ----------
+    ordinal : int or list or np.array
+        input datetime ordinal
+
+    Returns
+    -------
+    int or np.array
+    """
+    year = ordinal_to_datetime64(ordinal).astype('datetime64[Y]').astype(np.int64) + 1970
+    return int(year) if np.ndim(year) == 0 else year
+
+def year_to_ordinal(year):
+    """Compute the ordinal dates of the first of January of given years, without loop over
+    the years.
+
+    Parameters
+    ----------
+    year : int or list or np.array
+        input years
+
+    Returns
+    -------
+    int or np.array
+    """
+    ordinal = (np.asarray(year, dtype=np.int64) - 1970).astype('datetime64[Y]') \
+        .astype('datetime64[D]').astype(np.int64) + ORDINAL_EPOCH
+    return int(ordinal) if np.ndim(ordinal) == 0 else ordinal
+
 def last_year(ordinal_vector):
     """Extract first year from ordinal date
 
@@ -0,0 +1,302 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Local exceedance statistics of sparse event x location matrices, such as hazard
+intensities or impact matrices.
+"""
+
+__all__ = [
+    'exceedance_fit',
+    'exceedance_return_period',
+    'cen_exceedance_fit',
+]
+
+import logging
+import warnings
+
+import numba
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+def exceedance_fit(mat, frequency, return_periods, threshold=0., pool=None):
+    """Exceedance values at each location (column) for given return periods.
+
+    At each location, the values above the threshold are sorted in descending order and a
+    straight line is fitted by least squares to the values as function of the logarithm of
+    their cumulative frequencies. The exceedance values are read off this line at the
+    return periods. The fits of all locations are computed at once from the non-zero
+    entries of the matrix, without densifying it. Locations where the result depends on
+    the order of tied values of different frequencies, or where the fit is degenerate, are
+    computed with :py:func:`cen_exceedance_fit` from the dense column.
+
+    Parameters
+    ----------
+    mat : sparse.spmatrix
+        values of the events (rows) at the locations (columns). A csc matrix with sorted
+        indices is used as is, other formats are converted.
+    frequency : np.array
+        frequency of the events
+    return_periods : array_like
+        return periods to consider
+    threshold : float, optional
+        only values strictly above this threshold are fitted. Negative thresholds include
+        the zero entries and are computed from the dense columns. Default: 0
+    pool : pathos.pool, optional
+        Pool used to compute blocks of locations in parallel. A thread pool
+        (``pathos.pools.ThreadPool``) avoids copying the matrix to each worker.
+        Default: None (compute all locations at once)
+
+    Returns
+    -------
+    np.array
+        exceedance value per return period (rows) and location (columns)
+    """
+    return_periods = np.array(return_periods, dtype=float)
+    mat = _sorted_csc(mat)
+    frequency = np.asarray(frequency, dtype=float)
+    log_freq_rp = np.log(1 / return_periods)
+
+    def _block_fit(block):
+        start, end = block
+        stats = np.zeros((return_periods.size, end - start))
+        fallback = np.zeros(end - start, dtype=bool)
+        if threshold < 0:
+            fallback[:] = True
+        else:
+            _fill_exceedance_fit(
+                mat.indptr[start:end + 1], mat.indices, mat.data, frequency, threshold,
+                log_freq_rp, stats, fallback
+            )
+        for col_idx in np.flatnonzero(fallback):
+            values = mat[:, start + col_idx].toarray().ravel()
+            sort_pos = np.argsort(values)[::-1]
+            stats[:, col_idx] = cen_exceedance_fit(
+                values[sort_pos], np.cumsum(frequency[sort_pos]), threshold, return_periods
+            )
+        return stats
+
+    return _map_blocks(_block_fit, mat, pool)
+
+
+def exceedance_return_period(mat, frequency, threshold_values, pool=None):
+    """Return periods at each location (column) of given threshold values.
+
+    The exceedance frequency of a threshold value at a location is the sum of the
+    frequencies of the events with a value larger than or equal to the threshold, i.e.,
+    the cumulative frequencies of the sorted values are interpolated with a step function.
+    The sums of all locations are computed at once from the non-zero entries of the matrix.
+
+    Parameters
+    ----------
+    mat : sparse.spmatrix
+        values of the events (rows) at the locations (columns). A csc matrix with sorted
+        indices is used as is, other formats are converted.
+    frequency : np.array
+        frequency of the events
+    threshold_values : array_like
+        values for which the return periods are computed
+    pool : pathos.pool, optional
+        Pool used to compute blocks of locations in parallel. Default: None
+
+    Returns
+    -------
+    np.array
+        return period per threshold value (rows) and location (columns), NaN where the
+        threshold value is never reached
+    """
+    threshold_values = np.array(threshold_values, dtype=float)
+    mat = _sorted_csc(mat)
+    frequency = np.asarray(frequency, dtype=float)
+    freq_total = frequency.sum()
+
+    def _block_return_period(block):
+        start, end = block
+        entries = slice(mat.indptr[start], mat.indptr[end])
+        cols = np.repeat(np.arange(end - start), np.diff(mat.indptr[start:end + 1]))
+        data = mat.data[entries]
+        freq = frequency[mat.indices[entries]]
+        exc_freq = np.zeros((threshold_values.size, end - start))
+        for i_thres, thres in enumerate(threshold_values):
+            exc_freq[i_thres] = np.bincount(cols, weights=freq * (data >= thres),
+                                            minlength=end - start)
+            if thres <= 0:
+                # events without entry have a value of 0
+                exc_freq[i_thres] += freq_total - np.bincount(cols, weights=freq,
+                                                              minlength=end - start)
+        with np.errstate(divide='ignore'):
+            return np.where(exc_freq > 0, 1 / exc_freq, np.nan)
+
+    return _map_blocks(_block_return_period, mat, pool)
+
+
+def cen_exceedance_fit(values, freq, threshold, return_periods):
+    """From ordered values and cumulative frequency at a location, get the exceedance
+    values at input return periods.
+
+    Parameters
+    ----------
+    values : np.array
+        values at the location, sorted in descending order
+    freq : np.array
+        cumulative frequency at the location
+    threshold : float
+        only values strictly above this threshold are fitted
+    return_periods : np.array
+        return periods
+
+    Returns
+    -------
+    np.array
+    """
+    above = np.asarray(values > threshold).squeeze()
+    values_cen = values[above]
+    freq_cen = freq[above]
+    if not values_cen.size:
+        return np.zeros((return_periods.size,))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            pol_coef = np.polyfit(np.log(freq_cen), values_cen, deg=1)
+    except ValueError:
+        pol_coef = np.polyfit(np.log(freq_cen), values_cen, deg=0)
+    values_fit = np.polyval(pol_coef, np.log(1 / return_periods))
+    wrong_values = (return_periods > np.max(1 / freq_cen)) & np.isnan(values_fit)
+    values_fit[wrong_values] = 0.
+
+    return values_fit
+
+
+def _sorted_csc(mat):
+    """Matrix in csc format with sorted indices"""
+    mat = mat.tocsc()
+    if not mat.has_sorted_indices:
+        mat.sort_indices()
+    return mat
+
+
+def _map_blocks(func, mat, pool=None):
+    """Apply a function to blocks of columns and stack the results horizontally
+
+    Parameters
+    ----------
+    func : function
+        function of a tuple (start, end) of column indices, returning an array with
+        ``end - start`` columns
+    mat : sparse.csc_matrix
+        matrix of which the columns are split
+    pool : pathos.pool, optional
+        if given, the columns are split in ``4 * pool.nodes`` blocks with similar numbers
+        of non-zero entries, mapped over the pool. A matrix without non-zero entries is
+        not split. Default: None (a single block)
+
+    Returns
+    -------
+    np.array
+    """
+    num_col = mat.shape[1]
+    if not pool or mat.nnz == 0:
+        return func((0, num_col))
+    bounds = np.unique(np.searchsorted(
+        mat.indptr, np.linspace(0, mat.nnz, 4 * pool.nodes + 1), side='right'
+    ) - 1)
+    if bounds.size < 2:
+        return func((0, num_col))
+    bounds[0], bounds[-1] = 0, num_col
+    blocks = list(zip(bounds[:-1], bounds[1:]))
+    return np.hstack(pool.map(func, blocks))
+
+
+@numba.njit(nogil=True)
+def _fill_exceedance_fit(indptr, indices, data, frequency, threshold, log_freq_rp, stats,
+                         fallback):
+    """Fit the exceedance values of the columns of a csc matrix
+
+    For each column, the values above the threshold are sorted in descending order and the
+    line fitted by least squares to the values as function of the logarithm of their
+    cumulative frequencies is evaluated at the return periods. As :py:func:`numpy.polyfit`,
+    the fit is computed in the scaled Vandermonde basis and singular values below
+    ``n * eps`` are discarded, where ``n`` is the number of values. Columns are flagged
+    instead if the cumulative frequencies depend on the order of tied values, or if the fit
+    is degenerate in numpy.polyfit (zero or non-finite logarithms, non-finite values).
+
+    Parameters
+    ----------
+    indptr, indices, data : np.array
+        index arrays and data of the columns, with sorted indices
+    frequency : np.array
+        frequency of the events (rows)
+    threshold : float
+        non-negative threshold of the values
+    log_freq_rp : np.array
+        logarithm of the exceedance frequencies of the return periods
+    stats : np.array
+        exceedance values (return periods x columns), filled in place
+    fallback : np.array
+        flags of the columns that could not be fitted, filled in place
+    """
+    eps = np.finfo(np.float64).eps
+    for col in range(indptr.size - 1):
+        col_data = data[indptr[col]:indptr[col + 1]]
+        col_rows = indices[indptr[col]:indptr[col + 1]]
+        above = col_data > threshold
+        values = col_data[above].astype(np.float64)
+        rows = col_rows[above]
+        n_val = values.size
+        if n_val == 0:
+            continue
+        sort_pos = np.argsort(values, kind='mergesort')[::-1]
+        values = values[sort_pos]
+        log_freq = np.empty(n_val)
+        cum_freq = 0.
+        ties = False
+        for i in range(n_val):
+            freq = frequency[rows[sort_pos[i]]]
+            if (i > 0 and values[i] == values[i - 1]
+                    and freq != frequency[rows[sort_pos[i - 1]]]):
+                ties = True
+            cum_freq += freq
+            log_freq[i] = np.log(cum_freq)
+        sum_x = log_freq.sum()
+        sum_xx = (log_freq * log_freq).sum()
+        if ties or not np.isfinite(sum_xx) or sum_xx == 0 or not np.all(np.isfinite(values)):
+            fallback[col] = True
+            continue
+        mean_x = sum_x / n_val
+        mean_y = values.mean()
+        dev_x = log_freq - mean_x
+        sxx = (dev_x * dev_x).sum()
+        # cosine between the columns of the Vandermonde matrix and ratio of its singular
+        # values after scaling the columns to unit norm
+        cos = sum_x / np.sqrt(sum_xx * n_val)
+        abs_cos = min(abs(cos), 1.)
+        one_minus_cos = sxx / sum_xx / (1 + abs_cos)
+        if np.sqrt(one_minus_cos / (1 + abs_cos)) > n_val * eps:
+            slope = (dev_x * (values - mean_y)).sum() / sxx
+            intercept = mean_y - slope * mean_x
+        else:
+            # rank deficient: minimum norm solution in the scaled basis
+            sign = 1. if cos >= 0 else -1.
+            norm_x = np.sqrt(sum_xx)
+            proj = (sign * (log_freq * values).sum() / norm_x + values.sum() / np.sqrt(n_val)) \
+                / (2 * (1 + abs_cos))
+            slope = sign * proj / norm_x
+            intercept = proj / np.sqrt(n_val)
+        for i_rp in range(log_freq_rp.size):
+            stats[i_rp, col] = slope * log_freq_rp[i_rp] + intercept
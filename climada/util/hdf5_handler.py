@@ -23,9 +23,12 @@ __all__ = ['read',
            'get_string',
            'get_str_from_ref',
            'get_list_str_from_ref',
-           'get_sparse_csr_mat'
+           'get_sparse_csr_mat',
+           'H5CSRMatrix',
           ]
 
+from pathlib import Path
+
 from scipy import sparse
 import numpy as np
 import h5py
@@ -161,3 +164,195 @@ def to_string(str_or_bytes):
     # TODO: remove this method from the module and replace its use with the asstr() method
     # of hdf5 datasets, as soon as the h5py version is high enough for that.
     return str_or_bytes.decode() if isinstance(str_or_bytes, bytes) else str_or_bytes
+
+
+class H5CSRMatrix():
+    """Sparse matrix in CSR format stored in an HDF5 file and read on demand
+
+    The matrix is stored in a group containing the datasets ``data``, ``indices`` and
+    ``indptr`` and the attribute ``shape``, as written by
+    :py:meth:`climada.engine.impact.Impact.write_hdf5`. Selecting rows with
+    ``mat[rows]`` or ``mat[rows, cols]`` only reads the selected rows from the file, in
+    blocks if columns are selected, and returns a ``scipy.sparse.csr_matrix``. Other
+    operations require reading the whole matrix explicitly with :py:meth:`tocsr`.
+
+    The file is only opened for reading the data, such that it can be moved between
+    processes, but it must not be modified while it is referenced.
+
+    Attributes
+    ----------
+    file_path : Path
+        HDF5 file containing the matrix
+    group : str
+        name of the group containing the matrix in the file
+    shape : tuple(int, int)
+        shape of the matrix
+    nnz : int
+        number of stored values
+    dtype : np.dtype
+        data type of the stored values
+    """
+
+    ndim = 2
+    format = 'csr'
+    MAX_INDPTR_RUNS = 64
+    """Maximal number of runs of consecutive rows for which ``read_rows`` reads the parts
+    of the index pointer of the runs, instead of the whole index pointer"""
+    BLOCK_NNZ = 10_000_000
+    """Maximal number of stored values read at once by ``read_rows`` when selecting
+    columns"""
+
+    def __init__(self, file_path, group='imp_mat'):
+        """Reference a sparse matrix in an HDF5 file
+
+        Parameters
+        ----------
+        file_path : str or Path
+            HDF5 file containing the matrix
+        group : str, optional
+            name of the group containing the matrix. Default: 'imp_mat'
+
+        Raises
+        ------
+        ValueError
+            if the group does not contain a sparse matrix
+        """
+        self.file_path = Path(file_path)
+        self.group = group
+        with h5py.File(self.file_path, 'r') as file:
+            mat = file[group]
+            if not isinstance(mat, h5py.Group) or \
+                    any(name not in mat for name in ['data', 'indices', 'indptr']):
+                raise ValueError(f"'{group}' in {file_path} is not a sparse matrix.")
+            self.shape = tuple(int(size) for size in mat.attrs['shape'])
+            self.nnz = mat['data'].shape[0]
+            self.dtype = mat['data'].dtype
+        self._indptr = None
+
+    def __repr__(self):
+        return (f"<{self.shape[0]}x{self.shape[1]} sparse matrix of type '{self.dtype}' with "
+                f"{self.nnz} stored elements in '{self.group}' of {self.file_path}>")
+
+    @property
+    def size(self):
+        """Number of stored values, as in scipy.sparse"""
+        return self.nnz
+
+    @property
+    def indptr(self):
+        """Index pointer of the rows, read once from the file"""
+        if self._indptr is None:
+            with h5py.File(self.file_path, 'r') as file:
+                self._indptr = file[self.group]['indptr'][:]
+        return self._indptr
+
+    def tocsr(self, copy=False):
+        """Read the whole matrix
+
+        Parameters
+        ----------
+        copy : bool, optional
+            ignored, the matrix is always read anew. Default: False
+
+        Returns
+        -------
+        sparse.csr_matrix
+        """
+        # pylint: disable=unused-argument
+        with h5py.File(self.file_path, 'r') as file:
+            mat = file[self.group]
+            return sparse.csr_matrix(
+                (mat['data'][:], mat['indices'][:], mat['indptr'][:]), shape=self.shape
+            )
+
+    def toarray(self):
+        """Read the whole matrix as dense np.array"""
+        return self.tocsr().toarray()
+
+    def __matmul__(self, other):
+        return self.tocsr() @ other
+
+    def __rmatmul__(self, other):
+        return other @ self.tocsr()
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            if len(key) != 2:
+                raise IndexError('Only two-dimensional indexing is supported.')
+            rows, cols = key
+        else:
+            rows, cols = key, slice(None)
+        if isinstance(cols, slice) and cols == slice(None):
+            cols = None
+        if isinstance(rows, slice) and rows == slice(None) and cols is None:
+            return self.tocsr()
+        return self.read_rows(np.arange(self.shape[0])[rows], cols)
+
+    def read_rows(self, rows, cols=None):
+        """Read a selection of rows from the file
+
+        Consecutive rows are read in one go. If columns are selected, the rows are read in
+        blocks of at most :py:attr:`BLOCK_NNZ` stored values, of which only the selected
+        columns are kept, such that the whole rows are never held in memory at once.
+
+        Parameters
+        ----------
+        rows : np.array of int
+            indices of the rows to read, in any order and possibly repeated
+        cols : np.array of int or bool, or slice, optional
+            columns to select from the rows. Default: None (all columns)
+
+        Returns
+        -------
+        sparse.csr_matrix
+            matrix of shape (rows.size, n_cols) with the selected rows and columns
+        """
+        rows = np.atleast_1d(np.asarray(rows, dtype=int))
+        n_cols = self.shape[1] if cols is None else np.arange(self.shape[1])[cols].size
+        uniq_rows, inverse = np.unique(rows, return_inverse=True)
+        # split the unique rows into runs of consecutive rows
+        run_starts = np.flatnonzero(np.diff(uniq_rows, prepend=-2) != 1)
+        run_ends = np.append(run_starts[1:], uniq_rows.size)[:run_starts.size]
+        # for a few runs, only the parts of the index pointer of the runs are read
+        indptr = self._indptr
+        if indptr is None and run_starts.size > self.MAX_INDPTR_RUNS:
+            indptr = self.indptr
+        blocks = []
+        with h5py.File(self.file_path, 'r') as file:
+            mat = file[self.group]
+            for start, end in zip(uniq_rows[run_starts], uniq_rows[run_ends - 1] + 1):
+                run_ptr = (mat['indptr'] if indptr is None else indptr)[start:end + 1]
+                for block_ptr in self._split_run(run_ptr, cols is not None):
+                    block = self._read_block(mat, block_ptr)
+                    blocks.append(block if cols is None else block[:, cols])
+        if blocks:
+            mat = sparse.vstack(blocks, format='csr')
+        else:
+            mat = sparse.csr_matrix((0, n_cols), dtype=self.dtype)
+        if uniq_rows.size == rows.size and np.all(uniq_rows == rows):
+            return mat
+        return mat[inverse.ravel()]
+
+    def _split_run(self, run_ptr, split):
+        """Split the index pointer of a run of rows into blocks of at most BLOCK_NNZ stored
+        values (or one row, if it holds more values), if ``split`` is True"""
+        if not split:
+            yield run_ptr
+            return
+        n_rows = run_ptr.size - 1
+        block_start = 0
+        while block_start < n_rows:
+            block_end = np.searchsorted(run_ptr, run_ptr[block_start] + self.BLOCK_NNZ,
+                                        side='right') - 1
+            block_end = min(max(block_end, block_start + 1), n_rows)
+            yield run_ptr[block_start:block_end + 1]
+            block_start = block_end
+
+    def _read_block(self, mat, block_ptr):
+        """Read the rows with the index pointer ``block_ptr`` from the group ``mat``"""
+        return sparse.csr_matrix(
+            (mat['data'][block_ptr[0]:block_ptr[-1]],
+             mat['indices'][block_ptr[0]:block_ptr[-1]],
+             block_ptr - block_ptr[0]),
+            shape=(block_ptr.size - 1, self.shape[1]),
+        )
@@ -23,7 +23,9 @@ import unittest
 import numpy as np
 import scipy.sparse as sparse
 
+from climada import CONFIG
 import climada.util.checker as u_check
+from climada.util.config import Config
 
 class DummyClass(object):
 
@@ -109,6 +111,22 @@ class TestChecks(unittest.TestCase):
         np.testing.assert_array_equal(matrix.data, [3])
         self.assertEqual(matrix.nnz, 1)
 
+    def test_matrix_dtype(self):
+        """Check the data type of hazard and impact matrices"""
+        self.assertEqual(u_check.matrix_dtype(), np.float64)
+        self.assertEqual(u_check.matrix_dtype('float32'), np.float32)
+        self.assertEqual(u_check.matrix_dtype(np.float64), np.float64)
+        matrix_dtype = CONFIG.matrix_dtype.str()
+        CONFIG.matrix_dtype = Config(val='float32', root=CONFIG)
+        try:
+            self.assertEqual(u_check.matrix_dtype(), np.float32)
+        finally:
+            CONFIG.matrix_dtype = Config(val=matrix_dtype, root=CONFIG)
+        with self.assertRaises(ValueError) as cm:
+            u_check.matrix_dtype(int)
+        self.assertIn('must be float32 or float64', str(cm.exception))
+
+
 # Execute Tests
 if __name__ == "__main__":
     TESTS = unittest.TestLoader().loadTestsFromTestCase(TestChecks)
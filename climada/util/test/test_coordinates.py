@@ -1362,6 +1362,21 @@ class TestRasterIO(unittest.TestCase):
         self.assertEqual(meta['width'], 50)
         self.assertEqual(inten_ras.shape, (1, 60 * 50))
 
+    def test_grid_cache_raster_pass(self):
+        """Test reuse of the grid computations for geometry and projection"""
+        poly = box(-69.2471495969998, 9.708220966978912, -68.79714959699979, 10.248220966978932)
+        for kwargs in [dict(geometry=[poly]), dict(dst_crs='epsg:2202')]:
+            meta_ref, inten_ref = u_coord.read_raster(HAZ_DEMO_FL, **kwargs)
+            grid_cache = {}
+            for _ in range(2):
+                meta, inten_ras = u_coord.read_raster(HAZ_DEMO_FL, grid_cache=grid_cache,
+                                                      **kwargs)
+                self.assertEqual(len(grid_cache), 1)
+                self.assertEqual(meta['transform'], meta_ref['transform'])
+                self.assertEqual(meta['height'], meta_ref['height'])
+                self.assertEqual(meta['width'], meta_ref['width'])
+                np.testing.assert_array_equal(inten_ras, inten_ref)
+
     def test_crs_raster_pass(self):
         """Test change projection"""
         meta, inten_ras = u_coord.read_raster(
@@ -73,6 +73,22 @@ class TestDateNumpy(unittest.TestCase):
         self.assertEqual(u_dt.first_year(ordinal_date), 1918)
         self.assertEqual(u_dt.first_year(np.array(ordinal_date)), 1918)
 
+    def test_ordinal_to_year_pass(self):
+        """Test ordinal_to_year and year_to_ordinal"""
+        dates = [dt.date(1, 1, 1), dt.date(1899, 12, 31), dt.date(1970, 1, 1),
+                 dt.date(2000, 2, 29), dt.date(2019, 12, 31)]
+        ordinal_date = [date.toordinal() for date in dates]
+        np.testing.assert_array_equal(u_dt.ordinal_to_year(ordinal_date),
+                                      [date.year for date in dates])
+        self.assertEqual(u_dt.ordinal_to_year(ordinal_date[3]), 2000)
+        self.assertEqual(u_dt.ordinal_to_datetime64(ordinal_date[3]),
+                         np.datetime64('2000-02-29'))
+
+        years = [1, 1899, 1970, 2000, 2019]
+        np.testing.assert_array_equal(u_dt.year_to_ordinal(years),
+                                      [dt.date(year, 1, 1).toordinal() for year in years])
+        self.assertEqual(u_dt.year_to_ordinal(2000), u_dt.str_to_date('2000-01-01'))
+
 # Execute Tests
 if __name__ == "__main__":
     TESTS = unittest.TestLoader().loadTestsFromTestCase(TestDateString)
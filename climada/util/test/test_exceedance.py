@@ -0,0 +1,102 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Test exceedance module.
+"""
+
+import unittest
+import numpy as np
+from scipy import sparse
+from pathos.pools import ThreadPool
+
+import climada.util.exceedance as u_exc
+
+
+def dense_reference_fit(mat, frequency, return_periods, threshold):
+    """Exceedance fit of each dense column"""
+    mat = mat.toarray()
+    stats = np.zeros((return_periods.size, mat.shape[1]))
+    for col_idx in range(mat.shape[1]):
+        sort_pos = np.argsort(mat[:, col_idx])[::-1]
+        stats[:, col_idx] = u_exc.cen_exceedance_fit(
+            mat[sort_pos, col_idx], np.cumsum(frequency[sort_pos]), threshold, return_periods
+        )
+    return stats
+
+
+class TestExceedance(unittest.TestCase):
+    """Test the local exceedance statistics"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.mat = sparse.random(80, 60, density=0.2, format='csr', random_state=1,
+                                 data_rvs=lambda size: rng.uniform(0, 50, size).round())
+        # columns with a single value, equal values and no value
+        self.mat[:, 0] = 0
+        self.mat[3, 0] = 20
+        self.mat[:10, 1] = 30
+        self.mat[:, 2] = 0
+        self.mat.eliminate_zeros()
+        self.frequency = rng.uniform(0.01, 0.05, 80)
+        self.frequency[:5] = 0.02
+
+    def test_exceedance_fit_pass(self):
+        """Compare the sparse fits to the fits of the dense columns"""
+        return_periods = np.array([5, 10, 50, 100, 1000])
+        for threshold in [0, 10, -1]:
+            ref = dense_reference_fit(self.mat, self.frequency, return_periods, threshold)
+            stats = u_exc.exceedance_fit(self.mat, self.frequency, return_periods, threshold)
+            np.testing.assert_allclose(stats, ref, rtol=1e-9, atol=1e-9)
+            stats_pool = u_exc.exceedance_fit(
+                self.mat, self.frequency, return_periods, threshold, pool=ThreadPool(2)
+            )
+            np.testing.assert_array_equal(stats_pool, stats)
+        np.testing.assert_array_equal(stats[:, 2], 0)
+
+    def test_exceedance_return_period_pass(self):
+        """Compare the return periods to the frequencies of the dense columns"""
+        threshold_values = np.array([-1., 0., 10., 30., 100.])
+        mat = self.mat.toarray()
+        ref = np.array([
+            [self.frequency[mat[:, col_idx] >= thres].sum() for col_idx in range(mat.shape[1])]
+            for thres in threshold_values
+        ])
+        with np.errstate(divide='ignore'):
+            ref = np.where(ref > 0, 1 / ref, np.nan)
+        ret_per = u_exc.exceedance_return_period(self.mat, self.frequency, threshold_values)
+        np.testing.assert_allclose(ret_per, ref, rtol=1e-12)
+        self.assertTrue(np.isnan(ret_per[-1]).all())
+        ret_per_pool = u_exc.exceedance_return_period(
+            self.mat, self.frequency, threshold_values, pool=ThreadPool(2)
+        )
+        np.testing.assert_array_equal(ret_per_pool, ret_per)
+
+    def test_empty_matrix_pool(self):
+        """Check that a matrix without stored values is not split into blocks"""
+        mat = sparse.csr_matrix((10, 5))
+        frequency = np.full(10, 0.1)
+        stats = u_exc.exceedance_fit(mat, frequency, (10, 50), pool=ThreadPool(2))
+        np.testing.assert_array_equal(stats, np.zeros((2, 5)))
+        ret_per = u_exc.exceedance_return_period(mat, frequency, [-1, 1], pool=ThreadPool(2))
+        np.testing.assert_allclose(ret_per, [np.ones(5), np.full(5, np.nan)])
+
+
+# Execute Tests
+if __name__ == "__main__":
+    TESTS = unittest.TestLoader().loadTestsFromTestCase(TestExceedance)
+    unittest.TextTestRunner(verbosity=2).run(TESTS)
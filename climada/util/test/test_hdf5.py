@@ -20,7 +20,11 @@ Test hdf5_handler module.
 """
 
 import unittest
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+from pathlib import Path
 import numpy as np
+from scipy import sparse
 import h5py
 
 from climada.util.constants import HAZ_DEMO_MAT
@@ -161,8 +165,92 @@ class TestReader(unittest.TestCase):
         self.assertTrue('hazard' in contents.keys())
         self.assertTrue('#refs#' in contents.keys())
 
+class TestH5CSRMatrix(unittest.TestCase):
+    """Test the sparse matrix read on demand from an HDF5 file"""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.file_path = Path(self.tempdir.name) / 'mat.h5'
+        self.mat = sparse.random(20, 7, density=0.3, format='csr', random_state=1)
+        with h5py.File(self.file_path, 'w') as file:
+            group = file.create_group('imp_mat')
+            group.create_dataset('data', data=self.mat.data)
+            group.create_dataset('indices', data=self.mat.indices)
+            group.create_dataset('indptr', data=self.mat.indptr)
+            group.attrs['shape'] = self.mat.shape
+            file.create_dataset('dense', data=self.mat.toarray())
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_attributes_pass(self):
+        """Check the attributes read from the file"""
+        mat = u_hdf5.H5CSRMatrix(self.file_path)
+        self.assertEqual(mat.shape, (20, 7))
+        self.assertEqual(mat.nnz, self.mat.nnz)
+        self.assertEqual(mat.size, self.mat.nnz)
+        self.assertEqual(mat.dtype, self.mat.dtype)
+        np.testing.assert_array_equal(mat.toarray(), self.mat.toarray())
+        np.testing.assert_array_equal(mat.tocsr().sum(axis=1), self.mat.sum(axis=1))
+        np.testing.assert_array_equal(mat @ np.ones(7), self.mat @ np.ones(7))
+        # other operations are not read implicitly
+        with self.assertRaises(AttributeError):
+            mat.multiply(2)
+
+    def test_getitem_pass(self):
+        """Check that selected rows are read correctly"""
+        mat = u_hdf5.H5CSRMatrix(self.file_path)
+        for key in [3, slice(2, 9), [4, 0, 5, 4, 19], np.arange(20) % 3 == 0,
+                    (slice(None), [1, 2]), ([1, 2, 3, 10], slice(1, 4)), ([], slice(None))]:
+            with self.subTest(key=key):
+                sel = mat[key]
+                self.assertIsInstance(sel, sparse.csr_matrix)
+                np.testing.assert_array_equal(sel.toarray(), self.mat[key].toarray())
+
+    def test_read_rows_indptr_pass(self):
+        """Check that the index pointer is only read as a whole for many runs of rows"""
+        mat = u_hdf5.H5CSRMatrix(self.file_path)
+        rows = [4, 0, 5, 4, 19]
+        np.testing.assert_array_equal(mat.read_rows(rows).toarray(),
+                                      self.mat[rows].toarray())
+        self.assertIsNone(mat._indptr)
+
+        mat.MAX_INDPTR_RUNS = 1
+        np.testing.assert_array_equal(mat.read_rows(rows).toarray(),
+                                      self.mat[rows].toarray())
+        np.testing.assert_array_equal(mat._indptr, self.mat.indptr)
+        np.testing.assert_array_equal(mat.read_rows(rows).toarray(),
+                                      self.mat[rows].toarray())
+
+    def test_read_rows_cols_pass(self):
+        """Check that rows are read in blocks when selecting columns"""
+        mat = u_hdf5.H5CSRMatrix(self.file_path)
+        mat.BLOCK_NNZ = 5
+        rows = [4, 0, 5, 4, 19, 6, 7, 8, 9]
+        row_nnz = np.diff(self.mat.indptr)
+        for cols in [[1, 2], [6, 0, 0], np.arange(7) % 2 == 0, slice(2, 5)]:
+            with self.subTest(cols=cols), \
+                    patch.object(mat, '_read_block', wraps=mat._read_block) as read_block:
+                sel = mat.read_rows(rows, cols)
+                self.assertIsInstance(sel, sparse.csr_matrix)
+                np.testing.assert_array_equal(sel.toarray(), self.mat[rows][:, cols].toarray())
+                self.assertGreater(read_block.call_count, 3)
+                for call_args in read_block.call_args_list:
+                    block_ptr = call_args.args[1]
+                    self.assertTrue(block_ptr[-1] - block_ptr[0] <= mat.BLOCK_NNZ
+                                    or block_ptr.size == 2)
+                self.assertEqual(sum(call_args.args[1][-1] - call_args.args[1][0]
+                                     for call_args in read_block.call_args_list),
+                                 row_nnz[np.unique(rows)].sum())
+
+    def test_not_sparse_fail(self):
+        """Check that a dataset is not accepted"""
+        with self.assertRaises(ValueError):
+            u_hdf5.H5CSRMatrix(self.file_path, 'dense')
+
 # Execute Tests
 if __name__ == "__main__":
     TESTS = unittest.TestLoader().loadTestsFromTestCase(TestReader)
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestFunc))
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestH5CSRMatrix))
     unittest.TextTestRunner(verbosity=2).run(TESTS)
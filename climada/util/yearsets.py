@@ -251,10 +251,16 @@ def compute_imp_per_year(imp, sampling_vect):
             Sampled impact per year (length = sampled_years)
     """
 
-    imp_per_year = [np.sum(imp.at_event[list(sampled_events)]) for sampled_events in
-                    sampling_vect]
-
-    return np.array(imp_per_year)
+    n_events = [len(sampled_events) for sampled_events in sampling_vect]
+    if sum(n_events) == 0:
+        return np.zeros(len(sampling_vect))
+    sampled_events = np.concatenate([np.asarray(sampled_events, dtype=int).ravel()
+                                     for sampled_events in sampling_vect])
+    imp_per_year = np.bincount(np.repeat(np.arange(len(sampling_vect)), n_events),
+                               weights=imp.at_event[sampled_events],
+                               minlength=len(sampling_vect))
+
+    return imp_per_year
 
 def calculate_correction_fac(imp_per_year, imp):
     """Calculate a correction factor that can be used to scale the yimp in such
@@ -0,0 +1,256 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Benchmarks of the impact engine on synthetic hazards and exposures.
+
+The suites follow the conventions of airspeed velocity (asv): every class has the
+attributes ``params`` and ``param_names``, a ``setup`` method called with the parameters
+before the timing, and the timed methods start with ``time_``. They are run offline by
+``run_benchmarks.py`` in this directory.
+"""
+
+from pathlib import Path
+import tempfile
+
+import numpy as np
+from scipy import sparse
+
+from climada.engine import ImpactCalc, Impact
+from climada.entity import Exposures, ImpactFunc, ImpactFuncSet
+from climada.hazard import Hazard, Centroids
+
+SCENARIOS = {
+    'small': dict(n_events=100, n_centroids=1_000, density=0.1,
+                  points_per_centroid=2, n_impf=2),
+    'medium': dict(n_events=1_000, n_centroids=10_000, density=0.05,
+                   points_per_centroid=5, n_impf=3),
+    'sparse': dict(n_events=5_000, n_centroids=50_000, density=0.002,
+                   points_per_centroid=2, n_impf=3),
+    'dense_exposures': dict(n_events=1_000, n_centroids=2_000, density=0.1,
+                            points_per_centroid=50, n_impf=5),
+    'large': dict(n_events=5_000, n_centroids=50_000, density=0.02,
+                  points_per_centroid=5, n_impf=5),
+}
+"""Sizes of the synthetic hazards and exposures: number of events, number of centroids,
+share of non-zero intensities, number of exposure points per centroid and number of
+impact functions"""
+
+DEF_SCENARIOS = ['small', 'medium']
+"""Scenarios run by default"""
+
+RETURN_PERIODS = (10, 25, 50, 100, 250)
+"""Return periods of the exceedance impacts and frequency curves"""
+
+HAZ_TYPE = 'TC'
+
+
+def synth_hazard(n_events, n_centroids, density, seed=0):
+    """Synthetic tropical cyclone hazard on a regular grid
+
+    Parameters
+    ----------
+    n_events : int
+        number of events
+    n_centroids : int
+        number of centroids
+    density : float
+        share of non-zero intensities
+    seed : int, optional
+        seed of the random number generator. Default: 0
+
+    Returns
+    -------
+    climada.hazard.Hazard
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_centroids)))
+    lat, lon = np.meshgrid(np.linspace(10, 20, side), np.linspace(-80, -70, side))
+    intensity = sparse.random(
+        n_events, n_centroids, density=density, format='csr', random_state=seed,
+        data_rvs=lambda size: rng.uniform(10, 80, size)
+    )
+    return Hazard(
+        HAZ_TYPE,
+        centroids=Centroids(lat=lat.ravel()[:n_centroids], lon=lon.ravel()[:n_centroids]),
+        event_id=np.arange(1, n_events + 1),
+        event_name=[f'event{i}' for i in range(1, n_events + 1)],
+        date=np.sort(rng.integers(710_000, 740_000, n_events)),
+        orig=np.ones(n_events, dtype=bool),
+        frequency=np.full(n_events, 1 / n_events),
+        intensity=intensity,
+        units='m/s',
+    )
+
+
+def synth_exposures(hazard, points_per_centroid, n_impf, insured=False, seed=0):
+    """Synthetic exposures at the centroids of a hazard, with assigned centroids
+
+    Parameters
+    ----------
+    hazard : climada.hazard.Hazard
+        hazard of which the centroids are used
+    points_per_centroid : int
+        average number of exposure points per centroid
+    n_impf : int
+        number of impact functions, assigned at random
+    insured : bool, optional
+        if true, add the columns 'deductible' and 'cover'. Default: False
+    seed : int, optional
+        seed of the random number generator. Default: 0
+
+    Returns
+    -------
+    climada.entity.Exposures
+    """
+    rng = np.random.default_rng(seed)
+    n_points = hazard.centroids.size * points_per_centroid
+    cent_idx = rng.integers(0, hazard.centroids.size, n_points)
+    data = {
+        'latitude': hazard.centroids.lat[cent_idx],
+        'longitude': hazard.centroids.lon[cent_idx],
+        'value': rng.uniform(1e3, 1e6, n_points),
+        f'impf_{HAZ_TYPE}': rng.integers(1, n_impf + 1, n_points),
+        hazard.centr_exp_col: cent_idx,
+    }
+    if insured:
+        data['deductible'] = rng.uniform(0, 1e4, n_points)
+        data['cover'] = rng.uniform(1e5, 1e6, n_points)
+    exposures = Exposures(data, value_unit='USD')
+    exposures.check()
+    return exposures
+
+
+def synth_impact_funcs(n_impf):
+    """Impact functions of different convexity, vanishing below an intensity of 20
+
+    Parameters
+    ----------
+    n_impf : int
+        number of impact functions, with ids 1 to n_impf
+
+    Returns
+    -------
+    climada.entity.ImpactFuncSet
+    """
+    intensity = np.linspace(0, 100, 21)
+    return ImpactFuncSet([
+        ImpactFunc(
+            haz_type=HAZ_TYPE, id=impf_id, intensity=intensity,
+            mdd=np.clip((intensity - 20) / 60, 0, 1) ** impf_id,
+            paa=np.ones(intensity.size), intensity_unit='m/s',
+        )
+        for impf_id in range(1, n_impf + 1)
+    ])
+
+
+def synth_inputs(scenario, insured=False):
+    """Synthetic exposures, impact functions and hazard of a scenario
+
+    Parameters
+    ----------
+    scenario : str
+        key of :py:data:`SCENARIOS`
+    insured : bool, optional
+        if true, the exposures have deductible and cover. Default: False
+
+    Returns
+    -------
+    exposures : climada.entity.Exposures
+    impfset : climada.entity.ImpactFuncSet
+    hazard : climada.hazard.Hazard
+    """
+    sizes = SCENARIOS[scenario]
+    hazard = synth_hazard(sizes['n_events'], sizes['n_centroids'], sizes['density'])
+    exposures = synth_exposures(
+        hazard, sizes['points_per_centroid'], sizes['n_impf'], insured=insured
+    )
+    return exposures, synth_impact_funcs(sizes['n_impf']), hazard
+
+
+class ImpactCalcSuite():
+    """Impact computation"""
+
+    params = [DEF_SCENARIOS]
+    param_names = ['scenario']
+
+    def setup(self, scenario):
+        """Synthetic inputs without and with cover and deductible"""
+        exposures, impfset, hazard = synth_inputs(scenario)
+        self.icalc = ImpactCalc(exposures, impfset, hazard)
+        exposures, impfset, hazard = synth_inputs(scenario, insured=True)
+        self.icalc_insured = ImpactCalc(exposures, impfset, hazard)
+        # compile the numba kernels outside of the timing
+        self.icalc.impact(save_mat=True, assign_centroids=False)
+        self.icalc_insured.impact(save_mat=True, assign_centroids=False)
+
+    def time_assign_centroids(self, _scenario):
+        """Assignment of the hazard centroids to the exposures"""
+        self.icalc.exposures.assign_centroids(self.icalc.hazard, overwrite=True)
+
+    def time_impact_save_mat(self, _scenario):
+        """Impact with impact matrix"""
+        self.icalc.impact(save_mat=True, assign_centroids=False)
+
+    def time_impact(self, _scenario):
+        """Impact without impact matrix"""
+        self.icalc.impact(save_mat=False, assign_centroids=False)
+
+    def time_impact_insured(self, _scenario):
+        """Insured impact with impact matrix"""
+        self.icalc_insured.impact(save_mat=True, assign_centroids=False)
+
+
+class ImpactSuite():
+    """Risk metrics and input/output of an impact with impact matrix"""
+
+    params = [DEF_SCENARIOS]
+    param_names = ['scenario']
+
+    def setup(self, scenario):
+        """Impact of the synthetic inputs, written to a temporary file"""
+        exposures, impfset, hazard = synth_inputs(scenario)
+        self.impact = ImpactCalc(exposures, impfset, hazard).impact(
+            save_mat=True, assign_centroids=False
+        )
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.tmp_dir.name, 'impact.h5')
+        self.impact.write_hdf5(self.file_path)
+        # compile the numba kernels outside of the timing
+        self.impact.select(event_ids=self.impact.event_id[:2]).local_exceedance_imp(
+            return_periods=RETURN_PERIODS
+        )
+
+    def teardown(self, _scenario):
+        """Remove the temporary file"""
+        self.tmp_dir.cleanup()
+
+    def time_local_exceedance_imp(self, _scenario):
+        """Exceedance impact per exposure point"""
+        self.impact.local_exceedance_imp(return_periods=RETURN_PERIODS)
+
+    def time_calc_freq_curve(self, _scenario):
+        """Exceedance frequency curve"""
+        self.impact.calc_freq_curve(return_per=np.array(RETURN_PERIODS))
+
+    def time_write_hdf5(self, _scenario):
+        """Writing the impact to an HDF5 file"""
+        self.impact.write_hdf5(Path(self.tmp_dir.name, 'impact_write.h5'))
+
+    def time_from_hdf5(self, _scenario):
+        """Reading the impact from an HDF5 file"""
+        Impact.from_hdf5(self.file_path)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Run the benchmarks of the impact engine offline and write the timings to a JSON file.
+
+Examples
+--------
+Run the default scenarios and compare to an earlier run::
+
+    python script/benchmark/run_benchmarks.py --output results/benchmarks.json
+    python script/benchmark/run_benchmarks.py --scenarios small medium large \\
+        --compare results/benchmarks.json
+
+The JSON file holds the metadata of the run (versions, commit, machine) and, for every
+benchmark and scenario, the timings of all repetitions and their minimum and median.
+Timings of different runs are comparable by the key of the benchmark and its parameters.
+"""
+
+import argparse
+import datetime as dt
+import inspect
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import scipy
+
+from climada._version import __version__ as climada_version
+import impact_engine
+
+SUITES = [impact_engine.ImpactCalcSuite, impact_engine.ImpactSuite]
+
+
+def metadata(repeat):
+    """Versions and machine of the benchmark run"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, check=True,
+            capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': dt.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'climada': climada_version,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+    }
+
+
+def run_suite(suite_cls, scenarios, repeat, pattern=None):
+    """Time the benchmarks of a suite for all scenarios
+
+    Parameters
+    ----------
+    suite_cls : class
+        benchmark suite, see :py:mod:`impact_engine`
+    scenarios : list of str
+        scenarios to run
+    repeat : int
+        number of timings of each benchmark
+    pattern : str, optional
+        only run the benchmarks whose key contains this string
+
+    Returns
+    -------
+    list of dict
+        one result per benchmark and scenario
+    """
+    names = [name for name, _ in inspect.getmembers(suite_cls, inspect.isfunction)
+             if name.startswith('time_')]
+    names = [name for name in names
+             if pattern is None or pattern in f'{suite_cls.__name__}.{name}']
+    results = []
+    for scenario in scenarios:
+        if not names:
+            break
+        suite = suite_cls()
+        suite.setup(scenario)
+        try:
+            for name in names:
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    getattr(suite, name)(scenario)
+                    times.append(time.perf_counter() - start)
+                result = {
+                    'benchmark': f'{suite_cls.__name__}.{name}',
+                    'params': {'scenario': scenario},
+                    'times': times,
+                    'min': min(times),
+                    'median': float(np.median(times)),
+                }
+                print(f"{result['benchmark']:<45} {scenario:<16} {result['min']:10.4f} s",
+                      flush=True)
+                results.append(result)
+        finally:
+            if hasattr(suite, 'teardown'):
+                suite.teardown(scenario)
+    return results
+
+
+def compare(results, reference):
+    """Print the ratio of the minimal timings to those of a reference run"""
+    ref_times = {
+        (res['benchmark'], json.dumps(res['params'], sort_keys=True)): res['min']
+        for res in reference['results']
+    }
+    print(f"\nComparison to the run of {reference['metadata']['date']}"
+          f" (commit {reference['metadata']['commit']}):")
+    for res in results:
+        ref = ref_times.get((res['benchmark'], json.dumps(res['params'], sort_keys=True)))
+        ratio = f'{res["min"] / ref:8.2f}' if ref else '     n/a'
+        print(f"{res['benchmark']:<45} {res['params']['scenario']:<16} {ratio}")
+
+
+def main():
+    """Parse the arguments, run the benchmarks and write the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split('---')[-1].strip().split('\n')[0])
+    parser.add_argument('--scenarios', nargs='+', default=impact_engine.DEF_SCENARIOS,
+                        choices=list(impact_engine.SCENARIOS),
+                        help='sizes of the synthetic inputs')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timings of each benchmark')
+    parser.add_argument('--bench', default=None,
+                        help='only run the benchmarks whose name contains this string')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='JSON file to write the results to')
+    parser.add_argument('--compare', type=Path, default=None,
+                        help='JSON file of an earlier run to compare to')
+    args = parser.parse_args()
+    logging.getLogger('climada').setLevel(logging.WARNING)
+
+    results = []
+    for suite_cls in SUITES:
+        results += run_suite(suite_cls, args.scenarios, args.repeat, args.bench)
+    output = {'metadata': metadata(args.repeat), 'results': results}
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='UTF-8') as outf:
+            json.dump(output, outf, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='UTF-8') as inf:
+            compare(results, json.load(inf))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
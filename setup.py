@@ -81,6 +81,7 @@ setup(
         'peewee',
         'pillow',
         'pint',
+        'pyarrow',
         'pycountry',
         'pyproj',
         'rasterio',